@@ -3,25 +3,66 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import Config
+from app.assets import Assets
+from app.compression import Compress
+from app.ratelimit import RateLimiter
+from app.idempotency import Idempotency
+from app.catalog import ServiceCatalog
+from app.dashboard_cache import DashboardCache
+from app.writer import WriteCoordinator
+from app.images import ServiceImages
+from app.documents import VerificationDocuments
+from app.autocomplete import Autocomplete
+from app.metrics import Metrics
+from app.profiler import Profiler
+from app.serialization import OrjsonProvider
+from app.regions import Regions, RegionSession
 
 # --- Extension Instances ---
 # Create extension instances here, but do not initialize them with an app.
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RegionSession}) # Routes request/review tables to their region's database
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
+assets = Assets()
+compress = Compress()
+limiter = RateLimiter()
+idempotency = Idempotency()
+service_catalog = ServiceCatalog()
+dashboard_cache = DashboardCache()
+write_coordinator = WriteCoordinator()
+service_images = ServiceImages()
+verification_documents = VerificationDocuments()
+autocomplete = Autocomplete()
+metrics = Metrics()
+profiler = Profiler()
+region_router = Regions()
 
 def create_app(config_class=Config):
     """Application Factory Function"""
     app = Flask(__name__)
+    app.json = OrjsonProvider(app) # orjson behind jsonify, |tojson and the async API
     app.config.from_object(config_class)
 
     # --- Initialize Extensions ---
     # Now, initialize the extensions with the created app instance.
     db.init_app(app)
+    region_router.init_app(app) # Per-region SQLite files for requests and reviews, see REGIONS
     migrate.init_app(app, db) # This is the line that registers the 'flask db' command
     login_manager.init_app(app)
+    metrics.init_app(app) # Registered first so its timing covers the other extensions' request hooks
+    profiler.init_app(app) # Per-request cProfile for admins (X-Profile header / ?_profile=1) or sampled, see /admin/profiles
+    assets.init_app(app) # Serves fingerprinted, precompressed files once 'flask build-assets' has run
+    compress.init_app(app) # gzip/brotli for dynamic HTML and JSON responses
+    limiter.init_app(app) # Token buckets per IP / username / API key, see RATELIMIT_RULES
+    idempotency.init_app(app) # Replays stored results for retried POSTs that carry an Idempotency-Key
+    service_catalog.init_app(app) # In-memory Services snapshot, rebuilt whenever a service change commits
+    dashboard_cache.init_app(app) # Per-process LRU of dashboard data, invalidated by the commits that change it
+    write_coordinator.init_app(app) # Optional single writer thread with group commit, see WRITE_COORDINATOR
+    service_images.init_app(app) # Service image uploads and their thumbnails, served from /images/
+    verification_documents.init_app(app) # Professionals' verification documents, streamed to disk under their SHA-256
+    autocomplete.init_app(app) # In-memory prefix index behind the search boxes' suggestions
 
     # --- Import and Register Blueprints ---
     # Import blueprints here, inside the factory, to avoid circular imports.
@@ -38,6 +79,9 @@ def create_app(config_class=Config):
     app.register_blueprint(professional_bp, url_prefix='/professional')
     app.register_blueprint(shared_bp, url_prefix='/shared')
     app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+    from .cli import register_commands
+    register_commands(app) # build-assets, auto-assign, the bench-* commands and others, see app/cli.py
     
     # --- Context Processing ---
     # This is also a good place to define app context, for example, creating the DB tables in a shell.
@@ -63,6 +107,35 @@ def create_app(config_class=Config):
                             error_name="Page Not Found",
                             error_description="Sorry, the page you are looking for does not exist."), 404
 
+    @app.errorhandler(409)
+    def conflict_error(error):
+        return render_template('error.html', 
+                            error_code=409, 
+                            error_name="Request In Progress",
+                            error_description="This request is still being processed. Please check back in a moment."), 409
+
+    @app.errorhandler(413)
+    def too_large_error(error):
+        return render_template('error.html', 
+                            error_code=413, 
+                            error_name="Upload Too Large",
+                            error_description=error.description), 413
+
+    @app.errorhandler(422)
+    def unprocessable_error(error):
+        return render_template('error.html', 
+                            error_code=422, 
+                            error_name="Duplicate Submission",
+                            error_description="This form was already submitted with different details. Please reload the page and try again."), 422
+
+    @app.errorhandler(429)
+    def too_many_requests_error(error):
+        response = render_template('error.html', 
+                            error_code=429, 
+                            error_name="Too Many Requests",
+                            error_description="You are doing that too often. Please wait a moment and try again.")
+        return response, 429, {'Retry-After': str(error.retry_after)} if error.retry_after else {}
+
     @app.errorhandler(403)
     def forbidden_error(error):
         return render_template('error.html', 
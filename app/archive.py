@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, delete, and_, literal, DateTime
+
+from app import db
+from app.models import ServiceRequests, ArchivedServiceRequests, Reviews, RequestRejections, ServiceStatus
+from app.regions import regions, in_region
+
+# Finished requests that nobody acts on any more. Rejected ones are only cold once old enough
+# that they are evidently not going to be reassigned.
+COLD_STATUSES = (ServiceStatus.PAID, ServiceStatus.REJECTED)
+
+
+def cold_requests_filter(cutoff):
+    hot = ServiceRequests.__table__
+    # Request ids are AUTOINCREMENT, so a new request is never given the id of an archived one.
+    return and_(hot.c.service_status.in_(COLD_STATUSES), hot.c.updated_at < cutoff)
+
+
+def archive_requests(cutoff, batch_size=500):
+    """
+    Moves cold requests last touched before `cutoff` into service_requests_archive, one batch
+    per transaction so the hot table is never locked for long. Reviews are repointed at the
+    archived copy and rejection records are dropped. Each region archives into its own database.
+    Yields (region, number of requests moved) per batch.
+    """
+    for region in regions():
+        with in_region(region):
+            for moved in _archive_region(cutoff, batch_size):
+                yield region, moved
+
+
+def _archive_region(cutoff, batch_size):
+    hot = ServiceRequests.__table__
+    cold = ArchivedServiceRequests.__table__
+    reviews = Reviews.__table__
+    rejections = RequestRejections.__table__
+    cold_filter = cold_requests_filter(cutoff)
+    copied_columns = [column.name for column in hot.columns]
+
+    while True:
+        ids = db.session.scalars(select(hot.c.id).where(cold_filter).order_by(hot.c.id).limit(batch_size)).all()
+        if not ids:
+            return
+        now = datetime.utcnow()
+        # The filter is applied again on the copy in case a row warmed up since it was selected.
+        db.session.execute(insert(cold).from_select(
+            copied_columns + ['archived_at'],
+            select(*hot.columns, literal(now, DateTime)).where(cold_filter, hot.c.id.in_(ids))
+        ))
+        archived_ids = select(cold.c.id).where(cold.c.id.in_(ids))
+        db.session.execute(
+            update(reviews)
+            .where(reviews.c.service_request_id.in_(archived_ids))
+            .values(archived_request_id=reviews.c.service_request_id, service_request_id=None, updated_at=now)
+        )
+        db.session.execute(delete(rejections).where(rejections.c.service_request_id.in_(archived_ids)))
+        moved = db.session.execute(delete(hot).where(hot.c.id.in_(archived_ids))).rowcount
+        db.session.commit()
+        yield moved
@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, we fall back to gzip only.
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# Only text-like files are worth precompressing; images and woff2 are already compressed.
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.ttf', '.json', '.txt', '.html', '.map'}
+COMPRESS_MIN_SIZE = 256
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _hashed_name(path, data):
+    root, ext = posixpath.splitext(path)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_css_urls(css_path, data, assets):
+    """Points relative url(...) references in a stylesheet at their fingerprinted names."""
+    base_dir = posixpath.dirname(css_path)
+
+    def replace(match):
+        quote, ref = match.group(1), match.group(2).strip()
+        if ref.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        path = re.split(r'[?#]', ref, maxsplit=1)[0]
+        suffix = ref[len(path):]
+        target = posixpath.normpath(posixpath.join(base_dir, path))
+        if target not in assets:
+            return match.group(0)
+        new_ref = posixpath.join(posixpath.dirname(path), posixpath.basename(assets[target]))
+        return f"url({quote}{new_ref}{suffix}{quote})"
+
+    text = data.decode('utf-8')
+    return CSS_URL_RE.sub(replace, text).encode('utf-8')
+
+
+def _write_compressed(target, data):
+    """Writes .br/.gz siblings of `target` and returns the encodings that paid off."""
+    encodings = []
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(target + '.br', 'wb') as f:
+                f.write(compressed)
+            encodings.append('br')
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        with open(target + '.gz', 'wb') as f:
+            f.write(compressed)
+        encodings.append('gzip')
+    return encodings
+
+
+def build_assets(static_folder):
+    """
+    Copies every static file into static/dist under a content-hashed name,
+    writes precompressed siblings and a manifest mapping logical to hashed names.
+    """
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist_root):
+        shutil.rmtree(dist_root)
+
+    sources = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if os.path.abspath(dirpath) == os.path.abspath(static_folder):
+            dirnames[:] = [d for d in dirnames if d != DIST_DIR]
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            sources.append(os.path.relpath(full_path, static_folder).replace(os.sep, '/'))
+
+    # Stylesheets go last so the files they reference already have their hashed names.
+    sources.sort(key=lambda p: (p.endswith('.css'), p))
+
+    assets, compressed = {}, {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css_urls(path, data, assets)
+
+        hashed = _hashed_name(path, data)
+        target = os.path.join(dist_root, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        assets[path] = hashed
+
+        if posixpath.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS and len(data) >= COMPRESS_MIN_SIZE:
+            encodings = _write_compressed(target, data)
+            if encodings:
+                compressed[hashed] = encodings
+
+    manifest = {'assets': assets, 'compressed': compressed}
+    with open(os.path.join(dist_root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets:
+    """Serves fingerprinted static files produced by `flask build-assets`."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        manifest = {'assets': {}, 'compressed': {}}
+        manifest_path = os.path.join(app.static_folder, DIST_DIR, MANIFEST_NAME)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        app.extensions['assets'] = manifest
+
+        # Without a build, url_for('static', ...) and the static view behave exactly as before.
+        app.url_defaults(self._fingerprint_static_url)
+        app.view_functions['static'] = self.send_static_file
+
+    @staticmethod
+    def _fingerprint_static_url(endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        hashed = current_app.extensions['assets']['assets'].get(values['filename'])
+        if hashed:
+            values['filename'] = f"{DIST_DIR}/{hashed}"
+
+    @staticmethod
+    def send_static_file(filename):
+        if not filename.startswith(DIST_DIR + '/'):
+            return current_app.send_static_file(filename)
+
+        hashed = filename[len(DIST_DIR) + 1:]
+        available = current_app.extensions['assets']['compressed'].get(hashed, [])
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        dist_root = os.path.join(current_app.static_folder, DIST_DIR)
+
+        encoding = next((e for e in ('br', 'gzip') if e in available and request.accept_encodings[e]), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        response = send_from_directory(dist_root, hashed + suffix, mimetype=mimetype, max_age=ONE_YEAR)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
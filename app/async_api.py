@@ -0,0 +1,200 @@
+import asyncio
+import math
+import time
+from urllib.parse import parse_qs
+
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_accept_header
+
+from app import db
+from app.compression import compress_bytes, brotli
+from app.models import Users
+from app.projections import request_statements, to_records
+from app.regions import STATE_KEY as REGIONS_KEY, DEFAULT_REGION, GLOBAL_SCHEMA, attach_database
+from app.ratelimit import RateLimiter, MemoryStore
+from app.metrics import REQUESTS, LATENCY, IN_FLIGHT
+from app.routes.api import service_json, user_json
+
+# Async drivers for the sync drivers SQLALCHEMY_DATABASE_URI may name.
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'sqlite+pysqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_uri(flask_app):
+    """ASYNC_DATABASE_URI if set, else the Flask app's own database with an async driver."""
+    if flask_app.config.get('ASYNC_DATABASE_URI'):
+        return flask_app.config['ASYNC_DATABASE_URI']
+    with flask_app.app_context():
+        url = db.engine.url  # Already resolved by Flask-SQLAlchemy (e.g. relative SQLite paths)
+    if url.drivername not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {url.drivername!r}; set ASYNC_DATABASE_URI.")
+    return url.set(drivername=ASYNC_DRIVERS[url.drivername])
+
+
+class APIRequest:
+    """The parts of an ASGI HTTP request the API endpoints look at."""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+        self.args = MultiDict(parse_qs(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        self.remote_addr = scope['client'][0] if scope.get('client') else None
+
+
+class JSONError(Exception):
+    """Ends a request with the same JSON error body api_bp's error handlers produce."""
+
+    def __init__(self, code, message, headers=None):
+        self.code = code
+        self.message = message
+        self.headers = headers or {}
+
+
+def require_api_key(handler):
+    """Async counterpart of routes.api.require_api_key: the handler receives the user."""
+    async def decorated_function(self, session, request):
+        api_key = request.headers.get('x-api-key')
+        if not api_key:
+            raise JSONError(401, "API key is missing.")
+        user = (await session.scalars(
+            select(Users).where(Users.api_key == api_key)
+            .options(joinedload(Users.customer), joinedload(Users.professional))
+        )).first()
+        if not user:
+            raise JSONError(401, "Invalid API key.")
+        return await handler(self, session, request, user)
+    return decorated_function
+
+
+class AsyncAPI:
+    """
+    ASGI application serving GET /api/v1/services, /me and /my-requests on SQLAlchemy's
+    asyncio engine, so a slow client or a slow query holds a coroutine instead of a worker
+    thread. Responses, API key checks and rate limits match the Flask blueprint; anything
+    else (other paths, other methods) is handed to `fallback`, normally the Flask app itself.
+    """
+
+    def __init__(self, flask_app, fallback, prefix='/api/v1'):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.engine = create_async_engine(async_database_uri(flask_app))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Requests in other regions' databases are read over these, see app/regions.py.
+        self.regions = flask_app.extensions.get(REGIONS_KEY)
+        self.region_engines = {}
+        for name, path in (self.regions.paths.items() if self.regions else ()):
+            if name != DEFAULT_REGION:
+                engine = self.region_engines[name] = create_async_engine(f"sqlite+aiosqlite:///{path}")
+                event.listen(engine.sync_engine, 'connect', attach_database(self.regions.main_path, GLOBAL_SCHEMA))
+        # path -> (Flask endpoint name, used for rate limit rules; handler)
+        self.routes = {
+            f'{prefix}/services': ('api.get_services', self.get_services),
+            f'{prefix}/me': ('api.get_me', self.get_me),
+            f'{prefix}/my-requests': ('api.get_my_requests', self.get_my_requests),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        route = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if route is None or scope['method'] not in ('GET', 'HEAD'):
+            return await self.fallback(scope, receive, send)
+
+        endpoint, handler = route
+        request = APIRequest(scope)
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            try:
+                await self._check_rate_limit(endpoint, request)
+                async with self.sessions() as session:
+                    status, payload, headers = 200, await handler(session, request), {}
+            except JSONError as error:
+                status, headers = error.code, error.headers
+                payload = {"success": False, "error": error.code, "message": error.message}
+            await self._send_json(scope, request, send, status, payload, headers)
+            # Same series as the Flask app's, so dashboards don't care which side served the request.
+            LATENCY.labels('api', endpoint).observe(time.perf_counter() - start)
+            REQUESTS.labels(request.method, 'api', endpoint, str(status)).inc()
+        finally:
+            IN_FLIGHT.dec()
+
+    # --- Endpoints ---
+
+    async def get_services(self, session, request):
+        state = self.flask_app.extensions['service_catalog']
+        # Only an expired snapshot costs a query, and that runs off the event loop.
+        catalog = await asyncio.to_thread(state.current)
+        return {'services': [service_json(s) for s in catalog]}
+
+    @require_api_key
+    async def get_me(self, session, request, user):
+        return {'user': user_json(user)}
+
+    @require_api_key
+    async def get_my_requests(self, session, request, user):
+        statements = request_statements(user, include_archived=request.args.get('include_archived', type=int))
+        records = []
+        for region in self.regions.regions_for_user(user) if self.regions else [DEFAULT_REGION]:
+            if region == DEFAULT_REGION:
+                for statement in statements:
+                    records += to_records(await session.execute(statement))
+                continue
+            async with self.region_engines[region].connect() as connection:
+                for statement in statements:
+                    records += to_records(await connection.execute(statement))
+        return {'requests': records}
+
+    # --- Plumbing ---
+
+    async def _check_rate_limit(self, endpoint, request):
+        if not self.flask_app.config['RATELIMIT_ENABLED']:
+            return
+        state = self.flask_app.extensions['ratelimit']
+        scope_value = lambda scope: request.remote_addr if scope == 'ip' else request.headers.get('x-api-key') if scope == 'api_key' else None
+        if isinstance(state['store'], MemoryStore):
+            retry_after = RateLimiter.hit(state, endpoint, 'api', scope_value)
+        else:  # The shared SQLite store can wait on a file lock, which mustn't block the event loop
+            retry_after = await asyncio.to_thread(RateLimiter.hit, state, endpoint, 'api', scope_value)
+        if retry_after:
+            retry_after = math.ceil(retry_after)
+            raise JSONError(429, "Rate limit exceeded. Retry after the number of seconds in the Retry-After header.",
+                            {'Retry-After': str(retry_after)})
+
+    async def _send_json(self, scope, request, send, status, payload, headers):
+        config = self.flask_app.config
+        # The same provider jsonify uses (OrjsonProvider), so byte-for-byte what the blueprint sends,
+        # non-ASCII text included (raw UTF-8 on both sides; see tests/test_async_api.py).
+        body = self.flask_app.json.response(payload).get_data()
+        headers = {'Content-Type': 'application/json', **headers}
+
+        # Same negotiation as the Compress extension.
+        if config['COMPRESS_ENABLED'] and 'application/json' in config['COMPRESS_MIMETYPES']:
+            headers['Vary'] = 'Accept-Encoding'
+            offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+            encoding = parse_accept_header(request.headers.get('Accept-Encoding')).best_match(offered)
+            if encoding and len(body) >= config['COMPRESS_MIN_SIZE']:
+                body = compress_bytes(body, encoding, config['COMPRESS_GZIP_LEVEL'], config['COMPRESS_BROTLI_QUALITY'])
+                headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(body))
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                for engine in self.region_engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,375 @@
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, has_app_context
+from sqlalchemy import select, event, or_
+
+STATE_KEY = 'autocomplete'
+PENDING_KEY = 'autocomplete_pending'
+
+# Suggestion kinds, in the order they take turns in a list of suggestions.
+SERVICE, PROFESSIONAL, CUSTOMER, LOCALITY, PIN = 'service', 'professional', 'customer', 'locality', 'pin'
+KINDS = (SERVICE, PROFESSIONAL, CUSTOMER, LOCALITY, PIN)
+# Who is typing: customers are only offered what the professional listing would show them.
+PUBLIC, ADMIN = 'public', 'admin'
+# Tables whose rows the index is built from; a service_professionals row stands for its user.
+SOURCE_TABLES = ('users', 'service_professionals', 'services')
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces: how suggestions are indexed and prefixes matched."""
+    return ' '.join(re.findall(r'\w+', (text or '').casefold()))
+
+
+def localities(address):
+    """The parts of an address worth suggesting: 'Flat 2, 12 MG Road, Indiranagar' -> ['MG Road', 'Indiranagar']."""
+    parts = []
+    for part in re.split(r'[,;\n]', address or ''):
+        part = re.sub(r'^(flat|no\.?|#)?\s*[\d/-]+\w?\b\s*', '', part.strip(), flags=re.IGNORECASE).strip()
+        if len(part) >= 3 and not part.isdigit():
+            parts.append(part)
+    return parts
+
+
+class _Node:
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()  # Entries indexed under exactly this key
+        self.top = ()  # The best entries at or below this node, best first
+
+
+class _PrefixIndex:
+    """
+    A trie of one kind of suggestion. Each entry is indexed under every word it starts with
+    ('mg road' and 'road'), and each node keeps its `size` best entries (highest weight first),
+    so a lookup is one step per typed character, however many entries share the prefix. A
+    weight is the number of rows that mention the entry, or a professional's review count.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.root = _Node()
+        self.weights = {}  # entry (normalized) -> weight
+        self.labels = {}  # entry -> label as first written
+
+    def _rank(self, entry):
+        return -self.weights[entry], entry
+
+    @staticmethod
+    def _keys(entry):
+        words = entry.split(' ')
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _refresh(self, node):
+        candidates = set(node.entries)
+        for child in node.children.values():
+            candidates.update(child.top)
+        weights = self.weights
+        # A removed entry can linger in the top of a sibling path that hasn't been refreshed yet.
+        candidates = [entry for entry in candidates if entry in weights]
+        node.top = tuple(heapq.nsmallest(self.size, candidates, key=self._rank))
+
+    def _refresh_path(self, key):
+        path, node = [self.root], self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:  # Pruned while refreshing another of the entry's keys
+                break
+            path.append(node)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and not node.entries and not node.children:
+                del path[depth - 1].children[key[depth - 1]]  # Nothing left down here
+            else:
+                self._refresh(node)
+
+    def _link(self, entry, key):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.entries.add(entry)
+
+    def _unlink(self, entry, key):
+        node = self.root
+        for char in key:
+            node = node.children[char]
+        node.entries.discard(entry)
+
+    def load(self, weighted_labels):
+        """Fills an empty index from {label: weight}, ranking every node once at the end."""
+        for label, weight in weighted_labels.items():
+            entry = normalize(label)
+            if entry and weight > 0:
+                self.weights[entry] = self.weights.get(entry, 0) + weight
+                self.labels.setdefault(entry, label)
+        for entry in self.weights:
+            for key in self._keys(entry):
+                self._link(entry, key)
+        stack = [(self.root, False)]
+        while stack:  # Children before their parent
+            node, children_done = stack.pop()
+            if children_done:
+                if not node.entries and len(node.children) == 1:
+                    node.top = next(iter(node.children.values())).top  # Most nodes: one letter of one word
+                else:
+                    self._refresh(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+
+    def adjust(self, label, delta):
+        """Adds `delta` to the entry's weight, indexing it if it is new and dropping it at zero."""
+        entry = normalize(label)
+        if not entry or not delta:
+            return
+        weight = self.weights.get(entry, 0) + delta
+        keys = self._keys(entry)
+        if weight <= 0:
+            if entry not in self.weights:
+                return
+            for key in keys:
+                self._unlink(entry, key)
+            del self.weights[entry]  # After unlinking: readers only ever see ranked entries
+        else:
+            new = entry not in self.weights
+            self.weights[entry] = weight
+            if new:
+                self.labels[entry] = label
+                for key in keys:
+                    self._link(entry, key)
+        for key in keys:
+            self._refresh_path(key)
+        if weight <= 0:
+            self.labels.pop(entry, None)
+
+    def lookup(self, prefix, limit):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        labels = self.labels
+        return [labels[entry] for entry in node.top[:limit] if entry in labels]
+
+
+def _contributions(row):
+    """What one user row puts in each index: (audience, kind, label, weight) tuples."""
+    username, role, address, pin, is_verified, admin_blocked, rating_count = row[1:]
+    if role == 'professional':
+        kind, audiences = PROFESSIONAL, (ADMIN, PUBLIC) if is_verified and not admin_blocked else (ADMIN,)
+        weight = 1 + (rating_count or 0)  # Better-reviewed professionals come first
+    elif role == 'customer':
+        kind, audiences, weight = CUSTOMER, (ADMIN,), 1
+    else:
+        return ()
+    labels = [(kind, username, weight)] + [(LOCALITY, part, 1) for part in localities(address)]
+    if pin and pin.strip():
+        labels.append((PIN, pin.strip(), 1))
+    return tuple((audience, kind, label, weight) for audience in audiences for kind, label, weight in labels)
+
+
+def _load(keys=None):
+    """
+    {source: contributions} for every user and service, or only those in `keys` ({(table, id)},
+    where a service_professionals id stands for its user). Sources not returned are gone.
+    """
+    from app import db
+    from app.models import Users, ServiceProfessionals, Services
+
+    users = (
+        select(Users.id, Users.username, Users.role, Users.address, Users.pin,
+               ServiceProfessionals.is_verified, ServiceProfessionals.admin_blocked, ServiceProfessionals.rating_count)
+        .outerjoin(ServiceProfessionals, ServiceProfessionals.user_id == Users.id)
+    )
+    services = select(Services.id, Services.service_type)
+    if keys is not None:
+        ids = {table: [id for key_table, id in keys if key_table == table] for table in SOURCE_TABLES}
+        # Only the conditions in use: an OR with an empty IN would make SQLite scan every user.
+        users = users.where(or_(*[column.in_(ids[table]) for table, column in
+                                  (('users', Users.id), ('service_professionals', ServiceProfessionals.id)) if ids[table]]))
+        services = services.where(Services.id.in_(ids['services']))
+    sources = {}
+    # Its own connection, as after_commit (where updates start) can't run SQL on the session.
+    with db.engine.connect() as conn:
+        if keys is None or ids['users'] or ids['service_professionals']:
+            for row in conn.execute(users):
+                sources[('users', row.id)] = _contributions(row)
+        if keys is None or ids['services']:
+            for id, service_type in conn.execute(services):
+                sources[('services', id)] = tuple((audience, SERVICE, service_type, 1) for audience in (ADMIN, PUBLIC))
+    return sources
+
+
+class _AutocompleteState:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()  # Held by writers only; lookups never wait
+        self.indexes = None  # {(audience, kind): _PrefixIndex}
+        self.sources = {}  # (table, id) -> its contributions, to diff against on change
+        self.built_at = None
+        self.rebuilding = False
+        self.changed_while_rebuilding = set()
+
+    def _build(self):
+        with self.app.app_context():
+            sources = _load()
+        weighted = {}
+        for contributions in sources.values():
+            for audience, kind, label, weight in contributions:
+                labels = weighted.setdefault((audience, kind), Counter())
+                labels[label] += weight
+        indexes = {}
+        for audience in (PUBLIC, ADMIN):
+            for kind in KINDS:
+                indexes[(audience, kind)] = index = _PrefixIndex(self.app.config['AUTOCOMPLETE_LIMIT'])
+                index.load(weighted.get((audience, kind), {}))
+        return indexes, sources
+
+    def current(self):
+        indexes = self.indexes
+        if indexes is None:
+            with self.lock:
+                if self.indexes is None:
+                    self.indexes, self.sources = self._build()
+                    self.built_at = time.monotonic()
+                return self.indexes
+        if time.monotonic() - self.built_at > self.app.config['AUTOCOMPLETE_TTL']:
+            self.rebuild_in_background()
+        return indexes
+
+    def rebuild_in_background(self):
+        """
+        Rebuilds from scratch (picking up other worker processes' commits) while lookups carry on
+        with the current index. Whatever this process changes meanwhile is applied again on top.
+        """
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+            self.changed_while_rebuilding = set()
+        threading.Thread(target=self._rebuild, name='autocomplete-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            indexes, sources = self._build()
+            with self.lock:
+                self.indexes, self.sources = indexes, sources
+                self.built_at = time.monotonic()
+                if self.changed_while_rebuilding:
+                    self._update(self.changed_while_rebuilding)
+        except Exception:
+            self.app.logger.exception("Rebuilding the autocomplete index failed")
+        finally:
+            self.rebuilding = False
+
+    def update(self, keys):
+        """Re-reads the sources in `keys` and applies what changed. A no-op before the first build."""
+        with self.lock:
+            if self.rebuilding:
+                self.changed_while_rebuilding |= keys
+            if self.indexes is not None:
+                self._update(keys)
+
+    def _update(self, keys):
+        with self.app.app_context():
+            fresh = _load(keys)
+        stale = {key for key in keys if key[0] != 'service_professionals'} | fresh.keys()
+        deltas = Counter()
+        for key in stale:
+            for audience, kind, label, weight in self.sources.get(key, ()):
+                deltas[(audience, kind, label)] -= weight
+            for audience, kind, label, weight in fresh.get(key, ()):
+                deltas[(audience, kind, label)] += weight
+            if key in fresh:
+                self.sources[key] = fresh[key]
+            else:
+                self.sources.pop(key, None)
+        for (audience, kind, label), delta in deltas.items():
+            self.indexes[(audience, kind)].adjust(label, delta)
+
+
+def suggest(prefix, audience, kinds=KINDS, limit=None):
+    """
+    Up to `limit` (at most AUTOCOMPLETE_LIMIT) suggestions starting with `prefix` as
+    [{'label', 'kind'}], the kinds taking turns so one doesn't crowd out the others.
+    """
+    state = current_app.extensions[STATE_KEY]
+    limit = min(limit or state.app.config['AUTOCOMPLETE_LIMIT'], state.app.config['AUTOCOMPLETE_LIMIT'])
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    indexes = state.current()
+    per_kind = [[(kind, label) for label in indexes[(audience, kind)].lookup(prefix, limit)] for kind in kinds]
+    suggestions = []
+    for turn in range(limit):
+        for matches in per_kind:
+            if turn < len(matches):
+                kind, label = matches[turn]
+                suggestions.append({'label': label, 'kind': kind})
+    return suggestions[:limit]
+
+
+def reindex_on_commit(session, model, ids):
+    """Re-reads these rows into the index once `session` commits; for Core statements the flush doesn't see."""
+    if model.__tablename__ in SOURCE_TABLES:  # Anything else (e.g. a customer's block) doesn't show in suggestions
+        session.info.setdefault(PENDING_KEY, set()).update((model.__tablename__, id) for id in ids)
+
+
+def _track_changes(session, flush_context):
+    from app.models import Users, ServiceProfessionals, Services
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Users, Services)):
+            session.info.setdefault(PENDING_KEY, set()).add((obj.__tablename__, obj.id))
+        elif isinstance(obj, ServiceProfessionals):
+            session.info.setdefault(PENDING_KEY, set()).add(('users', obj.user_id))
+
+
+def _update_after_commit(session):
+    keys = session.info.pop(PENDING_KEY, None)
+    state = current_app.extensions.get(STATE_KEY) if has_app_context() else None
+    if keys and state is not None:
+        state.update(keys)
+
+
+def _forget_changes(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+class Autocomplete:
+    """
+    In-memory prefix index behind the search boxes' suggestions: service names, professional
+    and customer usernames, localities and PINs. Built in the background on a process's first
+    request. After that, each commit that changes users, professionals or services re-reads just
+    those rows. Commits in other worker processes show up once the index is AUTOCOMPLETE_TTL
+    seconds old, when it is rebuilt in the background.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('AUTOCOMPLETE_LIMIT', 8)
+        app.config.setdefault('AUTOCOMPLETE_TTL', 300)
+        app.extensions[STATE_KEY] = state = _AutocompleteState(app)
+
+        @app.before_request
+        def _warm_autocomplete():
+            if state.indexes is None and not state.rebuilding:
+                state.rebuild_in_background()
+
+        if not Autocomplete._listening:  # db.session is shared by every app
+            event.listen(db.session, 'after_flush', _track_changes)
+            event.listen(db.session, 'after_commit', _update_after_commit)
+            event.listen(db.session, 'after_rollback', _forget_changes)
+            Autocomplete._listening = True
@@ -0,0 +1,133 @@
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import datetime
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy import select, event
+
+STATE_KEY = 'service_catalog'
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogService:
+    """A read-only copy of one Services row. Attribute names match the model, so templates and serializers take either."""
+    id: int
+    service_type: str
+    description: str | None
+    base_price: float
+    image_url: str | None
+    created_at: datetime
+    updated_at: datetime
+
+
+class CatalogSnapshot:
+    """
+    Every service at one point in time. Never modified once built: a change to the table
+    produces a new snapshot, so a reader holding this one always sees a consistent catalog.
+    """
+
+    __slots__ = ('services', 'by_id', 'by_name', 'version', 'loaded_at')
+
+    def __init__(self, services, loaded_at):
+        self.services = tuple(sorted(services, key=lambda s: s.service_type))  # Display order
+        self.by_id = MappingProxyType({s.id: s for s in sorted(services, key=lambda s: s.id)})
+        self.by_name = MappingProxyType({s.service_type: s for s in services})
+        last_update = max((s.updated_at for s in services), default=None)
+        # Same shape as the admin dashboard's per-table section versions.
+        self.version = f"services:{len(services)}:{last_update}"
+        self.loaded_at = loaded_at
+
+    def __iter__(self):
+        return iter(self.services)
+
+    def __len__(self):
+        return len(self.services)
+
+    def get(self, service_id):
+        return self.by_id.get(service_id)
+
+    def find(self, service_type):
+        return self.by_name.get(service_type)
+
+
+class _CatalogState:
+    def __init__(self, app):
+        self.app = app
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > self.app.config['SERVICE_CATALOG_TTL']:
+            snapshot = self.rebuild(stale=snapshot)
+        return snapshot
+
+    def rebuild(self, stale=None):
+        """
+        Loads a fresh snapshot and swaps it in. Readers never wait: they keep using the old
+        snapshot until the single reference assignment publishes the new one. `stale` lets
+        concurrent callers that all found the same expired snapshot share one reload.
+        """
+        from app import db
+        from app.models import Services
+
+        with self.lock:
+            if stale is not None and self.snapshot is not stale:
+                return self.snapshot
+            # Its own app context (and so its own connection) because this also runs from the
+            # after_commit hook, where the request's session can no longer execute SQL.
+            with self.app.app_context():
+                with db.engine.connect() as conn:
+                    columns = [Services.__table__.c[field.name] for field in fields(CatalogService)]
+                    rows = conn.execute(select(*columns)).all()
+            self.snapshot = CatalogSnapshot([CatalogService(*row) for row in rows], time.monotonic())
+            return self.snapshot
+
+
+def service_catalog(app=None):
+    """The current catalog snapshot for `app` (default: current_app). Loads it on first use."""
+    app = app or current_app._get_current_object()
+    return app.extensions[STATE_KEY].current()
+
+
+def _track_service_changes(session, flush_context):
+    from app.models import Services
+
+    if any(isinstance(obj, Services) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['service_catalog_dirty'] = True
+
+
+def _rebuild_after_commit(session):
+    if session.info.pop('service_catalog_dirty', False):
+        current_app.extensions[STATE_KEY].rebuild()
+
+
+def _forget_changes(session):
+    session.info.pop('service_catalog_dirty', None)
+
+
+class ServiceCatalog:
+    """
+    Keeps an immutable, process-wide snapshot of the Services table for O(1) lookups by id and
+    by name. Any session commit that inserted, changed or deleted a service rebuilds it. Other
+    worker processes pick the change up within SERVICE_CATALOG_TTL seconds.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('SERVICE_CATALOG_TTL', 60)
+        app.extensions[STATE_KEY] = _CatalogState(app)
+        if not ServiceCatalog._listening:  # db.session is shared by every app
+            event.listen(db.session, 'after_flush', _track_service_changes)
+            event.listen(db.session, 'after_commit', _rebuild_after_commit)
+            event.listen(db.session, 'after_rollback', _forget_changes)
+            ServiceCatalog._listening = True
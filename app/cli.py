@@ -0,0 +1,516 @@
+# The project's own 'flask' commands, registered by create_app(). Only generate-keys, which
+# predates this module, is still defined in run.py.
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from config import Config
+from app import create_app, db
+from app.models import Users, Customers, ServiceProfessionals, Services, ServiceRequests, ServiceStatus
+from app.assets import build_assets
+from app.compression import compress_bytes, brotli
+from app.matching import MatchingEngine
+from app.archive import archive_requests, cold_requests_filter
+from app.rollups import refresh_rollups
+from app.regions import DEFAULT_REGION, scatter, regions, create_region_tables, rebalance, misplaced_customers
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_static_assets():
+    """Fingerprints and precompresses static files into static/dist."""
+    manifest = build_assets(current_app.static_folder)
+    print(f"Built {len(manifest['assets'])} assets ({len(manifest['compressed'])} precompressed).")
+    print("Restart the server to pick up the new manifest.")
+
+
+@click.command("bench-compression")
+@click.option("--iterations", default=50, show_default=True, help="Compression runs per endpoint and encoding.")
+@with_appcontext
+def bench_compression(iterations):
+    """Reports bytes on the wire and compression CPU cost per endpoint."""
+    admin = Users.query.filter_by(role="admin").first()
+    api_user = Users.query.filter(Users.api_key.isnot(None), Users.role != "admin").first()
+    if not admin or not api_user:
+        print("Needs an admin and a customer/professional with an API key (see 'flask generate-keys').")
+        return
+
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(admin.id)  # Log in as the admin for the HTML pages.
+    endpoints = [
+        ("admin.admin_dashboard", "/admin/dashboard", {}),
+        ("api.get_services", "/api/v1/services", {}),
+        ("api.get_my_requests", "/api/v1/my-requests", {"x-api-key": api_user.api_key}),
+    ]
+    encodings = ["gzip", "br"] if brotli is not None else ["gzip"]
+
+    print(f"{'endpoint':<24}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'cpu ms/req':>12}")
+    for name, path, headers in endpoints:
+        body = client.get(path, headers=headers).get_data()  # No Accept-Encoding, so identity.
+        print(f"{name:<24}{'identity':<10}{len(body):>10}{1:>8.2f}{0:>12.3f}")
+        for encoding in encodings:
+            start = time.process_time()
+            for _ in range(iterations):
+                compressed = compress_bytes(body, encoding, current_app.config["COMPRESS_GZIP_LEVEL"], current_app.config["COMPRESS_BROTLI_QUALITY"])
+            cpu_ms = (time.process_time() - start) * 1000 / iterations
+            print(f"{'':<24}{encoding:<10}{len(compressed):>10}{len(body) / len(compressed):>8.2f}{cpu_ms:>12.3f}")
+
+
+@click.command("auto-assign")
+@click.option("--dry-run", is_flag=True, help="Show the planned assignments without saving them.")
+@with_appcontext
+def auto_assign_requests(dry_run):
+    """Assigns rejected and unassigned requests to the best eligible professionals."""
+    start = time.perf_counter()
+    engine = MatchingEngine().load()
+    loaded = time.perf_counter()
+    assignments = engine.assign_all(dry_run=dry_run)
+    done = time.perf_counter()
+
+    for req, candidate in assignments[:20]:
+        print(f"Request #{req.id} -> {candidate.username}")
+    if len(assignments) > 20:
+        print(f"... and {len(assignments) - 20} more")
+    verb = "Would assign" if dry_run else "Assigned"
+    if engine.skipped:
+        print(f"{engine.skipped} request(s) changed while matching and were left alone.")
+    print(f"{verb} {len(assignments) - engine.skipped} of {len(engine.requests)} pending requests "
+          f"(load {loaded - start:.2f}s, match and save {done - loaded:.2f}s).")
+
+
+@click.command("bench-writes")
+@click.option("--threads", default=16, show_default=True, help="Concurrent customer/professional pairs.")
+@click.option("--cycles", default=20, show_default=True, help="Book, accept, review and pay cycles per pair.")
+@click.option("--batch-wait", default=0.0, show_default=True, help="WRITE_BATCH_WAIT for the coordinator run.")
+@with_appcontext
+def bench_writes(threads, cycles, batch_wait):
+    """
+    Drives the booking, accept, review and payment routes from many threads at once against a
+    scratch SQLite database, once with every request committing for itself and once through
+    the write coordinator, and compares write throughput, latency and failures.
+    """
+    print(f"{'mode':<13}{'writes':>8}{'writes/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'failed':>8}")
+    for coordinated in (False, True):
+        scratch = tempfile.mkdtemp()
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+            SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": threads + 2}
+            RATELIMIT_ENABLED = False
+            METRICS_ENABLED = False
+            WTF_CSRF_ENABLED = False
+            REGIONS = {}  # Everything in the scratch database
+            WRITE_COORDINATOR = coordinated
+            WRITE_BATCH_WAIT = batch_wait
+
+        bench_app = create_app(BenchConfig)
+        bench_app.config["PROPAGATE_EXCEPTIONS"] = False  # A locked database is a 500, not a crash
+        with bench_app.app_context():
+            db.create_all()
+            service = Services(service_type="Bench", base_price=10)
+            db.session.add(service)
+            db.session.flush()
+            for n in range(threads):
+                customer_user = Users(username=f"bench-customer-{n}", email=f"c{n}@bench.test", role="customer")
+                professional_user = Users(username=f"bench-professional-{n}", email=f"p{n}@bench.test", role="professional")
+                customer_user.set_password("bench-password")
+                professional_user.set_password("bench-password")
+                db.session.add_all([customer_user, professional_user])
+                db.session.flush()
+                db.session.add_all([Customers(user_id=customer_user.id),
+                                    ServiceProfessionals(user_id=professional_user.id, service_id=service.id, is_verified=True)])
+            db.session.commit()
+            service_id = service.id
+
+        def client_for(username):
+            client = bench_app.test_client()
+            client.post("/login", data={"username": username, "password": "bench-password"})
+            return client
+
+        def pair(n, barrier, latencies, failures):
+            customer = client_for(f"bench-customer-{n}")
+            professional = client_for(f"bench-professional-{n}")
+            with bench_app.app_context():
+                professional_id = db.session.scalar(db.select(ServiceProfessionals.id).join(Users).where(Users.username == f"bench-professional-{n}"))
+                customer_id = db.session.scalar(db.select(Customers.id).join(Users).where(Users.username == f"bench-customer-{n}"))
+
+            def write(client, url, data=None):
+                start = time.perf_counter()
+                response = client.post(url, data=data or {})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 302:
+                    failures.append(response.status_code)
+                return response
+
+            barrier.wait()
+            for _ in range(cycles):
+                write(customer, f"/customer/book_service/{professional_id}", {"service_id": service_id, "proposed_price": 25})
+                with bench_app.app_context():
+                    request_id = db.session.scalar(db.select(db.func.max(ServiceRequests.id)).where(ServiceRequests.customer_id == customer_id))
+                write(professional, f"/professional/request/{request_id}/handle", {"action": "accept"})
+                write(customer, f"/customer/review_service/{request_id}", {"rating": 5})
+                write(customer, f"/customer/payment/{request_id}/process")
+
+        barrier, latencies, failures = threading.Barrier(threads + 1), [], []
+        workers = [threading.Thread(target=pair, args=(n, barrier, latencies, failures)) for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()  # Logins (slow password hashes) are done; start the clock
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        with bench_app.app_context():
+            paid = db.session.scalar(db.select(db.func.count()).where(ServiceRequests.service_status == ServiceStatus.PAID))
+            db.engine.dispose()
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        name = "coordinator" if coordinated else "direct"
+        print(f"{name:<13}{len(latencies):>8}{len(latencies) / elapsed:>10.0f}{p50:>9.1f}{p99:>9.1f}{latencies[-1] * 1000:>9.1f}"
+              f"{len(failures):>8}   ({paid} of {threads * cycles} cycles paid)")
+
+
+@click.command("bench-autocomplete")
+@click.option("--users", default=20000, show_default=True, help="Customers and professionals in the scratch database.")
+@click.option("--lookups", default=20000, show_default=True, help="Random prefixes looked up.")
+@with_appcontext
+def bench_autocomplete(users, lookups):
+    """
+    Builds the autocomplete index over a scratch database of made-up users and times its
+    lookups (prefixes of 1-4 characters) and an incremental update after a profile edit.
+    """
+    from app.autocomplete import STATE_KEY, PUBLIC, ADMIN, KINDS, suggest
+
+    scratch = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        REGIONS = {}
+
+    random.seed(0)
+    syllables = ["ka", "ra", "ma", "na", "vi", "sh", "an", "de", "lo", "pu", "ti", "su", "ar", "ne", "ho"]
+    word = lambda: "".join(random.choices(syllables, k=random.randint(2, 4))).title()
+    areas = [f"{word()} {random.choice(['Nagar', 'Road', 'Colony', 'Layout', 'Park'])}" for _ in range(users // 20 or 1)]
+    service_types = set()
+    while len(service_types) < 40:  # service_type is unique
+        service_types.add(f"{word()} Service")
+    bench_app = create_app(BenchConfig)
+    with bench_app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Services.__table__), [
+            {"service_type": service_type, "base_price": 10, "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+            for service_type in sorted(service_types)
+        ])
+        db.session.execute(db.insert(Users.__table__), [
+            {"username": f"{word().lower()}{n}", "email": f"{n}@bench.test", "password_hash": "-",
+             "role": "professional" if n % 4 == 0 else "customer", "is_active": True,
+             "address": f"{random.randint(1, 999)}, {random.choice(areas)}, {random.choice(['Bengaluru', 'Mumbai', 'Delhi'])}",
+             "pin": str(random.randint(110001, 860001)), "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+            for n in range(users)
+        ])
+        professional_ids = db.session.scalars(db.select(Users.id).where(Users.role == "professional")).all()
+        db.session.execute(db.insert(ServiceProfessionals.__table__), [
+            {"user_id": user_id, "service_id": random.randint(1, 40), "is_verified": n % 5 != 0, "admin_blocked": False,
+             "verification_failed": False, "rating_count": random.randint(0, 50), "rating_avg": 4.0,
+             "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()}
+            for n, user_id in enumerate(professional_ids)
+        ])
+        db.session.commit()
+
+        state = bench_app.extensions[STATE_KEY]
+        start = time.perf_counter()
+        state.current()
+        built = time.perf_counter() - start
+        entries = sum(len(index.weights) for index in state.indexes.values())
+        print(f"{users} users: index of {entries} entries built in {built * 1000:.0f} ms")
+
+        labels = [label for index in state.indexes.values() for label in index.labels.values()]
+        prefixes = [label.lower()[:random.randint(1, 4)] for label in random.choices(labels, k=lookups)]
+        with bench_app.test_request_context():
+            for audience in (PUBLIC, ADMIN):
+                timings = []
+                for prefix in prefixes:
+                    start = time.perf_counter()
+                    suggest(prefix, audience, KINDS)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                print(f"{audience:<7} lookups: p50 {timings[len(timings) // 2] * 1e6:.1f} us, "
+                      f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f} us, max {timings[-1] * 1e6:.1f} us")
+
+        timings = []
+        for user in db.session.scalars(db.select(Users).where(Users.role == "professional").limit(200)):
+            user.address = f"{random.randint(1, 999)}, {random.choice(areas)}"
+            start = time.perf_counter()
+            db.session.commit()  # Re-reads this one user into the index after committing
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"profile edit (commit + index update): p50 {timings[len(timings) // 2] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+        db.engine.dispose()
+
+
+@click.command("archive-requests")
+@click.option("--older-than", default=180, show_default=True, help="Archive paid and rejected requests untouched for this many days.")
+@click.option("--batch-size", default=500, show_default=True, help="Requests moved per transaction.")
+@click.option("--dry-run", is_flag=True, help="Only count the requests that would be archived.")
+@with_appcontext
+def archive_old_requests(older_than, batch_size, dry_run):
+    """Moves cold service requests (and their review links) into service_requests_archive."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than)
+    if dry_run:
+        count = sum(scatter(lambda: db.session.scalar(
+            db.select(db.func.count()).select_from(ServiceRequests.__table__).where(cold_requests_filter(cutoff))
+        )))
+        print(f"{count} request(s) last updated before {cutoff:%Y-%m-%d} would be archived.")
+        return
+
+    start = time.perf_counter()
+    total = 0
+    for region, moved in archive_requests(cutoff, batch_size=batch_size):
+        total += moved
+        print(f"Archived {total} request(s) ({region})...")
+    print(f"Archived {total} request(s) last updated before {cutoff:%Y-%m-%d} in {time.perf_counter() - start:.2f}s.")
+
+
+@click.command("init-regions")
+@with_appcontext
+def init_regions():
+    """Creates the request and review tables in every configured region's database."""
+    if regions() == [DEFAULT_REGION]:
+        raise click.ClickException("No REGIONS configured.")
+    created = create_region_tables()
+    for region in regions()[1:]:
+        print(f"{region}: {'created' if region in created else 'already set up'}")
+
+
+@click.command("rebalance-regions")
+@click.option("--batch-size", default=200, show_default=True, help="Customers moved per transaction.")
+@click.option("--dry-run", is_flag=True, help="Only list how many customers are in the wrong region.")
+@with_appcontext
+def rebalance_regions(batch_size, dry_run):
+    """Moves each customer's requests and reviews to the region their PIN maps to under REGIONS."""
+    if dry_run:
+        for region in regions():
+            misplaced = misplaced_customers(region)
+            for target in sorted(set(misplaced.values())):
+                count = sum(1 for home in misplaced.values() if home == target)
+                print(f"{count} customer(s) would move from {region} to {target}.")
+        return
+
+    start = time.perf_counter()
+    total = 0
+    for source, target, customers, moved in rebalance(batch_size=batch_size):
+        total += moved
+        print(f"Moved {customers} customer(s) and {moved} request(s) from {source} to {target}.")
+    print(f"Moved {total} request(s) in {time.perf_counter() - start:.2f}s.")
+
+
+@click.command("rollup")
+@click.option("--full", is_flag=True, help="Rebuild every day instead of only those changed since the last run.")
+@with_appcontext
+def rollup(full):
+    """Updates the daily request and rating rollups the admin time-series charts read."""
+    start = time.perf_counter()
+    recounted = refresh_rollups(full=full)
+    print(f"Recounted {recounted['requests']} day(s) of requests and {recounted['reviews']} day(s) of reviews "
+          f"in {time.perf_counter() - start:.2f}s.")
+
+
+async def _http_load(port, path, headers, connections, duration):
+    """Keeps `connections` keep-alive connections busy with GET `path` for `duration` seconds."""
+    request_bytes = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n{headers}\r\n".encode()
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def connection():
+        nonlocal errors
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            errors += 1
+            return
+        try:
+            while time.perf_counter() < deadline:
+                sent = time.perf_counter()
+                writer.write(request_bytes)
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = next(int(line.split(b":")[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length"))
+                await reader.readexactly(length)
+                if not head.startswith(b"HTTP/1.1 200"):
+                    errors += 1
+                latencies.append(time.perf_counter() - sent)
+        except (OSError, asyncio.IncompleteReadError, StopIteration):
+            errors += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, errors
+
+
+@click.command("bench-api")
+@click.option("--path", default="/api/v1/my-requests", show_default=True, help="API endpoint to load.")
+@click.option("--api-key", default=None, help="x-api-key to send (defaults to the first customer's key).")
+@click.option("--connections", default="10,100,500", show_default=True, help="Comma-separated concurrent connection counts.")
+@click.option("--duration", default=5.0, show_default=True, help="Seconds per run.")
+@with_appcontext
+def bench_api(path, api_key, connections, duration):
+    """
+    Compares throughput and latency of the sync (Flask on a thread pool) and async /api/v1
+    implementations, both served by uvicorn from asgi.py, at several connection counts.
+    Rate limiting is switched off in the servers for the run.
+    """
+    if api_key is None:
+        api_key = db.session.scalar(db.select(Users.api_key).where(Users.role == "customer", Users.api_key.isnot(None)))
+    headers = f"x-api-key: {api_key}\r\n" if api_key else ""
+
+    print(f"{'server':<8}{'conns':>7}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, target in (("sync", "asgi:flask_asgi"), ("async", "asgi:app")):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning",
+             "--no-access-log", "--backlog", "4096"],
+            env={**os.environ, "RATELIMIT_ENABLED": "false"}
+        )
+        try:
+            for _ in range(100):  # Wait for the server to accept connections
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            asyncio.run(_http_load(port, path, headers, 5, 0.5))  # Warm up pools and caches
+            for count in (int(c) for c in connections.split(",")):
+                latencies, errors = asyncio.run(_http_load(port, path, headers, count, duration))
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+                p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+                print(f"{name:<8}{count:>7}{len(latencies) / duration:>10.0f}{p50:>9.1f}{p99:>9.1f}{errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+@click.command("bench-serialization")
+@click.option("--rows", default=2000, show_default=True, help="Service requests owned by the benchmark customer.")
+@click.option("--repeat", default=5, show_default=True, help="Runs per path; the fastest is reported.")
+@with_appcontext
+def bench_serialization(rows, repeat):
+    """
+    Compares the /api/v1/my-requests read path before and after the projection layer, on a
+    scratch SQLite database: ORM objects + dicts + the stdlib JSON provider, against Core
+    projections + slotted records + orjson. Reports CPU and peak allocated memory per row.
+    """
+    import json
+    import tracemalloc
+    from flask.json.provider import DefaultJSONProvider
+    from app.projections import request_statements, to_records
+
+    scratch = tempfile.mkdtemp()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        REGIONS = {}
+
+    bench_app = create_app(BenchConfig)
+    with bench_app.app_context():
+        db.create_all()
+        service = Services(service_type="Bench", base_price=10)
+        # Nobody logs in to the scratch database, so no (slow) password hashing.
+        customer_user = Users(username="bench-customer", email="c@bench.test", role="customer", password_hash="!")
+        professional_users = [Users(username=f"bench-pro-{i}", email=f"p{i}@bench.test", role="professional", password_hash="!")
+                              for i in range(10)]
+        db.session.add_all([service, customer_user, *professional_users])
+        db.session.flush()
+        customer = Customers(user_id=customer_user.id)
+        professionals = [ServiceProfessionals(user_id=user.id, service_id=service.id, is_verified=True) for user in professional_users]
+        db.session.add_all([customer, *professionals])
+        db.session.flush()
+        statuses = [ServiceStatus.CLOSED, ServiceStatus.PAID, ServiceStatus.REJECTED]
+        db.session.execute(ServiceRequests.__table__.insert(), [{
+            "service_id": service.id, "customer_id": customer.id,
+            "professional_id": professionals[i % len(professionals)].id if i % 7 else None,
+            "proposed_price": 10 + i % 50, "service_status": statuses[i % len(statuses)].name,
+            "date_of_request": datetime.utcnow(), "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+        } for i in range(rows)])
+        db.session.commit()
+        customer_user_id = customer_user.id
+
+    stdlib_json = DefaultJSONProvider(bench_app)
+
+    def orm_path(user):
+        # What get_my_requests did before: full ORM rows, lazy-loaded relationships, dicts, stdlib json.
+        requests = ServiceRequests.query.filter_by(customer_id=user.customer.id).all()
+        return stdlib_json.dumps({"requests": [{
+            "id": req.id,
+            "service": req.service.service_type,
+            "status": req.service_status.name,
+            "proposed_price": req.proposed_price,
+            "date_requested": req.date_of_request.isoformat(),
+            "customer": req.customer.user.username,
+            "professional": req.professional.user.username if req.professional else None,
+            "archived": False,
+        } for req in requests]})
+
+    def projection_path(user):
+        records = [record for statement in request_statements(user) for record in to_records(db.session.execute(statement))]
+        return bench_app.json.dumps({"requests": records})
+
+    def measure(path):
+        best_cpu, best_peak, body = None, None, None
+        for _ in range(repeat):
+            with bench_app.app_context():
+                user = db.session.get(Users, customer_user_id)
+                user.customer  # Loaded outside the measurement, as require_api_key does for the real endpoint
+                tracemalloc.start()
+                start = time.process_time()
+                body = path(user)
+                cpu = time.process_time() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            # tracemalloc slows allocation-heavy code, so CPU is measured again without it.
+            with bench_app.app_context():
+                user = db.session.get(Users, customer_user_id)
+                user.customer
+                start = time.process_time()
+                path(user)
+                cpu = min(cpu, time.process_time() - start)
+            best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+            best_peak = peak if best_peak is None else min(best_peak, peak)
+        return best_cpu, best_peak, body
+
+    results = {"orm + stdlib json": measure(orm_path), "projection + orjson": measure(projection_path)}
+    bodies = [json.loads(body) for _, _, body in results.values()]
+    print(f"{rows} rows, best of {repeat}; responses {'identical' if bodies[0] == bodies[1] else 'DIFFER'}")
+    print(f"{'path':<22}{'cpu ms':>10}{'us/row':>10}{'peak KiB':>12}{'bytes/row':>12}")
+    for name, (cpu, peak, _) in results.items():
+        print(f"{name:<22}{cpu * 1000:>10.1f}{cpu * 1e6 / rows:>10.2f}{peak / 1024:>12.0f}{peak / rows:>12.0f}")
+    (orm_cpu, orm_peak, _), (new_cpu, new_peak, _) = results.values()
+    print(f"speedup {orm_cpu / new_cpu:.1f}x, memory {orm_peak / new_peak:.1f}x less")
+
+
+COMMANDS = (
+    build_static_assets, bench_compression, auto_assign_requests, bench_writes, bench_autocomplete,
+    archive_old_requests, init_regions, rebalance_regions, rollup, bench_api, bench_serialization,
+)
+
+
+def register_commands(app):
+    """Adds COMMANDS to the app's 'flask' CLI."""
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -0,0 +1,126 @@
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, we fall back to gzip only.
+    brotli = None
+
+DEFAULT_MIMETYPES = [
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'application/json',
+    'application/javascript',
+    'image/svg+xml',
+]
+
+
+def compress_bytes(data, encoding, gzip_level=6, brotli_quality=4):
+    """One-shot compression of a complete response body."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        # A sync flush per chunk keeps streamed pages progressive instead of buffering them.
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class Compress:
+    """Negotiates gzip/brotli compression for dynamic HTML and JSON responses."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def _choose_encoding():
+        offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def after_request(self, response):
+        config = current_app.config
+
+        if not config['COMPRESS_ENABLED']:
+            return response
+        # Files sent with send_file (including precompressed static assets) are left alone.
+        if (response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        encoding = self._choose_encoding()
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            if encoding == 'br':
+                stream = _BrotliStream(config['COMPRESS_BROTLI_QUALITY'])
+            else:
+                stream = _GzipStream(config['COMPRESS_GZIP_LEVEL'])
+            response.response = self._compress_stream(response.response, stream)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress_bytes(
+                data, encoding, config['COMPRESS_GZIP_LEVEL'], config['COMPRESS_BROTLI_QUALITY']
+            ))
+
+        response.headers['Content-Encoding'] = encoding
+        if 'ETag' in response.headers:
+            # The compressed body is not byte-identical to the identity one, so a strong ETag
+            # is downgraded to a weak one (If-None-Match uses weak comparison anyway).
+            etag, _ = response.get_etag()
+            response.set_etag(etag, weak=True)
+        return response
+
+    @staticmethod
+    def _compress_stream(chunks, stream):
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = stream.compress(chunk)
+                if data:
+                    yield data
+            yield stream.finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
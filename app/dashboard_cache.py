@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from app.metrics import DASHBOARD_CACHE_LOOKUPS
+
+STATE_KEY = 'dashboard_cache'
+PENDING_KEY = 'dashboard_cache_pending'
+
+# Scopes: what a cached view was computed from. Committing a write bumps the scopes it touched,
+# and every view computed from one of them before the bump is recomputed on its next read.
+LISTING = 'listing'  # The customer search: listed professionals, their users and services, ratings
+CUSTOMERS = 'customers'  # Customer names and request ids, as shown on professional dashboards
+
+
+def professional_scope(professional_id):
+    """A professional's own requests: any write that adds, changes or reassigns one of them."""
+    return ('professional', professional_id)
+
+
+class _CacheState:
+    """
+    An LRU of computed view data, checked against a version counter. Each commit that touches
+    a scope takes the next version and records it as that scope's latest change; an entry is
+    fresh while none of its scopes changed after the version it was computed at.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (version, expires_at, scopes, value), least recently used first
+        self.changed = {}  # scope -> version of its latest change
+        self.version = 0
+
+    def _fresh(self, version, scopes):
+        return all(self.changed.get(scope, 0) <= version for scope in scopes)
+
+    def get(self, key, compute, view):
+        """
+        The cached value for `key`, or the `value` of `compute()` -> (scopes, value), stored
+        unless one of its scopes changed while it was being computed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                version, expires_at, scopes, value = entry
+                if now < expires_at and self._fresh(version, scopes):
+                    self.entries.move_to_end(key)
+                    DASHBOARD_CACHE_LOOKUPS.labels(view=view, result='hit').inc()
+                    return value
+                del self.entries[key]
+            version = self.version  # Taken before reading, so a commit during compute() shows up as newer
+        DASHBOARD_CACHE_LOOKUPS.labels(view=view, result='miss').inc()
+
+        scopes, value = compute()
+        with self.lock:
+            if self._fresh(version, scopes):
+                self.entries[key] = (version, now + self.app.config['DASHBOARD_CACHE_TTL'], tuple(scopes), value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.app.config['DASHBOARD_CACHE_SIZE']:
+                    self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, scopes):
+        with self.lock:
+            self.version += 1
+            for scope in scopes:
+                self.changed[scope] = self.version
+
+
+def cached_view(view, key, compute):
+    """
+    `view`'s data for `key` from the current app's cache, computing it with `compute()`, which
+    returns (scopes it was read from, value), on a miss. The value is shared between requests,
+    so it must be plain immutable data, never ORM objects.
+    """
+    return current_app.extensions[STATE_KEY].get((view, key), compute, view)
+
+
+def invalidate(*scopes):
+    """Marks `scopes` changed now, for writes made outside the session (e.g. relocate_customers)."""
+    current_app.extensions[STATE_KEY].invalidate(scopes)
+
+
+def invalidate_on_commit(session, *scopes):
+    """Marks `scopes` changed once `session` commits; for Core statements the flush doesn't see."""
+    session.info.setdefault(PENDING_KEY, set()).update(scopes)
+
+
+def _scopes_of(obj):
+    from app.models import Users, Services, ServiceProfessionals, ServiceRequests, Reviews
+
+    if isinstance(obj, ServiceRequests):
+        # The old professional too when one is reassigned; history never loads anything.
+        professional_ids = inspect(obj).attrs.professional_id.history.sum()
+        return [professional_scope(professional_id) for professional_id in professional_ids if professional_id]
+    if isinstance(obj, (ServiceProfessionals, Services, Reviews)):
+        return [LISTING]  # Reviews move ratings
+    if isinstance(obj, Users):
+        return {'professional': [LISTING], 'customer': [CUSTOMERS]}.get(obj.role, [])
+    return []
+
+
+def _track_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        scopes = _scopes_of(obj)
+        if scopes:
+            invalidate_on_commit(session, *scopes)
+
+
+def _invalidate_after_commit(session):
+    scopes = session.info.pop(PENDING_KEY, None)
+    state = current_app.extensions.get(STATE_KEY) if has_app_context() else None
+    if scopes and state is not None:
+        state.invalidate(scopes)
+
+
+def _forget_changes(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+class DashboardCache:
+    """
+    Per-process cache of the data behind the customer and professional dashboards, so repeat
+    views skip their queries until a commit touches what they show. Holds at most
+    DASHBOARD_CACHE_SIZE entries, least recently used evicted first. Commits in other worker
+    processes (and CLI jobs such as archiving) show up once an entry is DASHBOARD_CACHE_TTL
+    seconds old.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('DASHBOARD_CACHE_SIZE', 2000)
+        app.config.setdefault('DASHBOARD_CACHE_TTL', 60)
+        app.extensions[STATE_KEY] = _CacheState(app)
+        if not DashboardCache._listening:  # db.session is shared by every app
+            event.listen(db.session, 'after_flush', _track_changes)
+            event.listen(db.session, 'after_commit', _invalidate_after_commit)
+            event.listen(db.session, 'after_rollback', _forget_changes)
+            DashboardCache._listening = True
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app, abort, send_file
+from flask.wrappers import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+STATE_KEY = 'verification_documents'
+CHUNK_SIZE = 64 * 1024
+# What the first bytes of each accepted format look like; the upload's name and type are the client's word.
+SIGNATURES = {b'%PDF-': 'pdf', b'\x89PNG\r\n\x1a\n': 'png', b'\xff\xd8\xff': 'jpg'}
+MIMETYPES = {'pdf': 'application/pdf', 'png': 'image/png', 'jpg': 'image/jpeg'}
+DOCUMENT_KEY_RE = re.compile(r'^([0-9a-f]{64})\.(pdf|png|jpg)$')
+
+
+class InvalidDocument(ValueError):
+    """An upload that isn't a PDF, PNG or JPEG file."""
+
+
+def is_document_key(value):
+    """Whether ServiceProfessionals.document holds an uploaded file's key rather than a link."""
+    return bool(value and DOCUMENT_KEY_RE.match(value))
+
+
+class _HashingUpload:
+    """
+    Where an upload is written as it arrives: a temporary file next to the stored documents,
+    hashed and counted chunk by chunk, so the digest is known (and the size limit enforced)
+    without the file ever being held in memory or read a second time.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.file = tempfile.NamedTemporaryFile(dir=folder, prefix='upload-', suffix='.part')  # Deleted on close
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.file.close()
+            raise RequestEntityTooLarge(f"Documents can be at most {self.max_bytes // (1024 * 1024)} MB.")
+        if len(self.head) < 8:
+            self.head += data[:8 - len(self.head)]
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):  # read, seek, close, ... for werkzeug's FileStorage
+        return getattr(self.file, name)
+
+
+class _DocumentStore:
+    """Documents live under DOCUMENT_FOLDER as <sha256>.<ext>: identical uploads are stored once."""
+
+    def __init__(self, app):
+        self.app = app
+        self.folder = app.config['DOCUMENT_FOLDER'] or os.path.join(app.instance_path, 'documents')
+        self.partial = os.path.join(self.folder, 'partial')
+        os.makedirs(self.partial, exist_ok=True)
+
+    def open_upload(self):
+        return _HashingUpload(self.partial, self.app.config['DOCUMENT_MAX_BYTES'])
+
+    def path(self, key):
+        return os.path.join(self.folder, key)
+
+    def save(self, stream):
+        """Stores an upload (ideally already written by open_upload()) and returns its key."""
+        if not isinstance(stream, _HashingUpload):  # Parsed before streaming was switched on; copy it over
+            upload = self.open_upload()
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                upload.write(chunk)
+            stream = upload
+        ext = next((ext for signature, ext in SIGNATURES.items() if stream.head.startswith(signature)), None)
+        if ext is None:
+            raise InvalidDocument("The document must be a PDF, PNG or JPEG file.")
+        stream.flush()
+        key = f"{stream.sha256.hexdigest()}.{ext}"
+        try:
+            # A second name for the finished temporary file, so it outlives the request; the
+            # link appears whole or not at all.
+            os.link(stream.name, self.path(key))
+        except FileExistsError:
+            pass  # Same bytes, same key: already stored
+        return key
+
+    def send(self, key, download_name):
+        match = DOCUMENT_KEY_RE.match(key or '')
+        if not match or not os.path.exists(self.path(key)):
+            abort(404)
+        # conditional=True answers Range (206) and If-None-Match / If-Modified-Since (304); the
+        # digest is a strong ETag, since these bytes can never change under this name.
+        response = send_file(self.path(key), mimetype=MIMETYPES[match.group(2)], download_name=download_name,
+                             conditional=True, etag=match.group(1), max_age=0)
+        response.headers['Cache-Control'] = 'private, no-cache'  # Revalidated each time, never kept by shared caches
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.accept_ranges = 'bytes'  # Advertised on full responses too: PDF viewers look for it before asking for ranges
+        return response
+
+
+def streams_documents(view):
+    """Marks a view whose file uploads are written straight into the document store while the form is parsed."""
+    view.streams_documents = True
+    return view
+
+
+class DocumentRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Decided by endpoint rather than by the view, as whatever reads the form first (a
+        # before_request hook, say) triggers the parsing.
+        view = current_app.view_functions.get(self.endpoint)
+        if filename and getattr(view, 'streams_documents', False):
+            return current_app.extensions[STATE_KEY].open_upload()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def save_document(file_storage):
+    """Stores an uploaded verification document (a werkzeug FileStorage) and returns its key."""
+    return current_app.extensions[STATE_KEY].save(file_storage.stream)
+
+
+def send_document(key, download_name):
+    """A response for the stored document `key`, supporting ranged and conditional requests."""
+    return current_app.extensions[STATE_KEY].send(key, download_name)
+
+
+class VerificationDocuments:
+    """
+    Verification document uploads for professionals' registrations: written to disk chunk by
+    chunk as the request body arrives and hashed on the way (at most DOCUMENT_MAX_BYTES), then
+    stored under their SHA-256 in DOCUMENT_FOLDER, for admins to download with Range and
+    conditional requests.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DOCUMENT_FOLDER', None)
+        app.config.setdefault('DOCUMENT_MAX_BYTES', 20 * 1024 * 1024)
+        app.extensions[STATE_KEY] = _DocumentStore(app)
+        app.request_class = DocumentRequest
+        app.add_template_global(is_document_key)
@@ -0,0 +1,82 @@
+import json
+import queue
+import threading
+
+
+class EventBroker:
+    """
+    Minimal in-process pub/sub. Each subscriber gets its own queue, keyed by a topic
+    (here, a professional id). It only reaches subscribers inside the same worker process;
+    see `professional.request_stream` for the database-polling fallback.
+    """
+
+    def __init__(self, max_queue_size=100):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._max_queue_size = max_queue_size
+
+    def subscribe(self, topic):
+        subscriber = queue.Queue(maxsize=self._max_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(topic, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, topic, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass  # A stalled client misses events rather than blocking the request that published them.
+
+
+broker = EventBroker()
+
+
+def request_event(service_request):
+    """The payload pushed to a professional when one of their requests appears or changes."""
+    return {
+        'id': service_request.id,
+        'status': service_request.service_status.name,
+        'customer': service_request.customer.user.username,
+        'proposed_price': service_request.proposed_price,
+        'date_requested': service_request.date_of_request.strftime('%Y-%m-%d %H:%M'),
+        'date_completed': service_request.date_of_completion.strftime('%Y-%m-%d') if service_request.date_of_completion else None,
+        'updated_at': service_request.updated_at.isoformat(),
+    }
+
+
+def removed_event(request_id, updated_at):
+    """The payload telling a professional's dashboards that a request was reassigned away from them."""
+    return {'id': request_id, 'removed': True, 'updated_at': updated_at.isoformat()}
+
+
+def publish_request(service_request, previous_professional_id=None):
+    """
+    Notifies the assigned professional's open dashboards, and those of `previous_professional_id`
+    if the request was just taken away from them. Call after the change is committed.
+    """
+    if service_request.professional_id:
+        broker.publish(service_request.professional_id, request_event(service_request))
+    if previous_professional_id and previous_professional_id != service_request.professional_id:
+        # No longer theirs: their dashboard drops the row rather than showing the new status.
+        broker.publish(previous_professional_id, removed_event(service_request.id, service_request.updated_at))
+
+
+def format_sse(data, event=None, event_id=None):
+    message = ''
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event is not None:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(data)}\n\n"
+    return message
@@ -1,11 +1,13 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField, IntegerField, FloatField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length, Optional
-from app.models import Users, Services
+from app.models import Users
+from app.catalog import service_catalog
 
 def service_name_exists(form, field):
     """Validator to check if a service name already exists."""
-    if Services.query.filter_by(service_type=field.data).first():
+    if service_catalog().find(field.data):
         raise ValidationError('A service with this name already exists.')
 
 # A custom validator to check if a username is already taken.
@@ -31,14 +33,15 @@ class RegistrationForm(FlaskForm):
     service_id = SelectField('Service', coerce=int, validators=[Optional()])
     description = TextAreaField('Description (Bio)', validators=[Optional(), Length(max=500)])
     experience = IntegerField('Years of Experience', validators=[Optional()])
-    document = StringField('Verification Document URL', validators=[Optional(), Length(max=255)])
+    document_file = FileField('Verification Document', validators=[FileAllowed(['pdf', 'png', 'jpg', 'jpeg'], 'PDF, PNG or JPEG files only.')])
+    document = StringField('Or a Link to It', validators=[Optional(), Length(max=255)])
     
     submit = SubmitField('Register')
 
     # This method is needed to populate the 'service_id' choices dynamically
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.service_id.choices = [(s.id, s.service_type) for s in Services.query.order_by('service_type').all()]
+        self.service_id.choices = [(s.id, s.service_type) for s in service_catalog()]
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -49,12 +52,14 @@ class CreateServiceForm(FlaskForm):
     service_type = StringField('Service Name', validators=[DataRequired(), Length(max=80), service_name_exists])
     base_price = FloatField('Base Price', validators=[DataRequired()])
     description = TextAreaField('Description', validators=[Optional(), Length(max=500)])
+    image = FileField('Image', validators=[Optional(), FileAllowed(['jpg', 'jpeg', 'png', 'webp', 'gif'], 'Images only.')])
     submit = SubmitField('Create Service')
 
 class UpdateServiceForm(FlaskForm):
     service_type = StringField('Service Name', validators=[DataRequired(), Length(max=80)])
     base_price = FloatField('Base Price', validators=[DataRequired()])
     description = TextAreaField('Description', validators=[Optional(), Length(max=500)])
+    image = FileField('Image', validators=[Optional(), FileAllowed(['jpg', 'jpeg', 'png', 'webp', 'gif'], 'Images only.')])
     submit = SubmitField('Update Service')
 
     def __init__(self, original_service_type, *args, **kwargs):
@@ -64,7 +69,7 @@ class UpdateServiceForm(FlaskForm):
     def validate_service_type(self, service_type):
         """Check if the new name conflicts with an *other* service."""
         if service_type.data != self.original_service_type:
-            if Services.query.filter_by(service_type=service_type.data).first():
+            if service_catalog().find(service_type.data):
                 raise ValidationError('Another service with that name already exists.')
 
 class ReviewForm(FlaskForm):
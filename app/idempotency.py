@@ -0,0 +1,147 @@
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, session, flash, current_app, make_response, abort
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+HEADER = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+# Form fields that differ between otherwise identical submissions.
+IGNORED_FIELDS = {'csrf_token', FORM_FIELD}
+
+
+def idempotency_token():
+    """A fresh key for one rendered form. Exposed to templates as `idempotency_token()`."""
+    return uuid.uuid4().hex
+
+
+def _request_hash():
+    fields = sorted((k, v) for k, v in request.form.items(multi=True) if k not in IGNORED_FIELDS)
+    payload = json.dumps([request.method, request.path, fields])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(key, request_hash):
+    """
+    Inserts an in-progress record for `key`. The unique (user_id, key) constraint decides the
+    winner between concurrent retries. Returns None when claimed, else the existing record; if
+    the attempt holding the key fails and releases it meanwhile, this one claims it instead.
+    """
+    from app import db
+    from app.models import IdempotencyKeys
+
+    config = current_app.config
+    deadline = time.monotonic() + config['IDEMPOTENCY_WAIT']
+    while True:
+        now = datetime.utcnow()
+        IdempotencyKeys.query.filter(
+            IdempotencyKeys.user_id == current_user.id,
+            IdempotencyKeys.created_at < now - timedelta(seconds=config['IDEMPOTENCY_TTL'])
+        ).delete(synchronize_session=False)
+        db.session.add(IdempotencyKeys(user_id=current_user.id, key=key, request_hash=request_hash))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        while True:
+            record = IdempotencyKeys.query.filter_by(user_id=current_user.id, key=key).first()
+            if record is None:
+                break # The first attempt failed and released the key: claim it for this one
+            if record.status_code is not None or record.request_hash != request_hash:
+                return record
+            # The first attempt is still running (a double-click, or a retry that raced it). Wait for
+            # its result, but take over a claim whose worker evidently died part way through.
+            if (now - record.updated_at).total_seconds() > config['IDEMPOTENCY_LOCK_TIMEOUT']:
+                taken = IdempotencyKeys.query.filter_by(id=record.id, updated_at=record.updated_at).update(
+                    {'updated_at': now}, synchronize_session=False)
+                db.session.commit()
+                if taken:
+                    return None
+            if time.monotonic() >= deadline:
+                return record
+            db.session.rollback() # End the read transaction so the next poll sees new commits
+            time.sleep(0.1)
+            now = datetime.utcnow()
+
+
+def _replay(record):
+    response = make_response(record.response_body or '', record.status_code)
+    if record.location:
+        response.headers['Location'] = record.location
+    response.headers['Idempotent-Replayed'] = 'true'
+    # The session cookie carrying the original flashes may have been lost with the response.
+    pending = session.get('_flashes', [])
+    for category, message in json.loads(record.flashes or '[]'):
+        if (category, message) not in pending:
+            flash(message, category)
+    return response
+
+
+def idempotent(view):
+    """
+    Makes a POST view safe to retry. The client sends the same key (the `Idempotency-Key` header
+    or an `idempotency_key` form field) with every attempt; the first attempt runs the view and
+    its response is stored, and later attempts get that stored response instead of running it again.
+    Requests without a key run as usual.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        # Imported here because app/__init__.py imports this module before `db` exists.
+        from app import db
+        from app.models import IdempotencyKeys
+
+        key = request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 64:
+            abort(400)
+
+        request_hash = _request_hash()
+        record = _claim(key, request_hash)
+        if record is not None:
+            if record.request_hash != request_hash:
+                abort(422) # Same key, different request: a client bug, never replay across requests
+            if record.status_code is None:
+                abort(409)
+            return _replay(record)
+
+        flashed_before = len(session.get('_flashes', []))
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            # Nothing was stored, so release the key and let the client retry for real.
+            db.session.rollback()
+            IdempotencyKeys.query.filter_by(user_id=current_user.id, key=key).delete()
+            db.session.commit()
+            raise
+
+        record = IdempotencyKeys.query.filter_by(user_id=current_user.id, key=key).one()
+        record.status_code = response.status_code
+        record.location = response.headers.get('Location')
+        if not response.is_streamed:
+            record.response_body = response.get_data(as_text=True)
+        record.flashes = json.dumps(session.get('_flashes', [])[flashed_before:])
+        db.session.commit()
+        return response
+    return decorated_function
+
+
+class Idempotency:
+    """Registers the config defaults and the `idempotency_token()` template helper."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IDEMPOTENCY_TTL', 24 * 3600)
+        app.config.setdefault('IDEMPOTENCY_WAIT', 5)
+        app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', 60)
+        app.add_template_global(idempotency_token)
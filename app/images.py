@@ -0,0 +1,169 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import current_app, abort, send_from_directory, url_for
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.assets import ONE_YEAR
+
+STATE_KEY = 'service_images'
+UPLOAD_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+THUMBNAIL_NAME_RE = re.compile(r'^([0-9a-f]{64})-(\d+)x(\d+)\.webp$')
+
+
+class InvalidImage(ValueError):
+    """An upload that isn't a readable JPEG, PNG, WebP or GIF image."""
+
+
+def _write_atomically(path, data):
+    partial = f"{path}.{threading.get_ident()}.part"
+    with open(partial, 'wb') as f:
+        f.write(data)
+    os.replace(partial, path)  # Readers see the whole file or nothing
+
+
+class _ImageStore:
+    """
+    Originals live under IMAGE_FOLDER/originals as <sha256>.<ext>, never served directly.
+    Thumbnails live under IMAGE_FOLDER/thumbnails as <sha256>-<width>x<height>.webp, one per
+    size in IMAGE_SIZES (and at twice that, for high-density screens). Both names only depend
+    on content, so a URL always means the same bytes and can be cached for a year.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.folder = app.config['IMAGE_FOLDER'] or os.path.join(app.instance_path, 'images')
+        self.originals = os.path.join(self.folder, 'originals')
+        self.thumbnails = os.path.join(self.folder, 'thumbnails')
+        os.makedirs(self.originals, exist_ok=True)
+        os.makedirs(self.thumbnails, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'], thread_name_prefix='thumbnails')
+        self.lock = threading.Lock()
+        self.pending = {}  # Thumbnail name -> Future of whoever is rendering it
+
+    def dimensions(self):
+        """Every (width, height) rendered: each configured size at 1x and 2x."""
+        return {(width * scale, height * scale) for width, height in self.app.config['IMAGE_SIZES'].values() for scale in (1, 2)}
+
+    def save(self, data):
+        """Validates and stores an uploaded original, queues its thumbnails, and returns its key."""
+        try:
+            with Image.open(BytesIO(data)) as image:  # Only reads the header
+                image_format, (width, height) = image.format, image.size
+                if width * height > self.app.config['IMAGE_MAX_PIXELS']:
+                    raise InvalidImage(f"The image is too large ({width}x{height} pixels).")
+                image.verify()  # Reads the whole file, catching truncated or corrupt uploads
+        except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as error:
+            raise InvalidImage("The file is not a readable image.") from error
+        if image_format not in UPLOAD_FORMATS:
+            raise InvalidImage(f"{image_format} images are not supported; use JPEG, PNG, WebP or GIF.")
+
+        digest = hashlib.sha256(data).hexdigest()
+        key = f"{digest}.{UPLOAD_FORMATS[image_format]}"
+        path = os.path.join(self.originals, key)
+        if not os.path.exists(path):  # Same bytes, same key: a re-upload is free
+            _write_atomically(path, data)
+        for width, height in self.dimensions():
+            self.render(digest, width, height, wait=False)
+        return key
+
+    def original_path(self, digest):
+        for ext in UPLOAD_FORMATS.values():
+            path = os.path.join(self.originals, f"{digest}.{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def render(self, digest, width, height, wait=True):
+        """
+        Makes sure the thumbnail exists, rendering it on the pool unless it already is. With
+        `wait`, returns once it is on disk (or raises what the rendering raised).
+        """
+        name = f"{digest}-{width}x{height}.webp"
+        if os.path.exists(os.path.join(self.thumbnails, name)):
+            return name
+        with self.lock:
+            future = self.pending.get(name)
+            if future is None:
+                future = self.pending[name] = self.executor.submit(self._render, digest, width, height, name)
+                future.add_done_callback(lambda _: self._forget(name))
+        if wait:
+            future.result()
+        return name
+
+    def _forget(self, name):
+        with self.lock:
+            self.pending.pop(name, None)
+
+    def _render(self, digest, width, height, name):
+        with Image.open(self.original_path(digest)) as image:
+            image = ImageOps.exif_transpose(image)  # Phone photos are often stored sideways
+            image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            thumbnail = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        thumbnail.save(output, 'WEBP', quality=self.app.config['IMAGE_QUALITY'], method=6)
+        _write_atomically(os.path.join(self.thumbnails, name), output.getvalue())
+
+    def send(self, name):
+        match = THUMBNAIL_NAME_RE.match(name)
+        if not match:
+            abort(404)
+        digest, width, height = match.group(1), int(match.group(2)), int(match.group(3))
+        # Only the sizes we render, so nobody can make us produce (and store) arbitrary ones.
+        if (width, height) not in self.dimensions() or self.original_path(digest) is None:
+            abort(404)
+        # Normally rendered right after the upload; this covers a request that beats the pool,
+        # or a size added to IMAGE_SIZES since.
+        self.render(digest, width, height)
+        response = send_from_directory(self.thumbnails, name, mimetype='image/webp', max_age=ONE_YEAR)
+        response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+        return response
+
+
+def save_service_image(file_storage):
+    """Stores an uploaded image (a werkzeug FileStorage) and returns the key for Services.image_url."""
+    data = file_storage.read(current_app.config['IMAGE_MAX_BYTES'] + 1)
+    if len(data) > current_app.config['IMAGE_MAX_BYTES']:
+        raise InvalidImage(f"Images can be at most {current_app.config['IMAGE_MAX_BYTES'] // (1024 * 1024)} MB.")
+    return current_app.extensions[STATE_KEY].save(data)
+
+
+def service_image(image_key, size):
+    """
+    {'src', 'srcset', 'width', 'height'} for showing an image at one of IMAGE_SIZES, or None
+    without an image. Available in templates.
+    """
+    if not image_key:
+        return None
+    width, height = current_app.config['IMAGE_SIZES'][size]
+    digest = image_key.split('.')[0]
+    src = url_for('service_image', name=f"{digest}-{width}x{height}.webp")
+    retina = url_for('service_image', name=f"{digest}-{width * 2}x{height * 2}.webp")
+    return {'src': src, 'srcset': f"{src} 1x, {retina} 2x", 'width': width, 'height': height}
+
+
+class ServiceImages:
+    """
+    Service image uploads: originals stored as uploaded, thumbnails rendered in the background
+    (IMAGE_WORKERS threads) for every size the templates show, served content-addressed from
+    /images/ with year-long immutable caching.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_FOLDER', None)
+        app.config.setdefault('IMAGE_SIZES', {'card': (320, 180), 'thumb': (64, 64)})
+        app.config.setdefault('IMAGE_QUALITY', 80)
+        app.config.setdefault('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('IMAGE_MAX_PIXELS', 40_000_000)
+        app.config.setdefault('IMAGE_WORKERS', 2)
+        app.extensions[STATE_KEY] = store = _ImageStore(app)
+        app.add_url_rule('/images/<name>', 'service_image', store.send)
+        app.add_template_global(service_image)
@@ -0,0 +1,283 @@
+import itertools
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select, update, func, or_, and_, bindparam
+
+from app import db
+from app.models import Users, Customers, ServiceProfessionals, ServiceRequests, ServiceStatus, RequestRejections
+from app.events import broker, removed_event
+from app.metrics import AUTO_ASSIGNMENTS
+from app.dashboard_cache import invalidate_on_commit, professional_scope
+from app.regions import scatter, merge_sorted, in_region, region_for_id
+
+# Professionals without any reviews are scored as if they were rated this.
+DEFAULT_RATING = 3.0
+OPEN_STATUSES = (ServiceStatus.REQUESTED, ServiceStatus.ACCEPTED)
+
+
+def pin_proximity(pin_a, pin_b):
+    """Shared leading digits of two PIN codes, as a fraction. PINs are hierarchical, so a longer prefix is closer."""
+    if not pin_a or not pin_b:
+        return 0.0
+    shared = 0
+    for a, b in zip(pin_a, pin_b):
+        if a != b:
+            break
+        shared += 1
+    return shared / max(len(pin_a), len(pin_b))
+
+
+class Candidate:
+    __slots__ = ('id', 'username', 'pin', 'rating', 'load')
+
+    def __init__(self, id, username, pin, rating, load):
+        self.id = id
+        self.username = username
+        self.pin = pin
+        self.rating = rating
+        self.load = load
+
+
+class PendingRequest:
+    __slots__ = ('id', 'service_id', 'professional_id', 'customer_id', 'customer', 'customer_pin',
+                 'proposed_price', 'date_of_request', 'excluded')
+
+    def __init__(self, id, service_id, professional_id, customer_id, customer, customer_pin, proposed_price, date_of_request):
+        self.id = id
+        self.service_id = service_id
+        self.professional_id = professional_id
+        self.customer_id = customer_id
+        self.customer = customer
+        self.customer_pin = customer_pin
+        self.proposed_price = proposed_price
+        self.date_of_request = date_of_request
+        self.excluded = set()
+
+
+class MatchingEngine:
+    """
+    Ranks and assigns rejected or unassigned requests to verified, unblocked professionals.
+
+    Everything is loaded up front with a handful of set-based queries into in-memory indexes
+    (candidates per service, rejecters per request), so scoring never touches the database.
+    """
+
+    def __init__(self, weights=None, max_open=None):
+        config = current_app.config
+        self.weights = weights or config['AUTO_ASSIGN_WEIGHTS']
+        self.max_open = max_open if max_open is not None else config['AUTO_ASSIGN_MAX_OPEN']
+        self.requests = []
+        self.candidates = {}  # service_id -> [Candidate]
+        self.active_pairs = set()  # (customer_id, professional_id) with an open request
+        self.skipped = 0  # planned assignments lost to concurrent changes
+
+    # --- Loading ---
+
+    def load(self, request_ids=None):
+        """Loads pending requests (optionally only `request_ids`) and everyone who could take them."""
+        pending_filter = or_(
+            ServiceRequests.service_status == ServiceStatus.REJECTED,
+            and_(ServiceRequests.service_status == ServiceStatus.REQUESTED, ServiceRequests.professional_id.is_(None))
+        )
+        query = (
+            select(ServiceRequests.id, ServiceRequests.service_id, ServiceRequests.professional_id,
+                   ServiceRequests.customer_id, Users.username, Users.pin, ServiceRequests.proposed_price, ServiceRequests.date_of_request)
+            .join(Customers, ServiceRequests.customer_id == Customers.id)
+            .join(Users, Customers.user_id == Users.id)
+            .where(pending_filter)
+            .order_by(ServiceRequests.date_of_request, ServiceRequests.id)
+        )
+        if request_ids is not None:
+            query = query.where(ServiceRequests.id.in_(request_ids))
+        # Every region's pending requests, still oldest first overall.
+        self.requests = merge_sorted(
+            scatter(lambda: [PendingRequest(*row) for row in db.session.execute(query)]),
+            key=lambda req: (req.date_of_request, req.id)
+        )
+        by_id = {req.id: req for req in self.requests}
+
+        # Whoever currently holds a rejected request rejected it, plus everyone recorded before them.
+        for req in self.requests:
+            if req.professional_id:
+                req.excluded.add(req.professional_id)
+        rejections = (
+            select(RequestRejections.service_request_id, RequestRejections.professional_id)
+            .join(ServiceRequests, RequestRejections.service_request_id == ServiceRequests.id)
+            .where(pending_filter)
+        )
+        for request_id, professional_id in itertools.chain.from_iterable(scatter(lambda: db.session.execute(rejections).all())):
+            if request_id in by_id:
+                by_id[request_id].excluded.add(professional_id)
+
+        # A customer can only have one open request per professional (uq_service_requests_active_pair).
+        customer_ids = {req.customer_id for req in self.requests}
+        active_pairs = (
+            select(ServiceRequests.customer_id, ServiceRequests.professional_id)
+            .where(ServiceRequests.customer_id.in_(customer_ids),
+                   ServiceRequests.professional_id.isnot(None),
+                   ServiceRequests.service_status.in_(OPEN_STATUSES))
+        )
+        self.active_pairs = set().union(
+            *scatter(lambda: db.session.execute(active_pairs).tuples().all())
+        ) if customer_ids else set()
+
+        service_ids = {req.service_id for req in self.requests}
+        self.candidates = self._load_candidates(service_ids) if service_ids else {}
+        return self
+
+    @staticmethod
+    def _load_candidates(service_ids):
+        open_counts = (
+            select(ServiceRequests.professional_id, func.count(ServiceRequests.id))
+            .where(ServiceRequests.professional_id.isnot(None), ServiceRequests.service_status.in_(OPEN_STATUSES))
+            .group_by(ServiceRequests.professional_id)
+        )
+        loads = Counter()
+        for rows in scatter(lambda: db.session.execute(open_counts).all()):
+            loads.update(dict(rows))
+        rows = db.session.execute(
+            select(ServiceProfessionals.id, ServiceProfessionals.service_id, Users.username, Users.pin,
+                   ServiceProfessionals.rating_avg, ServiceProfessionals.rating_count)
+            .join(Users, ServiceProfessionals.user_id == Users.id)
+            .where(
+                ServiceProfessionals.service_id.in_(service_ids),
+                ServiceProfessionals.is_verified == True,
+                ServiceProfessionals.admin_blocked == False,
+                Users.is_active == True
+            )
+        )
+        candidates = {}
+        for prof_id, service_id, username, pin, rating_avg, rating_count in rows:
+            candidates.setdefault(service_id, []).append(
+                Candidate(prof_id, username, pin, rating_avg if rating_count else DEFAULT_RATING, loads[prof_id])
+            )
+        return candidates
+
+    # --- Scoring ---
+    # rank() (the admin's suggestions) and plan() (auto-assign) share these, so they can't disagree.
+
+    def eligible(self, req, candidate):
+        """Whether `candidate` may take `req`: not among its rejecters, below max_open, and no open request from its customer."""
+        return (candidate.load < self.max_open and candidate.id not in req.excluded
+                and (req.customer_id, candidate.id) not in self.active_pairs)
+
+    def match_score(self, req, candidate):
+        """The rating and proximity terms of the score, which stay put as assignments are made."""
+        weights = self.weights
+        return weights['rating'] * candidate.rating / 5 + weights['proximity'] * pin_proximity(req.customer_pin, candidate.pin)
+
+    def load_score(self, candidate):
+        """The load term of the score, which falls with each assignment the candidate takes on."""
+        return self.weights['load'] / (1 + candidate.load)
+
+    def score(self, req, candidate):
+        return self.match_score(req, candidate) + self.load_score(candidate)
+
+    def rank(self, req):
+        """Eligible candidates for one request, best first, with their scores."""
+        ranked = [
+            (self.score(req, candidate), candidate)
+            for candidate in self.candidates.get(req.service_id, ())
+            if self.eligible(req, candidate)
+        ]
+        ranked.sort(key=lambda pair: pair[0], reverse=True)
+        return ranked
+
+    def plan(self):
+        """
+        Greedy assignment, oldest request first. Each assignment raises the chosen professional's
+        load, so later requests naturally spread across the pool. Returns [(request, candidate)].
+        """
+        eligible, match_score, load_score = self.eligible, self.match_score, self.load_score
+        static_scores = {}  # (service_id, customer_pin) -> per-candidate match_score()
+        assignments = []
+        for req in self.requests:
+            candidates = self.candidates.get(req.service_id)
+            if not candidates:
+                continue
+            key = (req.service_id, req.customer_pin)
+            static = static_scores.get(key)
+            if static is None:
+                static = static_scores[key] = [match_score(req, c) for c in candidates]
+
+            best, best_score = None, -1.0
+            for candidate, partial in zip(candidates, static):
+                if not eligible(req, candidate):
+                    continue
+                candidate_score = partial + load_score(candidate)
+                if candidate_score > best_score:
+                    best, best_score = candidate, candidate_score
+            if best is not None:
+                best.load += 1
+                self.active_pairs.add((req.customer_id, best.id))
+                assignments.append((req, best))
+        return assignments
+
+    # --- Applying ---
+
+    def assign_all(self, dry_run=False):
+        """
+        Plans and commits every assignment, one bulk UPDATE per region, and pushes the applied ones
+        to both professionals' dashboards. Returns the planned assignments; `skipped` of them lost
+        out to concurrent changes.
+        """
+        assignments = self.plan()
+        if dry_run or not assignments:
+            return assignments
+
+        now = datetime.utcnow()
+        # The WHERE clause makes this a compare-and-set: a request whose status or professional
+        # changed since it was loaded (e.g. reassigned by hand) is skipped instead of overwritten.
+        table = ServiceRequests.__table__
+        statement = (
+            update(table)
+            .where(
+                table.c.id == bindparam('b_id'),
+                table.c.service_status == bindparam('b_status'),
+                table.c.professional_id.is_not_distinct_from(bindparam('b_current_professional_id')),
+            )
+            .values(professional_id=bindparam('b_professional_id'),
+                    service_status=ServiceStatus.REQUESTED,
+                    version=table.c.version + 1,
+                    updated_at=now)
+        )
+        assignments_by_region = {}
+        for req, candidate in assignments:
+            assignments_by_region.setdefault(region_for_id(req.id), []).append((req, candidate))
+        applied = []
+        for region, planned in assignments_by_region.items():
+            with in_region(region):
+                db.session.execute(statement, [{
+                    'b_id': req.id,
+                    'b_status': ServiceStatus.REQUESTED if req.professional_id is None else ServiceStatus.REJECTED,
+                    'b_current_professional_id': req.professional_id,
+                    'b_professional_id': candidate.id,
+                } for req, candidate in planned])
+                # executemany only reports a total rowcount, so the rows this run changed are read
+                # back (in the same transaction) by the updated_at it stamped on them.
+                changed = set(db.session.execute(
+                    select(ServiceRequests.id, ServiceRequests.professional_id)
+                    .where(ServiceRequests.id.in_([req.id for req, _ in planned]), ServiceRequests.updated_at == now)
+                ).tuples())
+                applied += [(req, candidate) for req, candidate in planned if (req.id, candidate.id) in changed]
+        invalidate_on_commit(db.session, *{professional_scope(professional_id) for req, candidate in applied
+                                           for professional_id in (req.professional_id, candidate.id) if professional_id})
+        db.session.commit()
+        self.skipped = len(assignments) - len(applied)
+        AUTO_ASSIGNMENTS.inc(len(applied))
+
+        for req, candidate in applied:
+            broker.publish(candidate.id, {
+                'id': req.id,
+                'status': ServiceStatus.REQUESTED.name,
+                'customer': req.customer,
+                'proposed_price': req.proposed_price,
+                'date_requested': req.date_of_request.strftime('%Y-%m-%d %H:%M'),
+                'date_completed': None,
+                'updated_at': now.isoformat(),
+            })
+            if req.professional_id:  # The professional who rejected it no longer sees it, see publish_request
+                broker.publish(req.professional_id, removed_event(req.id, now))
+        return assignments
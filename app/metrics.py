@@ -0,0 +1,159 @@
+import hmac
+import os
+import time
+
+from flask import request, g, current_app, abort, Response
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+# prometheus_client picks its storage when it is imported: with PROMETHEUS_MULTIPROC_DIR set
+# (before the server forks), every worker writes its samples to mmap'd files in that directory
+# and a scrape of any one worker reads and sums them all.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests handled.',
+                   ['method', 'blueprint', 'endpoint', 'status'])
+LATENCY = Histogram('http_request_duration_seconds', 'Time spent producing a response.',
+                    ['blueprint', 'endpoint'])
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests currently being handled.',
+                  multiprocess_mode='livesum')
+
+DB_POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                                  ['bind'], buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 10, 30))
+DB_POOL_SIZE = Gauge('db_pool_size', 'Connections the pool keeps open.', ['bind'], multiprocess_mode='livesum')
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Pooled connections currently in use.', ['bind'],
+                            multiprocess_mode='livesum')
+
+BOOKINGS_CREATED = Counter('bookings_created_total', 'Service requests booked by customers.')
+REQUEST_TRANSITIONS = Counter('service_request_transitions_total', 'Committed service request status changes.',
+                             ['from_status', 'to_status'])
+AUTO_ASSIGNMENTS = Counter('auto_assignments_total', 'Requests assigned by the matching engine.')
+WRITE_BATCH_UNITS = Histogram('write_batch_units', 'Write units committed together by the write coordinator.',
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+WRITE_QUEUE_WAIT = Histogram('write_queue_wait_seconds', 'Time a write unit waited for the write coordinator.',
+                             buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5))
+DASHBOARD_CACHE_LOOKUPS = Counter('dashboard_cache_lookups_total', 'Dashboard views served from the cache (hit) or recomputed (miss).',
+                                  ['view', 'result'])
+
+PENDING_KEY = 'metrics_pending'
+
+
+def count_on_commit(session, counter, amount=1, **labels):
+    """Increments `counter` once `session` commits; a rollback discards it."""
+    session.info.setdefault(PENDING_KEY, []).append((counter, labels, amount))
+
+
+def _publish_pending(session):
+    for counter, labels, amount in session.info.pop(PENDING_KEY, ()):
+        (counter.labels(**labels) if labels else counter).inc(amount)
+
+
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def _instrument_engine(bind, engine):
+    """Times every pool checkout and tracks pool usage for one engine."""
+    label = bind or 'default'
+    wait = DB_POOL_CHECKOUT_WAIT.labels(bind=label)
+    checked_out = DB_POOL_CHECKED_OUT.labels(bind=label)
+
+    # The pool has no event for "started waiting", so its class is swapped for a subclass that
+    # times _do_get (the blocking part of checkout). Recreated pools keep the subclass.
+    pool = engine.pool
+    base = type(pool)
+    if not getattr(base, '_checkout_timed', False):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return base._do_get(self)
+            finally:
+                wait.observe(time.perf_counter() - start)
+        pool.__class__ = type(base.__name__, (base,), {'_do_get': _do_get, '_checkout_timed': True})
+
+    if isinstance(pool, QueuePool):  # The only pool class that keeps these numbers
+        DB_POOL_SIZE.labels(bind=label).set(pool.size())
+        event.listen(engine, 'checkout', lambda *args: checked_out.set(engine.pool.checkedout()))
+        event.listen(engine, 'checkin', lambda *args: checked_out.set(engine.pool.checkedout()))
+
+
+def child_exit(server, worker):
+    """Gunicorn `child_exit` hook: drops a dead worker's live gauges from the shared files."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class Metrics:
+    """
+    Prometheus metrics: request counts and latency per endpoint (labelled by blueprint),
+    in-flight requests, database pool wait and usage, and business counters. Served at
+    METRICS_PATH in the text exposition format; set METRICS_TOKEN to require a bearer token.
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+        from app.regions import STATE_KEY as REGIONS_KEY
+
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('METRICS_TOKEN', None)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.before_request(self._start_request)
+        app.after_request(self._record_request)
+        app.teardown_request(self._end_request)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self.metrics_view)
+
+        with app.app_context():
+            for bind, engine in db.engines.items():
+                _instrument_engine(bind, engine)
+            for region, engine in getattr(app.extensions.get(REGIONS_KEY), 'engines', {}).items():
+                _instrument_engine(f'region_{region}', engine)
+        if not Metrics._listening:  # db.session is shared by every app
+            event.listen(db.session, 'after_commit', _publish_pending)
+            event.listen(db.session, 'after_rollback', _discard_pending)
+            Metrics._listening = True
+
+    @staticmethod
+    def _start_request():
+        g._metrics_start = time.perf_counter()
+        g._metrics_in_flight = True
+        IN_FLIGHT.inc()
+
+    @staticmethod
+    def _record_request(response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            # Unmatched URLs share one label so random paths can't grow the series count.
+            endpoint = request.endpoint or 'unmatched'
+            blueprint = request.blueprint or ''
+            LATENCY.labels(blueprint, endpoint).observe(time.perf_counter() - start)
+            REQUESTS.labels(request.method, blueprint, endpoint, str(response.status_code)).inc()
+        return response
+
+    @staticmethod
+    def _end_request(exc):
+        # Teardown runs even when a response was never produced.
+        if g.pop('_metrics_in_flight', False):
+            IN_FLIGHT.dec()
+
+    @staticmethod
+    def metrics_view():
+        token = current_app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(401)
+        if MULTIPROCESS:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -2,7 +2,11 @@ import enum
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db, login_manager  # ### REFINEMENT ### Import db and login_manager from our app package
+from app.metrics import count_on_commit, REQUEST_TRANSITIONS
+from app.dashboard_cache import invalidate_on_commit, professional_scope
+from app.regions import region_for_id
 import secrets
 
 
@@ -87,7 +91,7 @@ class Services(BaseModel):
     service_type = db.Column(db.String(80), unique=True, nullable=False, index=True)
     description = db.Column(db.Text, nullable=True)
     base_price = db.Column(db.Float, nullable=False)
-    image_url = db.Column(db.String(255), nullable=True)
+    image_url = db.Column(db.String(255), nullable=True) # Key of the uploaded original, see app/images.py
 
     professionals = db.relationship("ServiceProfessionals", back_populates="service") # ### REFINEMENT ### Removed cascade here. Deleting a service should not automatically delete professionals. It's better to handle this logic explicitly (e.g., prevent service deletion if professionals are assigned).
     service_requests = db.relationship("ServiceRequests", back_populates="service")
@@ -98,24 +102,73 @@ class Services(BaseModel):
 # ----------------------------
 # Service Professionals
 # ----------------------------
+# Professionals customers can find and book; the same rule as the customer dashboard search.
+LISTED_WHERE = "is_verified = 1 AND admin_blocked = 0"
+LISTED_WHERE_PG = "is_verified AND NOT admin_blocked"
+
+
 class ServiceProfessionals(BaseModel):
     __tablename__ = 'service_professionals'
+    # Discovery API (/api/v1/professionals): one keyset index per sort order, with and without
+    # a service filter, covering only listed professionals.
+    __table_args__ = tuple(
+        db.Index(f'ix_service_professionals_listed_{name}', *columns,
+                 sqlite_where=db.text(LISTED_WHERE), postgresql_where=db.text(LISTED_WHERE_PG))
+        for name, columns in (
+            ('rating', ('rating_avg', 'id')),
+            ('experience', ('experience', 'id')),
+            ('service_rating', ('service_id', 'rating_avg', 'id')),
+            ('service_experience', ('service_id', 'experience', 'id')),
+        )
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey("services.id"), nullable=False) # ### REFINEMENT ### Removed ondelete="CASCADE". Same reason as above.
     description = db.Column(db.Text, nullable=True)
-    experience = db.Column(db.Integer, nullable=True)
+    experience = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     document = db.Column(db.String(255), nullable=True)
     is_verified = db.Column(db.Boolean, default=False, nullable=False)
     verification_failed = db.Column(db.Boolean, default=False, nullable=False)
     admin_blocked = db.Column(db.Boolean, default=False, nullable=False)
+    # Denormalised from reviews so listings can sort and filter by rating on an index.
+    # Kept up to date by the Reviews mapper events below.
+    rating_avg = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     user = db.relationship("Users", back_populates="professional")
     service = db.relationship("Services", back_populates="professionals")
     service_requests = db.relationship("ServiceRequests", back_populates="professional", cascade="all, delete-orphan")
     reviews = db.relationship("Reviews", back_populates="professional", cascade="all, delete-orphan")
 
+    @classmethod
+    def listed(cls):
+        """Filter for professionals shown to customers: verified and not blocked by an admin."""
+        return db.and_(cls.is_verified == True, cls.admin_blocked == False)
+
+    @staticmethod
+    def adjust_rating_statement(professional_id, count_delta, rating_delta):
+        """
+        UPDATE folding `count_delta` reviews totalling `rating_delta` stars into a professional's
+        rating_avg / rating_count. Incremental, since reviews may be spread over several region
+        databases and no one connection sees them all.
+        """
+        table = ServiceProfessionals.__table__
+        count = table.c.rating_count + count_delta
+        return (
+            db.update(table).where(table.c.id == professional_id)
+            .values(
+                rating_avg=db.case(
+                    (count > 0, (table.c.rating_avg * table.c.rating_count + rating_delta) / db.cast(count, db.Float)),
+                    else_=0,
+                ),
+                rating_count=count,
+                # Explicit, not left to onupdate: the admin dashboard's section ETags (and so the
+                # ranked reassignment candidates) only see a new rating through updated_at.
+                updated_at=datetime.utcnow(),
+            )
+        )
+
 
 # ----------------------------
 # Enum for Service Status
@@ -128,11 +181,45 @@ class ServiceStatus(enum.Enum):
     PAID = "paid"
 
 
+# Every status change a request may make. ServiceRequests.transition enforces it.
+STATUS_TRANSITIONS = {
+    ServiceStatus.REQUESTED: {ServiceStatus.ACCEPTED, ServiceStatus.REJECTED},
+    ServiceStatus.ACCEPTED: {ServiceStatus.CLOSED},
+    ServiceStatus.REJECTED: {ServiceStatus.REQUESTED}, # Reassigned to another professional
+    ServiceStatus.CLOSED: {ServiceStatus.PAID},
+    ServiceStatus.PAID: set(),
+}
+
+
+class InvalidTransition(Exception):
+    """The request's current status does not allow the requested change."""
+
+
+class TransitionConflict(Exception):
+    """Someone else changed the request between reading it and writing it."""
+
+
 # ----------------------------
 # Service Requests
 # ----------------------------
 class ServiceRequests(BaseModel):
     __tablename__ = 'service_requests'
+    __table_args__ = (
+        # Keyset pagination of a customer's history walks this index newest-first.
+        db.Index('ix_service_requests_customer_created', 'customer_id', 'created_at', 'id'),
+        # At most one active (requested or accepted) request per customer/professional pair,
+        # enforced by the database so concurrent double-submits cannot both succeed.
+        db.Index(
+            'uq_service_requests_active_pair', 'customer_id', 'professional_id', unique=True,
+            sqlite_where=db.text("service_status IN ('REQUESTED', 'ACCEPTED')"),
+            postgresql_where=db.text("service_status IN ('REQUESTED', 'ACCEPTED')")
+        ),
+        # 'flask rollup' finds changed requests by updated_at and recounts whole days of requests.
+        db.Index('ix_service_requests_updated_at', 'updated_at'),
+        db.Index('ix_service_requests_date_of_request', 'date_of_request'),
+        # Ids are never reused and start from each region's own range, see app.regions.
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     service_id = db.Column(db.Integer, db.ForeignKey("services.id"), nullable=False, index=True)
@@ -144,25 +231,86 @@ class ServiceRequests(BaseModel):
     date_of_completion = db.Column(db.DateTime, nullable=True)
     service_status = db.Column(db.Enum(ServiceStatus), default=ServiceStatus.REQUESTED, nullable=False, index=True)
     remarks = db.Column(db.Text, nullable=True) # ### REFINEMENT ### Moved this from Reviews to here, as remarks are on the service itself.
+    version = db.Column(db.Integer, nullable=False, server_default='1') # Bumped on every write, see __mapper_args__
 
     service = db.relationship("Services", back_populates="service_requests")
     customer = db.relationship("Customers", back_populates="service_requests")
     professional = db.relationship("ServiceProfessionals", back_populates="service_requests")
     review = db.relationship("Reviews", back_populates="service_request", uselist=False, cascade="all, delete-orphan") # ### REFINEMENT ### Changed to 'review' (singular) and uselist=False for a one-to-one relationship.
 
+    # Every ORM flush of a request checks and bumps `version`, so a write based on a stale read
+    # raises StaleDataError instead of silently overwriting someone else's change.
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
      return f"<ServiceRequest id={self.id}>"
+
+    @classmethod
+    def unchanged(cls, request_id, version):
+        """
+        The request loaded for a write unit (see app/writer.py), which may run in another
+        session than the caller's read: raises TransitionConflict if it changed since the
+        caller saw `version`.
+        """
+        service_request = db.session.get(cls, request_id, bind_arguments={'region': region_for_id(request_id)})
+        if service_request is None or service_request.version != version:
+            raise TransitionConflict(f"Request #{request_id} was changed by someone else")
+        return service_request
+
+    def transition(self, new_status, **values):
+        """
+        Moves the request to `new_status` (setting any extra column `values`) with a single
+        compare-and-set UPDATE on the status and version this object was loaded with.
+        Raises InvalidTransition if the change isn't allowed and TransitionConflict if the row
+        changed in the meantime. The caller commits, or rolls back on either error.
+        """
+        if new_status not in STATUS_TRANSITIONS[self.service_status]:
+            raise InvalidTransition(f"Cannot move request #{self.id} from {self.service_status.value} to {new_status.value}")
+        db.session.flush() # Pending ORM changes to this row would otherwise bump the version under us
+
+        values.update(service_status=new_status, updated_at=datetime.utcnow())
+        result = db.session.execute(
+            db.update(ServiceRequests)
+            .where(ServiceRequests.id == self.id,
+                   ServiceRequests.service_status == self.service_status,
+                   ServiceRequests.version == self.version)
+            .values(version=ServiceRequests.version + 1, **values)
+            .execution_options(synchronize_session=False),
+            bind_arguments={'region': region_for_id(self.id)},
+        )
+        if result.rowcount != 1:
+            raise TransitionConflict(f"Request #{self.id} was changed by someone else")
+        count_on_commit(db.session, REQUEST_TRANSITIONS, from_status=self.service_status.name, to_status=new_status.name)
+        professional_ids = {self.professional_id, values.get('professional_id')} - {None}
+        invalidate_on_commit(db.session, *map(professional_scope, professional_ids))
+
+        # Bring this object up to date without another SELECT.
+        values['version'] = self.version + 1
+        for key, value in values.items():
+            set_committed_value(self, key, value)
+        if 'professional_id' in values:
+            db.session.expire(self, ['professional'])
 # ----------------------------
 # Reviews
 # ----------------------------
 class Reviews(BaseModel):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.UniqueConstraint('archived_request_id', name='uq_reviews_archived_request_id'),
+        # A professional's reviews are listed newest first, a keyset page at a time.
+        db.Index('ix_reviews_professional_created', 'professional_id', 'created_at', 'id'),
+        db.Index('ix_reviews_updated_at', 'updated_at'),
+        db.Index('ix_reviews_created_at', 'created_at'),
+        {'sqlite_autoincrement': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=False, index=True)
     professional_id = db.Column(db.Integer, db.ForeignKey("service_professionals.id"), nullable=False, index=True)
     service_id = db.Column(db.Integer, db.ForeignKey("services.id"), nullable=False, index=True)
-    service_request_id = db.Column(db.Integer, db.ForeignKey("service_requests.id"), unique=True, nullable=False)
+    service_request_id = db.Column(db.Integer, db.ForeignKey("service_requests.id"), unique=True, nullable=True)
+    # Set instead of service_request_id once the request has been moved to the archive.
+    archived_request_id = db.Column(db.Integer, db.ForeignKey("service_requests_archive.id", name="fk_reviews_archived_request_id"), nullable=True)
 
     rating = db.Column(db.Integer, db.CheckConstraint('rating >= 1 AND rating <= 5'), nullable=False)
     remarks = db.Column(db.Text, nullable=True) # ### REFINEMENT ### Keeping remarks here as well for specific review comments.
@@ -170,4 +318,138 @@ class Reviews(BaseModel):
     customer = db.relationship("Customers", back_populates="reviews")
     professional = db.relationship("ServiceProfessionals", back_populates="reviews")
     service = db.relationship("Services", back_populates="reviews")
-    service_request = db.relationship("ServiceRequests", back_populates="review")
\ No newline at end of file
+    service_request = db.relationship("ServiceRequests", back_populates="review")
+    archived_request = db.relationship("ArchivedServiceRequests", back_populates="review")
+
+
+@db.event.listens_for(Reviews, 'after_insert')
+def _rate_inserted(mapper, connection, review):
+    _adjust_ratings(review, [(review.professional_id, 1, review.rating)])
+
+
+@db.event.listens_for(Reviews, 'after_update')
+def _rate_updated(mapper, connection, review):
+    attrs = db.inspect(review).attrs
+    professional, rating = attrs.professional_id.history, attrs.rating.history
+    if not (professional.deleted or rating.deleted):
+        return
+    old_professional = (professional.deleted or [review.professional_id])[0]
+    old_rating = (rating.deleted or [review.rating])[0]
+    _adjust_ratings(review, [(old_professional, -1, -old_rating), (review.professional_id, 1, review.rating)])
+
+
+@db.event.listens_for(Reviews, 'after_delete')
+def _rate_deleted(mapper, connection, review):
+    _adjust_ratings(review, [(review.professional_id, -1, -review.rating)])
+
+
+def _adjust_ratings(review, changes):
+    # Runs inside the flush, so the rating changes in the same transaction as the review. On the
+    # main database's connection, which may not be the one the review itself was written with.
+    connection = db.object_session(review).connection(bind_arguments={'mapper': db.inspect(ServiceProfessionals)})
+    for professional_id, count_delta, rating_delta in changes:
+        connection.execute(ServiceProfessionals.adjust_rating_statement(professional_id, count_delta, rating_delta))
+
+
+# ----------------------------
+# Archived Service Requests
+# ----------------------------
+class ArchivedServiceRequests(BaseModel):
+    __tablename__ = 'service_requests_archive'
+    __table_args__ = (
+        db.Index('ix_service_requests_archive_customer_created', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_service_requests_archive_updated_at', 'updated_at'),
+        db.Index('ix_service_requests_archive_date_of_request', 'date_of_request'),
+    )
+
+    # Paid and rejected requests moved out of service_requests by 'flask archive-requests',
+    # so the hot table (and its indexes) only hold recent work. Ids are kept as they were.
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    service_id = db.Column(db.Integer, db.ForeignKey("services.id"), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=False)
+    professional_id = db.Column(db.Integer, db.ForeignKey("service_professionals.id"), nullable=True, index=True)
+
+    proposed_price = db.Column(db.Float, nullable=True)
+    date_of_request = db.Column(db.DateTime, nullable=False)
+    date_of_completion = db.Column(db.DateTime, nullable=True)
+    service_status = db.Column(db.Enum(ServiceStatus), nullable=False)
+    remarks = db.Column(db.Text, nullable=True)
+    version = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    service = db.relationship("Services")
+    customer = db.relationship("Customers")
+    professional = db.relationship("ServiceProfessionals")
+    review = db.relationship("Reviews", back_populates="archived_request", uselist=False)
+
+    def __repr__(self):
+     return f"<ArchivedServiceRequest id={self.id}>"
+
+
+# ----------------------------
+# Request Rejections
+# ----------------------------
+class RequestRejections(BaseModel):
+    __tablename__ = 'request_rejections'
+    __table_args__ = (
+        db.UniqueConstraint('service_request_id', 'professional_id', name='uq_request_rejections_request_professional'),
+        {'sqlite_autoincrement': True},
+    )
+
+    # Every professional who turned a request down, so it is never offered to them again.
+    id = db.Column(db.Integer, primary_key=True)
+    service_request_id = db.Column(db.Integer, db.ForeignKey("service_requests.id", ondelete="CASCADE"), nullable=False, index=True)
+    professional_id = db.Column(db.Integer, db.ForeignKey("service_professionals.id", ondelete="CASCADE"), nullable=False)
+
+
+# ----------------------------
+# Idempotency Keys
+# ----------------------------
+class IdempotencyKeys(BaseModel):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),
+    )
+
+    # The stored outcome of a POST, replayed when the same key is submitted again.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True) # NULL while the original request is still running
+    location = db.Column(db.String(255), nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    flashes = db.Column(db.Text, nullable=True) # JSON list of [category, message]
+
+
+# ----------------------------
+# Daily Rollups
+# ----------------------------
+class DailyRequestRollups(BaseModel):
+    __tablename__ = 'daily_request_rollups'
+
+    # Requests made on `day` for a service, by their current status, kept by 'flask rollup'.
+    # Time-series charts read these instead of scanning service_requests.
+    day = db.Column(db.Date, primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    service_status = db.Column(db.Enum(ServiceStatus), primary_key=True)
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0) # Sum of proposed_price; only PAID rows have any
+
+
+class DailyRatingRollups(BaseModel):
+    __tablename__ = 'daily_rating_rollups'
+
+    # Reviews written on `day` for a service, by star rating.
+    day = db.Column(db.Date, primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    rating = db.Column(db.Integer, primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RollupWatermarks(BaseModel):
+    __tablename__ = 'rollup_watermarks'
+
+    # The newest updated_at each rollup has read; the next run starts from there.
+    name = db.Column(db.String(40), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,100 @@
+import base64
+import json
+from datetime import datetime
+
+from flask import abort
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import or_, and_
+
+
+def encode_cursor(*values):
+    """Encodes the sort key of the last row on a page as an opaque, URL-safe token."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types=(datetime.fromisoformat, int)):
+    """Reverses `encode_cursor`, converting each value with `types` (default a (datetime, id) key); a tampered token is a 400."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError):
+        abort(400, description="Invalid pagination cursor.")
+
+
+class KeysetPage:
+    """One page of a keyset-paginated query, newest first."""
+
+    def __init__(self, items, next_cursor, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.is_first = is_first
+        self.includes_archive = False # Whether the next page should read archived rows too
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_paginate(query, time_column, id_column, cursor=None, per_page=20):
+    """
+    Pages `query` on (time_column, id_column) descending. Unlike OFFSET paging, every page
+    is a single index range scan no matter how deep the user goes.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            time_column < timestamp,
+            and_(time_column == timestamp, id_column < row_id)
+        ))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return KeysetPage(rows, next_cursor, is_first=not cursor)
+
+
+def keyset_paginate_union(sources, cursor=None, per_page=20):
+    """
+    Pages several queries as one, e.g. a table and its archive. `sources` is a list of
+    (query, time_column, id_column); ids must be unique across them. Each source is paged
+    on its own index and the pages are merged, so the cost stays one range scan per source.
+    """
+    return merge_keyset_pages([
+        (keyset_paginate(query, time_column, id_column, cursor=cursor, per_page=per_page), time_column, id_column)
+        for query, time_column, id_column in sources
+    ], cursor=cursor, per_page=per_page)
+
+
+def merge_keyset_pages(pages, cursor=None, per_page=20):
+    """Merges (KeysetPage, time_column, id_column) pages read with the same cursor into one page."""
+    rows, more = [], False
+    for page, time_column, id_column in pages:
+        rows.extend((getattr(row, time_column.key), getattr(row, id_column.key), row) for row in page.items)
+        more = more or page.has_next
+    rows.sort(key=lambda entry: entry[:2], reverse=True)
+
+    next_cursor = None
+    if more or len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(*rows[-1][:2])
+    return KeysetPage([row for _, _, row in rows], next_cursor, is_first=not cursor)
+
+
+class ListPagination(Pagination):
+    """Flask-SQLAlchemy's offset Pagination over an in-memory sequence, for templates written against `.paginate()`."""
+
+    def __init__(self, items, page=None, per_page=None, error_out=True):
+        super().__init__(page=page, per_page=per_page, error_out=error_out, items=items)
+
+    def _query_items(self):
+        return list(self._query_args['items'][self._query_offset:self._query_offset + self.per_page])
+
+    def _query_count(self):
+        return len(self._query_args['items'])
@@ -0,0 +1,227 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import request, current_app, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HEADER = 'X-Profile'
+QUERY_FLAG = '_profile'
+
+# The profile running on this thread, if any. Checked by the SQL and template hooks, which
+# fire for every request and so must cost next to nothing when nothing is being profiled.
+_active = threading.local()
+
+
+class RequestProfile:
+    """cProfile for one request, plus wall-clock time spent in SQL and in Jinja rendering."""
+
+    def __init__(self, reason):
+        self.reason = reason
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.sql_time = 0.0
+        self.sql_count = 0
+        self.template_time = 0.0
+        self.templates = []
+        self._query_started = None
+        self._render_started = None
+        self._render_sql_time = 0.0
+
+    def query_started(self):
+        self._query_started = time.perf_counter()
+
+    def query_finished(self):
+        if self._query_started is not None:
+            self.sql_time += time.perf_counter() - self._query_started
+            self.sql_count += 1
+            self._query_started = None
+
+    def render_started(self, template):
+        self._render_started = time.perf_counter()
+        self._render_sql_time = self.sql_time
+        self.templates.append(template.name)
+
+    def render_finished(self):
+        if self._render_started is not None:
+            elapsed = time.perf_counter() - self._render_started
+            # Lazy loads triggered from a template count as SQL, not rendering.
+            self.template_time += elapsed - (self.sql_time - self._render_sql_time)
+            self._render_started = None
+
+
+def _before_cursor_execute(*args):
+    profile = getattr(_active, 'profile', None)
+    if profile is not None:
+        profile.query_started()
+
+
+def _after_cursor_execute(*args):
+    profile = getattr(_active, 'profile', None)
+    if profile is not None:
+        profile.query_finished()
+
+
+def _before_render(app, template, context, **extra):
+    profile = getattr(_active, 'profile', None)
+    if profile is not None:
+        profile.render_started(template)
+
+
+def _rendered(app, template, context, **extra):
+    profile = getattr(_active, 'profile', None)
+    if profile is not None:
+        profile.render_finished()
+
+
+def _profile_path(profile_id, suffix):
+    return os.path.join(current_app.config['PROFILER_DIR'], f"{profile_id}{suffix}")
+
+
+def recent_profiles(limit=None):
+    """Metadata of the stored profiles, newest first."""
+    directory = current_app.config['PROFILER_DIR']
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue  # Pruned or half-written by another worker
+    return profiles
+
+
+def load_profile(profile_id):
+    """(metadata, pstats.Stats) for a stored profile, or None if it doesn't exist."""
+    if not profile_id.replace('-', '').isalnum():
+        return None
+    try:
+        with open(_profile_path(profile_id, '.json')) as file:
+            meta = json.load(file)
+        return meta, pstats.Stats(_profile_path(profile_id, '.prof'))
+    except (OSError, ValueError):
+        return None
+
+
+def profile_file(profile_id):
+    """Path of the raw cProfile dump, for call-graph viewers such as snakeviz or gprof2dot."""
+    return _profile_path(profile_id, '.prof')
+
+
+class Profiler:
+    """
+    Opt-in per-request profiling. An admin profiles a single request by sending the X-Profile
+    header or adding `?_profile=1`; PROFILER_SAMPLE_RATE additionally profiles that fraction of
+    all requests. Each profile is a cProfile dump plus a summary splitting the wall time into
+    SQL, template rendering and Python, kept in PROFILER_DIR (the newest PROFILER_KEEP).
+    """
+
+    _listening = False
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', True)
+        app.config.setdefault('PROFILER_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILER_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILER_KEEP', 200)
+        if not app.config['PROFILER_ENABLED']:
+            return
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+        if not Profiler._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            before_render_template.connect(_before_render)
+            template_rendered.connect(_rendered)
+            Profiler._listening = True
+
+    @staticmethod
+    def _reason():
+        if request.headers.get(HEADER) or request.args.get(QUERY_FLAG):
+            # Only loads the user for requests that asked; anyone else's flag is ignored.
+            if current_user.is_authenticated and current_user.role == 'admin':
+                return 'requested'
+        rate = current_app.config['PROFILER_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            return 'sampled'
+        return None
+
+    def _start(self):
+        reason = self._reason()
+        if reason is None:
+            return
+        profile = RequestProfile(reason)
+        try:
+            profile.profile.enable()
+        except ValueError:  # Another profiler already owns this interpreter
+            return
+        _active.profile = profile
+
+    def _finish(self, response):
+        profile = getattr(_active, 'profile', None)
+        if profile is None:
+            return response
+        profile.profile.disable()
+        _active.profile = None
+        total = time.perf_counter() - profile.started
+
+        profile_id = f"{datetime.utcnow():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        meta = {
+            'id': profile_id,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'reason': profile.reason,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'user': current_user.username if current_user.is_authenticated else None,
+            'total': total,
+            'sql': profile.sql_time,
+            'sql_count': profile.sql_count,
+            'template': profile.template_time,
+            'python': max(0.0, total - profile.sql_time - profile.template_time),
+            'templates': profile.templates,
+        }
+        directory = current_app.config['PROFILER_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profile.profile.dump_stats(_profile_path(profile_id, '.prof'))
+        # Metadata last: it is what makes the profile show up in the list.
+        with open(_profile_path(profile_id, '.json'), 'w') as file:
+            json.dump(meta, file)
+        self._prune(directory)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @staticmethod
+    def _discard(exc):
+        # The request failed before after_request could stop the profiler.
+        profile = getattr(_active, 'profile', None)
+        if profile is not None:
+            profile.profile.disable()
+            _active.profile = None
+
+    @staticmethod
+    def _prune(directory):
+        stored = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json'))
+        for profile_id in stored[:-current_app.config['PROFILER_KEEP']]:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(directory, profile_id + suffix))
+                except OSError:
+                    pass
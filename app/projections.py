@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, literal, type_coerce, or_, String
+
+from app.models import (Users, Customers, Services, ServiceProfessionals, ServiceRequests, ArchivedServiceRequests,
+                        ServiceStatus)
+
+# Read-only projections for the JSON API and the cached dashboards: Core selects of just the
+# columns a response needs, mapped to slotted records. No identity map, no relationship
+# loaders, no ORM state per row, so records can outlive the request that read them.
+
+
+@dataclass(frozen=True, slots=True)
+class RequestRecord:
+    """One row of /api/v1/my-requests. Fields are in key order, since orjson writes dataclasses in field order."""
+    archived: bool
+    customer: str
+    date_requested: datetime
+    id: int
+    professional: str | None
+    proposed_price: float | None
+    service: str
+    status: str
+
+
+def request_records_statement(model, owner_column, owner_id):
+    """
+    SELECT for the requests of one customer or professional (`owner_column` is 'customer_id'
+    or 'professional_id') in `model`'s table, hot or archived, in RequestRecord's field order.
+    """
+    requests = model.__table__
+    services = Services.__table__
+    customers = Customers.__table__
+    professionals = ServiceProfessionals.__table__
+    customer_user = Users.__table__.alias('customer_user')
+    professional_user = Users.__table__.alias('professional_user')
+    return (
+        select(
+            literal(model is ArchivedServiceRequests),
+            customer_user.c.username,
+            requests.c.date_of_request,
+            requests.c.id,
+            professional_user.c.username,
+            requests.c.proposed_price,
+            services.c.service_type,
+            # The stored enum name ('REQUESTED'), which is what the API returns; skips the Enum conversion.
+            type_coerce(requests.c.service_status, String),
+        )
+        .select_from(
+            requests
+            .join(services, requests.c.service_id == services.c.id)
+            .join(customers, requests.c.customer_id == customers.c.id)
+            .join(customer_user, customers.c.user_id == customer_user.c.id)
+            .outerjoin(professionals, requests.c.professional_id == professionals.c.id)
+            .outerjoin(professional_user, professionals.c.user_id == professional_user.c.id)
+        )
+        .where(requests.c[owner_column] == owner_id)
+    )
+
+
+def request_owner(user):
+    """('customer_id' | 'professional_id', profile id) for an API user, or None if they own no requests."""
+    if user.role == 'customer' and user.customer:
+        return 'customer_id', user.customer.id
+    if user.role == 'professional' and user.professional:
+        return 'professional_id', user.professional.id
+    return None
+
+
+def request_statements(user, include_archived=False):
+    owner = request_owner(user)
+    if owner is None:
+        return []
+    models = (ServiceRequests, ArchivedServiceRequests) if include_archived else (ServiceRequests,)
+    return [request_records_statement(model, *owner) for model in models]
+
+
+def to_records(rows):
+    return [RequestRecord(*row) for row in rows]
+
+
+@dataclass(frozen=True, slots=True)
+class DashboardRequest:
+    """One row of the professional dashboard."""
+    id: int
+    customer_name: str
+    proposed_price: float | None
+    date_of_request: datetime
+    service_status: ServiceStatus
+    date_of_completion: datetime | None
+
+
+def dashboard_requests_statement(professional_id):
+    """SELECT for every hot request assigned to a professional, newest first, as DashboardRequest rows."""
+    requests = ServiceRequests.__table__
+    customers = Customers.__table__
+    users = Users.__table__
+    return (
+        select(
+            requests.c.id,
+            users.c.username,
+            requests.c.proposed_price,
+            requests.c.date_of_request,
+            requests.c.service_status,
+            requests.c.date_of_completion,
+        )
+        .select_from(
+            requests
+            .join(customers, requests.c.customer_id == customers.c.id)
+            .join(users, customers.c.user_id == users.c.id)
+        )
+        .where(requests.c.professional_id == professional_id)
+        .order_by(requests.c.date_of_request.desc())
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class ListedProfessional:
+    """One professional in the customer dashboard's search results."""
+    id: int
+    username: str
+    description: str | None
+    experience: int
+    service_id: int
+    service_type: str
+    base_price: float
+    service_image: str | None
+    rating_avg: float
+    rating_count: int
+
+
+def listed_professionals_statement(service_id=None, q=''):
+    """SELECT for the professionals a customer's search finds, as ListedProfessional rows."""
+    query = (
+        select(
+            ServiceProfessionals.id,
+            Users.username,
+            ServiceProfessionals.description,
+            ServiceProfessionals.experience,
+            ServiceProfessionals.service_id,
+            Services.service_type,
+            Services.base_price,
+            Services.image_url,
+            ServiceProfessionals.rating_avg,
+            ServiceProfessionals.rating_count,
+        )
+        .join_from(ServiceProfessionals, Users, ServiceProfessionals.user_id == Users.id)
+        .join(Services, ServiceProfessionals.service_id == Services.id)
+        .where(ServiceProfessionals.listed())
+        .order_by(ServiceProfessionals.id)
+    )
+    if service_id:
+        query = query.where(ServiceProfessionals.service_id == service_id)
+    if q:
+        search_term = f"%{q}%"
+        query = query.where(or_(
+            Users.username.ilike(search_term),
+            Users.address.ilike(search_term),
+            Users.pin.ilike(search_term)
+        ))
+    return query
@@ -0,0 +1,164 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import request, current_app
+from werkzeug.exceptions import TooManyRequests
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+RULE_RE = re.compile(r'^\s*(\d+)\s*/\s*(second|minute|hour|day)\s+per\s+(ip|username|api_key)\s*$')
+
+
+def parse_rule(rule):
+    """'5/minute per username' -> (scope, capacity, tokens refilled per second)."""
+    match = RULE_RE.match(rule)
+    if not match:
+        raise ValueError(f"Invalid rate limit rule: {rule!r}")
+    count, period, scope = match.groups()
+    return scope, int(count), int(count) / PERIODS[period]
+
+
+class MemoryStore:
+    """Token buckets in a dict. Per process, so each worker enforces its own share of the limit."""
+
+    def __init__(self, max_keys=100000):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._max_keys = max_keys
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self._buckets) > self._max_keys:
+                self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now):
+        # A bucket idle for an hour has refilled under any sane rule, so forgetting it changes nothing.
+        stale = [key for key, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for key in stale:
+            del self._buckets[key]
+
+
+class SQLiteStore:
+    """
+    Token buckets in a small SQLite file shared by every worker process on the host. Kept apart
+    from the application database so limiter writes never contend with application writes.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')  # Losing the last few buckets on a crash is harmless.
+        return conn
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def consume(self, key, capacity, rate):
+        key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()  # Never store raw API keys.
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiting configured per endpoint or per blueprint (RATELIMIT_RULES).
+    An endpoint's own rules replace its blueprint's. Exceeding any bucket raises a 429 with Retry-After.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_STORAGE', 'memory')
+        app.config.setdefault('RATELIMIT_RULES', {})
+
+        storage = app.config['RATELIMIT_STORAGE']
+        if storage == 'memory':
+            store = MemoryStore()
+        elif storage.startswith('sqlite:///'):
+            store = SQLiteStore(storage[len('sqlite:///'):])
+        else:
+            raise ValueError(f"Unsupported RATELIMIT_STORAGE: {storage!r}")
+
+        rules = {target: [parse_rule(rule) for rule in target_rules]
+                 for target, target_rules in app.config['RATELIMIT_RULES'].items()}
+        app.extensions['ratelimit'] = {'store': store, 'rules': rules}
+        app.before_request(self.check)
+
+    @staticmethod
+    def _scope_value(scope):
+        if scope == 'ip':
+            return request.remote_addr
+        if scope == 'username':
+            username = request.form.get('username') if request.method == 'POST' else None
+            return username.strip().lower() if username else None
+        return request.headers.get('x-api-key')
+
+    @staticmethod
+    def hit(state, endpoint, blueprint, scope_value):
+        """
+        Takes a token from every bucket that applies to `endpoint` (or its blueprint).
+        `scope_value(scope)` gives the client's ip / username / api_key. Returns the seconds
+        to wait before retrying, or 0 if the request is allowed.
+        """
+        target = endpoint if endpoint in state['rules'] else blueprint
+        rules = state['rules'].get(target)
+        if not rules:
+            return 0
+
+        retry_after = 0
+        for index, (scope, capacity, rate) in enumerate(rules):
+            value = scope_value(scope)
+            if not value:
+                continue
+            allowed, wait = state['store'].consume(f"{target}:{index}:{scope}:{value}", capacity, rate)
+            if not allowed:
+                retry_after = max(retry_after, wait)
+        return retry_after
+
+    def check(self):
+        if not current_app.config['RATELIMIT_ENABLED']:
+            return
+        state = current_app.extensions['ratelimit']
+        retry_after = self.hit(state, request.endpoint, request.blueprint, self._scope_value)
+        if retry_after:
+            raise TooManyRequests(retry_after=math.ceil(retry_after))
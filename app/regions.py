@@ -0,0 +1,420 @@
+import heapq
+import itertools
+import os
+from contextlib import contextmanager
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, inspect, select, insert, delete, union, text, table, column, func, MetaData
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.util import find_tables
+
+STATE_KEY = 'regions'
+SESSION_KEY = 'region'
+DEFAULT_REGION = 'default'
+# Region n numbers its rows from n * ID_SPAN + 1, so any partitioned row's id says where it lives.
+# The default region (the main database) is region 0 and keeps the ids it always had.
+ID_SPAN = 10 ** 9
+# What a region's connections call the main database, which they attach for users, services etc.
+GLOBAL_SCHEMA = 'global_db'
+SOURCE_SCHEMA = 'source_db'
+PARTITIONED_TABLES = frozenset({'service_requests', 'service_requests_archive', 'reviews', 'request_rejections'})
+NUMBERED_TABLES = ('service_requests', 'reviews', 'request_rejections')  # The archive keeps its requests' ids
+
+
+class RegionNotSet(RuntimeError):
+    """A statement on a partitioned table ran without a region to send it to."""
+
+
+def attach_database(path, schema):
+    """`connect` event listener ATTACHing the SQLite file at `path` as `schema` to every new connection."""
+    def connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+        cursor.close()
+    return connect
+
+
+def _sqlite_path(uri, instance_path):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError(f"Region databases must be SQLite files, got {uri!r}")
+    # Relative to the instance folder, like Flask-SQLAlchemy's own SQLite URIs.
+    return url.database if os.path.isabs(url.database) else os.path.join(instance_path, url.database)
+
+
+class _RegionState:
+    def __init__(self, app, main_path):
+        self.main_path = main_path
+        self.numbers = {DEFAULT_REGION: 0}
+        self.paths = {DEFAULT_REGION: main_path}
+        self.engines = {}
+        prefixes = []
+        for name, region in app.config['REGIONS'].items():
+            number = int(region['number'])
+            if number < 1 or number in self.numbers.values():
+                raise ValueError(f"Region {name!r} needs a unique number of 1 or more, got {number}")
+            self.numbers[name] = number
+            self.paths[name] = _sqlite_path(region.get('uri', f"sqlite:///region_{name}.db"), app.instance_path)
+            self.engines[name] = create_engine(f"sqlite:///{self.paths[name]}")
+            event.listen(self.engines[name], 'connect', attach_database(main_path, GLOBAL_SCHEMA))
+            prefixes += [(str(prefix), name) for prefix in region['pins']]
+        self.names = list(self.numbers)  # Default region first
+        self.by_number = {number: name for name, number in self.numbers.items()}
+        # Longest prefix wins, so '560' can be carved out of a region that owns '56'.
+        self.prefixes = sorted(prefixes, key=lambda entry: len(entry[0]), reverse=True)
+
+    def region_for_pin(self, pin):
+        for prefix, name in self.prefixes:
+            if pin and pin.startswith(prefix):
+                return name
+        return DEFAULT_REGION
+
+    def region_for_id(self, row_id):
+        return self.by_number.get(row_id // ID_SPAN)
+
+    def regions_for_user(self, user):
+        """Where a user's requests can be: a customer's home region, or every region for a professional."""
+        if user.role == 'customer':
+            return [self.region_for_pin(user.pin)]
+        return self.names
+
+    def region_of(self, state):
+        """The region a loaded object (an InstanceState) belongs to, if it can tell without loading it."""
+        table_name = state.mapper.local_table.name
+        if table_name in PARTITIONED_TABLES:
+            # The identity rather than .id, which may be the expired attribute being loaded.
+            return self.region_for_id(state.identity[0]) if state.identity else None
+        if table_name == 'customers':
+            return self.region_for_pin(state.obj().user.pin)
+        return None
+
+
+def _state():
+    """The region router, or None when REGIONS is empty and everything lives in the main database."""
+    return current_app.extensions.get(STATE_KEY)
+
+
+def regions():
+    """Every region's name, the default region (the main database) first."""
+    state = _state()
+    return state.names if state else [DEFAULT_REGION]
+
+
+def region_for_pin(pin):
+    state = _state()
+    return state.region_for_pin(pin) if state else DEFAULT_REGION
+
+
+def region_for_customer(customer):
+    """A customer's home region, where their requests and reviews are written and read."""
+    return region_for_pin(customer.user.pin)
+
+
+def regions_for_user(user):
+    state = _state()
+    return state.regions_for_user(user) if state else [DEFAULT_REGION]
+
+
+def region_for_id(row_id):
+    """The region holding the request (or review) with this id; None if no configured region numbers it."""
+    state = _state()
+    if state is None:
+        return DEFAULT_REGION
+    return state.region_for_id(row_id)
+
+
+def use_region(region):
+    """Sends this session's statements on partitioned tables to `region` until it ends."""
+    from app import db
+    db.session().info[SESSION_KEY] = region
+
+
+@contextmanager
+def in_region(region):
+    from app import db
+    info = db.session().info
+    previous = info.get(SESSION_KEY)
+    info[SESSION_KEY] = region
+    try:
+        yield
+    finally:
+        info[SESSION_KEY] = previous
+
+
+def scatter(fn):
+    """Calls `fn()` once per region and returns the results in region order."""
+    results = []
+    for region in regions():
+        with in_region(region):
+            results.append(fn())
+    return results
+
+
+def _partitioned(mapper, clause):
+    if mapper is not None and inspect(mapper).local_table.name in PARTITIONED_TABLES:
+        return True
+    if clause is not None:
+        return any(getattr(found, 'name', None) in PARTITIONED_TABLES for found in find_tables(clause, include_crud=True))
+    return False
+
+
+class RegionSession(Session):
+    """
+    db.session. Statements on the partitioned tables go to the database of one region: the
+    `region` bind argument if given, else the parent row's region for a lazy load, the row's
+    own region when flushing it, or the session's current region (`use_region` / `in_region`).
+    Everything else goes where Flask-SQLAlchemy would send it. Without REGIONS, nothing changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, region=None, **kwargs):
+        if bind is None:
+            state = _state()
+            if state is not None and _partitioned(mapper, clause):
+                region = region or self.info.get(SESSION_KEY)
+                if region is None:
+                    raise RegionNotSet("Query on a partitioned table outside of use_region() / in_region()")
+                if region != DEFAULT_REGION:
+                    return state.engines[region]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    @property
+    def connection_callable(self):
+        # Only set when partitioned, as the ORM's bulk insert/update refuse per-row connections.
+        return self._connection_for_row if _state() is not None else None
+
+    def _connection_for_row(self, mapper=None, instance=None, **kwargs):
+        """The connection the flush writes `instance` with: the database of the region it belongs to."""
+        region = None
+        if instance is not None and mapper.local_table.name in PARTITIONED_TABLES:
+            region = _state().region_of(inspect(instance))
+        return self.connection(bind_arguments={'mapper': mapper, 'region': region})
+
+
+@event.listens_for(RegionSession, 'do_orm_execute')
+def _route_object_load(orm_context):
+    # customer.service_requests, service_request.review, an expired request's columns after a
+    # commit...: the object being loaded from knows its region.
+    state = _state()
+    mapper = orm_context.bind_mapper
+    if (state is None or not orm_context.is_select or 'region' in orm_context.bind_arguments
+            or mapper is None or mapper.local_table.name not in PARTITIONED_TABLES):
+        return
+    loading = orm_context.lazy_loaded_from
+    if loading is None and orm_context.is_column_load:
+        loading = orm_context.load_options._refresh_state
+    if loading is not None:
+        region = state.region_of(loading)
+        if region is not None:
+            orm_context.bind_arguments['region'] = region
+
+
+# --- Scatter-gather pagination ---
+
+class RegionPagination(Pagination):
+    """
+    Flask-SQLAlchemy's offset Pagination over the same query in every region. Each region
+    returns at most offset + per_page rows in `key` order and the runs are merged, so a page
+    costs what it would on one database, times the number of regions.
+    """
+
+    def _query_items(self):
+        args = self._query_args
+        limit = self._query_offset + self.per_page
+        runs = scatter(lambda: args['query'].limit(limit).all())
+        merged = heapq.merge(*runs, key=args['key'], reverse=args['reverse'])
+        return list(itertools.islice(merged, self._query_offset, limit))
+
+    def _query_count(self):
+        return sum(scatter(lambda: self._query_args['query'].order_by(None).count()))
+
+
+def paginate_regions(query, key, page=None, per_page=None, reverse=False, error_out=True):
+    """`query.paginate()` across regions. `key` maps a row to its position in the query's ORDER BY."""
+    return RegionPagination(query=query, key=key, reverse=reverse, page=page, per_page=per_page, error_out=error_out)
+
+
+def keyset_paginate_regions(query, time_column, id_column, cursor=None, per_page=20):
+    """keyset_paginate across regions: one keyset page per region, merged newest first."""
+    from app.pagination import keyset_paginate, merge_keyset_pages
+
+    pages = scatter(lambda: keyset_paginate(query, time_column, id_column, cursor=cursor, per_page=per_page))
+    return merge_keyset_pages([(page, time_column, id_column) for page in pages], cursor=cursor, per_page=per_page)
+
+
+def merge_sorted(runs, key, reverse=False, limit=None):
+    """Merges per-region result lists that are each sorted by `key`."""
+    return list(itertools.islice(heapq.merge(*runs, key=key, reverse=reverse), limit))
+
+
+# --- Region databases ---
+
+def create_region_tables():
+    """Creates the partitioned tables (and any new indexes) in every region database, numbering each table from its range."""
+    from app import db
+
+    state = _state()
+    tables = [db.metadata.tables[name] for name in sorted(PARTITIONED_TABLES)]
+    created = []
+    for name, engine in (state.engines.items() if state else ()):
+        with engine.begin() as conn:
+            # Only the partitioned tables: users, services etc. are read from the attached main database.
+            missing = [t for t in tables if not inspect(conn).has_table(t.name)]
+            db.metadata.create_all(conn, tables=missing)
+            for t in tables:  # Indexes added to existing tables since
+                for index in t.indexes:
+                    index.create(conn, checkfirst=True)
+            for table_name in NUMBERED_TABLES:
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+                ), {'name': table_name, 'seq': state.numbers[name] * ID_SPAN})
+        if missing:
+            created.append(name)
+    return created
+
+
+def misplaced_customers(region):
+    """{customer_id: home region} for customers with rows in `region` whose PIN now maps elsewhere."""
+    from app import db
+    from app.models import Users, Customers, ServiceRequests, ArchivedServiceRequests, Reviews
+
+    owners = union(
+        select(ServiceRequests.customer_id),
+        select(ArchivedServiceRequests.customer_id),
+        select(Reviews.customer_id),
+    ).subquery()
+    with in_region(region):
+        rows = db.session.execute(
+            select(owners.c.customer_id, Users.pin)
+            .join(Customers, Customers.id == owners.c.customer_id)
+            .join(Users, Users.id == Customers.user_id)
+        ).all()
+    homes = {customer_id: region_for_pin(pin) for customer_id, pin in rows}
+    return {customer_id: home for customer_id, home in homes.items() if home != region}
+
+
+def relocate_customers(customer_ids, source, target):
+    """
+    Moves the requests (hot and archived), reviews and rejection records of `customer_ids`
+    from `source` to `target` in one transaction on the target's database, with the source
+    attached. Moved requests are renumbered from the target's id range. Returns the number of
+    requests moved.
+    """
+    from app import db
+
+    state = _state()
+    if source == target or not customer_ids:
+        return 0
+    engine = state.engines.get(target) or db.engine
+    if source == DEFAULT_REGION:
+        source_schema = GLOBAL_SCHEMA  # Already attached to every region connection
+    else:
+        source_schema = SOURCE_SCHEMA
+    source_tables = MetaData()
+    src = {name: db.metadata.tables[name].to_metadata(source_tables, schema=source_schema) for name in PARTITIONED_TABLES}
+    dst = {name: db.metadata.tables[name] for name in PARTITIONED_TABLES}  # Unqualified: the target's own tables
+    relocated = table('relocated_ids', column('old_id'), column('new_id'), schema='temp')
+    hot_ids, cold_ids = relocated.alias('hot_ids'), relocated.alias('cold_ids')
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')  # BEGIN/COMMIT are ours below
+        if source_schema == SOURCE_SCHEMA:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {SOURCE_SCHEMA}", (state.paths[source],))
+        try:
+            # IMMEDIATE takes the write locks up front, so concurrent writers wait instead of deadlocking.
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS relocated_ids (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+                conn.exec_driver_sql("DELETE FROM temp.relocated_ids")
+                hot, cold = src['service_requests'], src['service_requests_archive']
+                mine = lambda t: t.c.customer_id.in_(customer_ids)
+                moving = union(select(hot.c.id).where(mine(hot)), select(cold.c.id).where(mine(cold))).subquery()
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT 'service_requests', (SELECT COALESCE(MAX(id), 0) FROM main.service_requests) "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'service_requests')"
+                ))
+                seq = conn.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = 'service_requests'"))
+                conn.execute(insert(relocated).from_select(
+                    ['old_id', 'new_id'], select(moving.c.id, seq + func.row_number().over(order_by=moving.c.id))
+                ))
+                moved = conn.scalar(select(func.count()).select_from(relocated))
+                conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'service_requests'"), {'seq': seq + moved})
+
+                for name in ('service_requests', 'service_requests_archive'):
+                    source_table = src[name]
+                    columns = [c.name for c in source_table.columns]
+                    conn.execute(insert(dst[name]).from_select(columns, select(
+                        *[hot_ids.c.new_id if c == 'id' else source_table.c[c] for c in columns]
+                    ).join(hot_ids, hot_ids.c.old_id == source_table.c.id).where(mine(source_table))))
+
+                reviews = src['reviews']
+                columns = [c.name for c in reviews.columns if c.name != 'id']
+                remapped = {'service_request_id': hot_ids.c.new_id, 'archived_request_id': cold_ids.c.new_id}
+                conn.execute(insert(dst['reviews']).from_select(columns, select(
+                    *[remapped.get(c, reviews.c[c]) for c in columns]
+                ).select_from(reviews)
+                 .outerjoin(hot_ids, hot_ids.c.old_id == reviews.c.service_request_id)
+                 .outerjoin(cold_ids, cold_ids.c.old_id == reviews.c.archived_request_id)
+                 .where(mine(reviews))))
+
+                rejections = src['request_rejections']
+                columns = [c.name for c in rejections.columns if c.name != 'id']
+                conn.execute(insert(dst['request_rejections']).from_select(columns, select(
+                    *[hot_ids.c.new_id if c == 'service_request_id' else rejections.c[c] for c in columns]
+                ).join(hot_ids, hot_ids.c.old_id == rejections.c.service_request_id)))
+
+                conn.execute(delete(rejections).where(rejections.c.service_request_id.in_(select(relocated.c.old_id))))
+                for name in ('reviews', 'service_requests_archive', 'service_requests'):
+                    conn.execute(delete(src[name]).where(mine(src[name])))
+                conn.exec_driver_sql("COMMIT")
+            except BaseException:
+                conn.exec_driver_sql("ROLLBACK")
+                raise
+        finally:
+            if source_schema == SOURCE_SCHEMA:
+                conn.exec_driver_sql(f"DETACH DATABASE {SOURCE_SCHEMA}")
+    return moved
+
+
+def rebalance(batch_size=200):
+    """
+    Moves every customer's rows to the region their PIN maps to now, e.g. after REGIONS
+    changed. Yields (source, target, customers, requests) per batch moved.
+    """
+    for source in regions():
+        by_target = {}
+        for customer_id, home in misplaced_customers(source).items():
+            by_target.setdefault(home, []).append(customer_id)
+        for target, customer_ids in by_target.items():
+            for start in range(0, len(customer_ids), batch_size):
+                batch = customer_ids[start:start + batch_size]
+                yield source, target, len(batch), relocate_customers(batch, source, target)
+
+
+class Regions:
+    """
+    Horizontal partitioning of service requests, their archive, reviews and rejection records
+    by region, each region in its own SQLite file so one region's writes never lock another's.
+    A customer's region comes from their PIN prefix (REGIONS); PINs no region claims stay in
+    the main database as the default region. Per-customer work goes to one region, global
+    views scatter over all of them. Create the region tables with 'flask init-regions' and
+    move rows after changing REGIONS with 'flask rebalance-regions'.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        app.config.setdefault('REGIONS', {})
+        if not app.config['REGIONS']:
+            return
+        with app.app_context():
+            main_url = db.engine.url
+        if main_url.get_backend_name() != 'sqlite' or main_url.database in (None, '', ':memory:'):
+            raise RuntimeError("REGIONS needs SQLALCHEMY_DATABASE_URI to be a SQLite file, which each region attaches.")
+        app.extensions[STATE_KEY] = _RegionState(app, main_url.database)
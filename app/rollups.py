@@ -0,0 +1,222 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, func, case, or_, and_
+
+from app import db
+from app.models import (ServiceRequests, ArchivedServiceRequests, Reviews, ServiceStatus,
+                        DailyRequestRollups, DailyRatingRollups, RollupWatermarks)
+from app.regions import scatter
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def _as_date(value):
+    # func.date() is a 'YYYY-MM-DD' string on SQLite and a date elsewhere.
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+# Days recounted per statement, which keeps the OR of day ranges well inside SQLite's expression depth.
+DAYS_PER_BATCH = 100
+
+
+def _batches(days):
+    days = sorted(days)
+    for start in range(0, len(days), DAYS_PER_BATCH):
+        yield days[start:start + DAYS_PER_BATCH]
+
+
+def _in_days(column, days):
+    """`column` (a datetime) falls on one of `days`, as index range scans with consecutive days merged."""
+    ranges = []
+    for day in days:
+        start = datetime.combine(day, datetime.min.time())
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + timedelta(days=1))
+        else:
+            ranges.append((start, start + timedelta(days=1)))
+    return or_(*[and_(column >= start, column < end) for start, end in ranges])
+
+
+def _changed_days(day_column, updated_column, since):
+    """Days (of `day_column`) with a row updated after `since` in any region, and the newest updated_at seen."""
+    query = select(func.date(day_column), func.max(updated_column)).group_by(func.date(day_column))
+    if since is not None:
+        query = query.where(updated_column > since)
+    days, newest = set(), None
+    for rows in scatter(lambda: db.session.execute(query).all()):
+        for day, updated in rows:
+            days.add(_as_date(day))
+            newest = updated if newest is None else max(newest, updated)
+    return days, newest
+
+
+def _request_counts(days):
+    """{(day, service_id, status): [requests, revenue]} over hot and archived requests of every region."""
+    counts = defaultdict(lambda: [0, 0.0])
+    for model in (ServiceRequests, ArchivedServiceRequests):
+        day = func.date(model.date_of_request)
+        query = select(
+            day, model.service_id, model.service_status, func.count(model.id),
+            func.coalesce(func.sum(case((model.service_status == ServiceStatus.PAID, model.proposed_price), else_=0)), 0)
+        ).where(_in_days(model.date_of_request, days)).group_by(day, model.service_id, model.service_status)
+        for rows in scatter(lambda: db.session.execute(query).all()):
+            for row_day, service_id, status, count, revenue in rows:
+                entry = counts[(_as_date(row_day), service_id, status)]
+                entry[0] += count
+                entry[1] += revenue
+    return counts
+
+
+def _rating_counts(days):
+    """{(day, service_id, rating): reviews} over every region."""
+    counts = defaultdict(int)
+    day = func.date(Reviews.created_at)
+    query = select(day, Reviews.service_id, Reviews.rating, func.count(Reviews.id)).where(
+        _in_days(Reviews.created_at, days)
+    ).group_by(day, Reviews.service_id, Reviews.rating)
+    for rows in scatter(lambda: db.session.execute(query).all()):
+        for row_day, service_id, rating, count in rows:
+            counts[(_as_date(row_day), service_id, rating)] += count
+    return counts
+
+
+def _watermark(name):
+    row = db.session.get(RollupWatermarks, name)
+    return row.watermark if row else None
+
+
+def _advance_watermark(name, newest):
+    row = db.session.get(RollupWatermarks, name)
+    if row is None:
+        db.session.add(RollupWatermarks(name=name, watermark=newest))
+    elif newest > row.watermark:
+        row.watermark = newest
+
+
+def _replace_days(model, days, rows):
+    db.session.execute(delete(model).where(model.day.in_(days)))
+    if rows:
+        # A Core insert: the ORM's bulk insert refuses a region-partitioned session.
+        db.session.execute(insert(model.__table__), rows)
+
+
+def refresh_rollups(full=False):
+    """
+    Brings the daily rollups up to date and returns {rollup: days recounted}. Only days with a
+    request or review updated since the last run (minus ROLLUP_OVERLAP, for transactions that
+    committed out of timestamp order) are recounted, each from scratch across every region,
+    so running it again is harmless. Deleted rows are only noticed by a `full` rebuild.
+    """
+    overlap = timedelta(seconds=current_app.config['ROLLUP_OVERLAP'])
+    recounted = {}
+    now = datetime.utcnow()
+
+    # Requests count towards the day they were made, so an update recounts that day.
+    since = None if full else _watermark('requests')
+    days, newest = set(), None
+    for model in (ServiceRequests, ArchivedServiceRequests):
+        changed, latest = _changed_days(model.date_of_request, model.updated_at, since and since - overlap)
+        days |= changed
+        newest = max(filter(None, (newest, latest)), default=None)
+    if full:
+        db.session.execute(delete(DailyRequestRollups))
+    for batch in _batches(days):
+        _replace_days(DailyRequestRollups, batch, [
+            {'day': day, 'service_id': service_id, 'service_status': status, 'request_count': count,
+             'revenue': revenue, 'created_at': now, 'updated_at': now}
+            for (day, service_id, status), (count, revenue) in _request_counts(batch).items()
+        ])
+    if newest is not None:
+        _advance_watermark('requests', newest)
+    recounted['requests'] = len(days)
+
+    since = None if full else _watermark('reviews')
+    days, newest = _changed_days(Reviews.created_at, Reviews.updated_at, since and since - overlap)
+    if full:
+        db.session.execute(delete(DailyRatingRollups))
+    for batch in _batches(days):
+        _replace_days(DailyRatingRollups, batch, [
+            {'day': day, 'service_id': service_id, 'rating': rating, 'review_count': count,
+             'created_at': now, 'updated_at': now}
+            for (day, service_id, rating), count in _rating_counts(batch).items()
+        ])
+    if newest is not None:
+        _advance_watermark('reviews', newest)
+    recounted['reviews'] = len(days)
+
+    db.session.commit()
+    return recounted
+
+
+# --- Time series ---
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())  # Weeks start on Monday
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def periods(start, end, granularity):
+    """Every period touching [start, end], oldest first, so empty ones still get a zero."""
+    current, result = period_start(start, granularity), []
+    while current <= end:
+        result.append(current)
+        if granularity == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += timedelta(days=7 if granularity == 'week' else 1)
+    return result
+
+
+def request_series(start, end, granularity='day', service_id=None):
+    """Requests per period by status, plus revenue, read from the rollups only."""
+    query = select(
+        DailyRequestRollups.day, DailyRequestRollups.service_status,
+        DailyRequestRollups.request_count, DailyRequestRollups.revenue
+    ).where(DailyRequestRollups.day >= start, DailyRequestRollups.day <= end)
+    if service_id is not None:
+        query = query.where(DailyRequestRollups.service_id == service_id)
+
+    labels = periods(start, end, granularity)
+    index = {period: i for i, period in enumerate(labels)}
+    by_status = {status.name: [0] * len(labels) for status in ServiceStatus}
+    revenue = [0.0] * len(labels)
+    for day, status, count, day_revenue in db.session.execute(query):
+        i = index[period_start(day, granularity)]
+        by_status[status.name][i] += count
+        revenue[i] += day_revenue
+    return {
+        'labels': [period.isoformat() for period in labels],
+        'requests': [sum(counts) for counts in zip(*by_status.values())],
+        'by_status': by_status,
+        'revenue': [round(amount, 2) for amount in revenue],
+        'as_of': _watermark('requests'),
+    }
+
+
+def rating_series(start, end, granularity='day', service_id=None):
+    """Reviews per period by star rating, plus their average, read from the rollups only."""
+    query = select(
+        DailyRatingRollups.day, DailyRatingRollups.rating, DailyRatingRollups.review_count
+    ).where(DailyRatingRollups.day >= start, DailyRatingRollups.day <= end)
+    if service_id is not None:
+        query = query.where(DailyRatingRollups.service_id == service_id)
+
+    labels = periods(start, end, granularity)
+    index = {period: i for i, period in enumerate(labels)}
+    by_rating = {str(rating): [0] * len(labels) for rating in range(1, 6)}
+    for day, rating, count in db.session.execute(query):
+        by_rating[str(rating)][index[period_start(day, granularity)]] += count
+    totals = [sum(counts) for counts in zip(*by_rating.values())]
+    stars = [sum(int(rating) * counts[i] for rating, counts in by_rating.items()) for i in range(len(labels))]
+    return {
+        'labels': [period.isoformat() for period in labels],
+        'reviews': totals,
+        'by_rating': by_rating,
+        'average': [round(total_stars / count, 2) if count else None for total_stars, count in zip(stars, totals)],
+        'as_of': _watermark('reviews'),
+    }
@@ -1,10 +1,27 @@
+import hashlib
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
 from functools import wraps
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, make_response, current_app, send_file
 from flask_login import login_required, current_user
 from app import db
 from sqlalchemy import or_, func
-from app.models import Users, Customers, ServiceProfessionals, Services, ServiceRequests, Reviews, ServiceStatus
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, contains_eager
+from app.models import Users, Customers, ServiceProfessionals, Services, ServiceRequests, ArchivedServiceRequests, Reviews, ServiceStatus, InvalidTransition, TransitionConflict
 from app.forms import CreateServiceForm, UpdateServiceForm
+from app.events import publish_request
+from app.matching import MatchingEngine
+from app.catalog import service_catalog
+from app.pagination import ListPagination
+from app.profiler import recent_profiles, load_profile, profile_file
+from app.dashboard_cache import invalidate_on_commit, LISTING
+from app.images import save_service_image, InvalidImage
+from app.documents import send_document
+from app.autocomplete import suggest, reindex_on_commit, ADMIN, KINDS, PROFESSIONAL, CUSTOMER, LOCALITY, PIN
+from app.rollups import GRANULARITIES, periods, request_series, rating_series
+from app.regions import PARTITIONED_TABLES, regions, scatter, paginate_regions, use_region, region_for_id
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -24,26 +41,114 @@ def admin_required(f):
 @admin_bp.route("/dashboard")
 @admin_required
 def admin_dashboard():
-    """Main dashboard to view all data."""
-    services = Services.query.all()
-    professionals = ServiceProfessionals.query.join(Users).filter(Users.role == 'professional').all()
-    customers = Customers.query.join(Users).filter(Users.role == 'customer').all()
-    all_requests = ServiceRequests.query.filter(
+    """Dashboard shell; every table is fetched from `dashboard_section` by the page."""
+    return render_template("admin/admin_dashboard.html")
+
+
+# --- Dashboard Sections ---
+# Each section is an independently fetched, paginated HTML fragment. A section's ETag is derived
+# from the row count and latest `updated_at` of the tables it reads, so an unchanged section
+# is answered with a 304 before its (potentially large) query runs.
+
+def _table_version(model):
+    return db.session.query(func.count(model.id), func.max(model.updated_at)).one()
+
+def _section_version(*models):
+    parts = []
+    for model in models:
+        if model is Services:  # Already known from the in-memory catalog
+            parts.append(service_catalog().version)
+            continue
+        if model.__tablename__ in PARTITIONED_TABLES:  # One part per region
+            for region, (count, last_update) in zip(regions(), scatter(lambda: _table_version(model))):
+                parts.append(f"{model.__tablename__}@{region}:{count}:{last_update}")
+            continue
+        count, last_update = _table_version(model)
+        parts.append(f"{model.__tablename__}:{count}:{last_update}")
+    return "|".join(parts)
+
+def _request_id(service_request):
+    return service_request.id
+
+def _rejected_section(page, per_page):
+    query = ServiceRequests.query.filter_by(service_status=ServiceStatus.REJECTED).options(
+        joinedload(ServiceRequests.customer).joinedload(Customers.user),
+        joinedload(ServiceRequests.service),
+        joinedload(ServiceRequests.professional).joinedload(ServiceProfessionals.user)
+    ).order_by(ServiceRequests.id)
+    pagination = paginate_regions(query, key=_request_id, page=page, per_page=per_page, error_out=False)
+
+    # Reassignment candidates for every request on this page, ranked by the matching engine.
+    engine = MatchingEngine().load(request_ids=[req.id for req in pagination.items])
+    ranked_candidates = {pending.id: engine.rank(pending) for pending in engine.requests}
+    return {'pagination': pagination, 'ranked_candidates': ranked_candidates}
+
+def _services_section(page, per_page):
+    pagination = ListPagination(tuple(service_catalog().by_id.values()), page=page, per_page=per_page, error_out=False)
+    return {'pagination': pagination}
+
+def _professionals_section(page, per_page):
+    pagination = ServiceProfessionals.query.join(Users).filter(Users.role == 'professional').options(
+        contains_eager(ServiceProfessionals.user),
+        joinedload(ServiceProfessionals.service)
+    ).order_by(ServiceProfessionals.id).paginate(page=page, per_page=per_page, error_out=False)
+    return {'pagination': pagination}
+
+def _customers_section(page, per_page):
+    pagination = Customers.query.join(Users).filter(Users.role == 'customer').options(
+        contains_eager(Customers.user)
+    ).order_by(Customers.id).paginate(page=page, per_page=per_page, error_out=False)
+    return {'pagination': pagination}
+
+def _requests_section(page, per_page):
+    query = ServiceRequests.query.filter(
     ServiceRequests.service_status.in_([
         ServiceStatus.REQUESTED, 
         ServiceStatus.ACCEPTED, 
         ServiceStatus.CLOSED, 
         ServiceStatus.PAID
-    ])).all()
-    rejected_requests = ServiceRequests.query.filter_by(service_status=ServiceStatus.REJECTED).all()
-    return render_template(
-        "admin/admin_dashboard.html",
-        services=services,
-        professionals=professionals,
-        customers=customers,
-        all_requests=all_requests,
-        rejected_requests=rejected_requests
-    )
+    ])).options(
+        joinedload(ServiceRequests.customer).joinedload(Customers.user),
+        joinedload(ServiceRequests.service),
+        joinedload(ServiceRequests.professional).joinedload(ServiceProfessionals.user)
+    ).order_by(ServiceRequests.id.desc())
+    pagination = paginate_regions(query, key=_request_id, reverse=True, page=page, per_page=per_page, error_out=False)
+    return {'pagination': pagination}
+
+# section name -> (loader, models whose changes invalidate it)
+DASHBOARD_SECTIONS = {
+    'rejected': (_rejected_section, (ServiceRequests, ServiceProfessionals, Users)),
+    'services': (_services_section, (Services,)),
+    'professionals': (_professionals_section, (ServiceProfessionals, Users, Services)),
+    'customers': (_customers_section, (Customers, Users)),
+    'requests': (_requests_section, (ServiceRequests, Users, Services)),
+}
+
+@admin_bp.route("/dashboard/sections/<section>")
+@admin_required
+def dashboard_section(section):
+    """Returns one dashboard section as a paginated HTML fragment."""
+    if section not in DASHBOARD_SECTIONS:
+        abort(404)
+    loader, models = DASHBOARD_SECTIONS[section]
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['ADMIN_SECTION_PER_PAGE']
+
+    version = f"{section}:{page}:{per_page}:{_section_version(*models)}"
+    etag = hashlib.sha1(version.encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        context = loader(page, per_page)
+        response = make_response(render_template(
+            f"admin/_section_{section}.html",
+            section_page_url=lambda n: url_for('admin.dashboard_section', section=section, page=n),
+            **context
+        ))
+    response.set_etag(etag)
+    # Private to the admin, and always revalidated so actions show up on the next fetch.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # --- Service Management ---
 
@@ -60,6 +165,12 @@ def create_service():
             base_price=form.base_price.data,
             description=form.description.data
         )
+        if form.image.data:
+            try:
+                new_service.image_url = save_service_image(form.image.data)
+            except InvalidImage as error:
+                flash(f"Image: {error}", 'danger')
+                return redirect(url_for("admin.admin_dashboard"))
         db.session.add(new_service)
         db.session.commit()
         flash(f"Service '{form.service_type.data}' created successfully.", "success")
@@ -84,6 +195,13 @@ def update_service(service_id):
         service_to_update.service_type = form.service_type.data
         service_to_update.base_price = form.base_price.data
         service_to_update.description = form.description.data
+        if form.image.data: # Keeps the current image unless a new one was chosen
+            try:
+                service_to_update.image_url = save_service_image(form.image.data)
+            except InvalidImage as error:
+                db.session.rollback()
+                flash(f"Update failed for {service_to_update.service_type} - Image: {error}", 'danger')
+                return redirect(url_for("admin.admin_dashboard"))
         db.session.commit()
         flash(f"Service '{service_to_update.service_type}' updated successfully.", "success")
     else:
@@ -124,6 +242,15 @@ def approve_professional(professional_id):
     flash(f'Professional {prof.user.username} has been approved.', 'success')
     return redirect(url_for('admin.admin_dashboard'))
 
+@admin_bp.route('/professionals/<int:professional_id>/document')
+@admin_required
+def professional_document(professional_id):
+    """The uploaded verification document, to review before approving; PDF viewers fetch it in ranges."""
+    prof = ServiceProfessionals.query.get_or_404(professional_id)
+    if not prof.document:
+        abort(404)
+    return send_document(prof.document, f"{prof.user.username}-verification.{prof.document.rsplit('.', 1)[-1]}")
+
 @admin_bp.route('/professionals/<int:professional_id>/reject', methods=['POST'])
 @admin_required
 def reject_professional(professional_id):
@@ -160,6 +287,57 @@ def unblock_user(user_id):
     flash(f'User {user.username} has been unblocked.', 'info')
     return redirect(url_for('admin.admin_dashboard'))
 
+# --- Bulk Moderation ---
+# The dashboard tables submit the ids of every checked row plus one action. Each action is a
+# single set-based UPDATE, so a page of registrations is moderated in one transaction.
+
+BULK_PROFESSIONAL_ACTIONS = {
+    'approve': ({'is_verified': True, 'verification_failed': False}, 'approved', 'success'),
+    'reject': ({'is_verified': False, 'verification_failed': True}, 'rejected', 'warning'),
+    'block': ({'admin_blocked': True}, 'blocked', 'success'),
+    'unblock': ({'admin_blocked': False}, 'unblocked', 'info'),
+}
+BULK_CUSTOMER_ACTIONS = {action: BULK_PROFESSIONAL_ACTIONS[action] for action in ('block', 'unblock')}
+
+def _bulk_update(model, actions, noun, scopes=()):
+    ids = request.form.getlist('ids', type=int)
+    action = request.form.get('action')
+    if action not in actions:
+        abort(400)
+    if not ids:
+        flash(f'Select at least one {noun} first.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    values, verb, category = actions[action]
+    result = db.session.execute(
+        db.update(model).where(model.id.in_(ids))
+        .values(updated_at=datetime.utcnow(), **values)  # updated_at also moves the dashboard sections' ETags
+        .execution_options(synchronize_session=False)
+    )
+    invalidate_on_commit(db.session, *scopes)  # A set-based UPDATE, so the dashboard cache can't see it
+    reindex_on_commit(db.session, model, ids)  # Nor can the autocomplete index
+    db.session.commit()
+    flash(f'{result.rowcount} {noun}(s) {verb}.', category)
+    return redirect(url_for('admin.admin_dashboard'))
+
+@admin_bp.route('/professionals/bulk', methods=['POST'])
+@admin_required
+def bulk_professionals():
+    """Approves, rejects, blocks or unblocks every selected professional at once."""
+    return _bulk_update(ServiceProfessionals, BULK_PROFESSIONAL_ACTIONS, 'professional', scopes=[LISTING])
+
+@admin_bp.route('/customers/bulk', methods=['POST'])
+@admin_required
+def bulk_customers():
+    """Blocks or unblocks every selected customer at once."""
+    return _bulk_update(Customers, BULK_CUSTOMER_ACTIONS, 'customer')
+
+
+# What each search category matches on, and so which suggestions it offers.
+SEARCH_SUGGESTION_KINDS = {
+    'professional': (PROFESSIONAL, LOCALITY, PIN),
+    'customer': (CUSTOMER, LOCALITY, PIN),
+}
 
 @admin_bp.route("/search")
 @admin_required
@@ -191,20 +369,32 @@ def admin_search():
     return render_template("admin/admin_search.html", search_params=search_params, results=results)
 
 
+@admin_bp.route("/search/autocomplete")
+@admin_required
+def admin_search_autocomplete():
+    """Suggestions for the search box as it is typed in, limited to what the chosen category searches."""
+    kinds = SEARCH_SUGGESTION_KINDS.get(request.args.get('category'), KINDS)
+    return jsonify(suggestions=suggest(request.args.get('q', ''), ADMIN, kinds, request.args.get('limit', type=int)))
+
+
 @admin_bp.route("/charts/data")
 @admin_required
 def admin_chart_data():
     """Provides data for the admin dashboard charts."""
     
-    # Query for service requests by status
-    status_counts = db.session.query(
-        ServiceRequests.service_status, func.count(ServiceRequests.id)
-    ).group_by(ServiceRequests.service_status).all()
+    # Query for service requests by status, summed over every region.
+    # Archived requests still count towards the totals
+    status_counts = Counter()
+    for model in (ServiceRequests, ArchivedServiceRequests):
+        for rows in scatter(db.session.query(model.service_status, func.count(model.id)).group_by(model.service_status).all):
+            status_counts.update(dict(rows))
+    status_counts = sorted(status_counts.items(), key=lambda entry: entry[0].name)
     
     # Query for ratings distribution
-    rating_counts = db.session.query(
-        Reviews.rating, func.count(Reviews.id)
-    ).group_by(Reviews.rating).all()
+    rating_counts = Counter()
+    for rows in scatter(db.session.query(Reviews.rating, func.count(Reviews.id)).group_by(Reviews.rating).all):
+        rating_counts.update(dict(rows))
+    rating_counts = sorted(rating_counts.items())
     
     # Format data for Chart.js
     requests_chart_data = {
@@ -222,10 +412,40 @@ def admin_chart_data():
         'ratings_distribution': ratings_chart_data
     })
 
+def _series_args():
+    """(start, end, granularity, service_id) from the query string; the last 30 days by day if absent."""
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        abort(400, description="start and end must be YYYY-MM-DD dates.")
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES or start > end:
+        abort(400, description="Invalid granularity or date range.")
+    if len(periods(start, end, granularity)) > current_app.config['ROLLUP_MAX_PERIODS']:
+        abort(400, description="Too many periods; use a coarser granularity or a shorter range.")
+    return start, end, granularity, request.args.get('service_id', type=int)
+
+@admin_bp.route("/charts/requests")
+@admin_required
+def admin_request_series():
+    """Requests per day, week or month by status, and revenue. Reads only the daily rollups ('flask rollup')."""
+    return jsonify(request_series(*_series_args()))
+
+@admin_bp.route("/charts/ratings")
+@admin_required
+def admin_rating_series():
+    """Reviews per day, week or month by star rating, and their average. Reads only the daily rollups."""
+    return jsonify(rating_series(*_series_args()))
+
 @admin_bp.route('/request/<int:request_id>/reassign', methods=['POST'])
 @admin_required
 def reassign_professional(request_id):
     """Reassigns a rejected request to a new professional."""
+    region = region_for_id(request_id)
+    if region is None:
+        abort(404)
+    use_region(region)
     service_request = ServiceRequests.query.get_or_404(request_id)
     new_prof_id = request.form.get('professional_id', type=int)
 
@@ -233,15 +453,98 @@ def reassign_professional(request_id):
         flash('You must select a professional to reassign to.', 'danger')
         return redirect(url_for('admin.admin_dashboard'))
 
-    # Security check: Ensure the request was actually rejected
-    if service_request.service_status != ServiceStatus.REJECTED:
+    # Only someone the matching engine would offer for this request: listed for its service, not
+    # among those who rejected it, below the open-job cap and without an open request from this customer.
+    engine = MatchingEngine().load(request_ids=[service_request.id])
+    if not engine.requests:
         flash('This request is not in a state that can be reassigned.', 'warning')
         return redirect(url_for('admin.admin_dashboard'))
-    
-    # Update the request with the new professional and reset the status
-    service_request.professional_id = new_prof_id
-    service_request.service_status = ServiceStatus.REQUESTED # This is key!
-    
-    db.session.commit()
+    if new_prof_id not in {candidate.id for _, candidate in engine.rank(engine.requests[0])}:
+        flash('That professional cannot take this request. Please choose one of the suggested professionals.', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    # Update the request with the new professional and reset the status.
+    # Only a rejected request can move back to REQUESTED, see STATUS_TRANSITIONS.
+    old_prof_id = service_request.professional_id
+    try:
+        service_request.transition(ServiceStatus.REQUESTED, professional_id=new_prof_id)
+        db.session.commit()
+    except InvalidTransition:
+        db.session.rollback()
+        flash('This request is not in a state that can be reassigned.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+    except TransitionConflict:
+        db.session.rollback()
+        flash(f'Request #{service_request.id} was changed by someone else. Please review it and try again.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+    except IntegrityError:
+        db.session.rollback()
+        flash('That professional already has an active request from this customer.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+    publish_request(service_request, old_prof_id) # Moves live from the old professional's dashboard to the new one's
     flash(f'Request #{service_request.id} has been successfully reassigned. The new professional has been notified.', 'success')
-    return redirect(url_for('admin.admin_dashboard'))
\ No newline at end of file
+    return redirect(url_for('admin.admin_dashboard'))
+
+@admin_bp.route('/requests/auto-assign', methods=['POST'])
+@admin_required
+def auto_assign():
+    """Assigns every rejected or unassigned request to its best-scoring eligible professional."""
+    engine = MatchingEngine().load()
+    assignments = engine.assign_all()
+    unmatched = len(engine.requests) - len(assignments) + engine.skipped
+    if len(assignments) > engine.skipped:
+        flash(f'{len(assignments) - engine.skipped} request(s) were automatically reassigned.', 'success')
+    if unmatched:
+        flash(f'{unmatched} request(s) have no eligible professional and still need attention.', 'warning')
+    if not engine.requests:
+        flash('There are no rejected or unassigned requests.', 'info')
+    return redirect(url_for('admin.admin_dashboard'))
+
+
+# --- Request Profiles ---
+
+def _function_label(func):
+    filename, line, name = func
+    if filename == '~':  # Built-ins
+        return name
+    for marker in ('site-packages' + os.sep, current_app.root_path + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{filename}:{line}({name})"
+
+@admin_bp.route('/profiles')
+@admin_required
+def profiles():
+    """Recently captured request profiles (see app/profiler.py)."""
+    return render_template('admin/profiles.html', profiles=recent_profiles(limit=100))
+
+@admin_bp.route('/profiles/<profile_id>')
+@admin_required
+def profile_detail(profile_id):
+    """The most expensive functions of one profile, each with the callers it was reached from."""
+    loaded = load_profile(profile_id)
+    if loaded is None:
+        abort(404)
+    meta, stats = loaded
+    rows = []
+    for function, (primitive_calls, calls, own_time, cumulative, callers) in stats.stats.items():
+        top_callers = sorted(callers.items(), key=lambda item: item[1][3], reverse=True)[:3]
+        rows.append({
+            'function': _function_label(function),
+            'calls': calls if calls == primitive_calls else f"{calls}/{primitive_calls}",
+            'own_time': own_time,
+            'cumulative': cumulative,
+            'callers': [_function_label(caller) for caller, _ in top_callers],
+        })
+    sort = request.args.get('sort', 'cumulative')
+    rows.sort(key=lambda row: row['own_time' if sort == 'own' else 'cumulative'], reverse=True)
+    return render_template('admin/profile_detail.html', profile=meta, rows=rows[:60], sort=sort)
+
+@admin_bp.route('/profiles/<profile_id>/download')
+@admin_required
+def profile_download(profile_id):
+    """The raw cProfile dump, for snakeviz, gprof2dot or `python -m pstats`."""
+    if load_profile(profile_id) is None:
+        abort(404)
+    return send_file(profile_file(profile_id), as_attachment=True, download_name=f"{profile_id}.prof")
@@ -1,9 +1,24 @@
+import math
 from functools import wraps
-from flask import Blueprint, jsonify, request, abort
-from app.models import Users, Services, ServiceRequests
+from flask import Blueprint, jsonify, request, abort, current_app
+from sqlalchemy import select, tuple_
+from app import db
+from app.models import Users, ServiceProfessionals
+from app.catalog import service_catalog
+from app.pagination import encode_cursor, decode_cursor
+from app.projections import request_statements, to_records
+from app.regions import regions_for_user
 
 api_bp = Blueprint('api', __name__)
 
+@api_bp.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+        "success": False,
+        "error": 400,
+        "message": error.description or "Bad request"
+    }), 400
+
 @api_bp.errorhandler(401)
 def unauthorized(error):
     return jsonify({
@@ -12,6 +27,17 @@ def unauthorized(error):
         "message": error.description or "Unauthorized"
     }), 401
 
+@api_bp.errorhandler(429)
+def too_many_requests(error):
+    response = jsonify({
+        "success": False,
+        "error": 429,
+        "message": "Rate limit exceeded. Retry after the number of seconds in the Retry-After header."
+    })
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
 # --- API Authentication Decorator ---
 def require_api_key(f):
     @wraps(f)
@@ -27,17 +53,131 @@ def require_api_key(f):
         return f(user, *args, **kwargs) # Pass the authenticated user to the route
     return decorated_function
 
+# --- Serializers ---
+# Shared with the asyncio implementation of these endpoints (app/async_api.py).
+
+def service_json(service):
+    return {'id': service.id, 'name': service.service_type, 'description': service.description, 'base_price': service.base_price}
+
+def user_json(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'address': user.address,
+        'pin': user.pin
+    }
+# Service requests are read as RequestRecords (app/projections.py) and need no serializer.
+
 # --- Public Endpoints ---
 
 @api_bp.route('/services', methods=['GET'])
 def get_services():
     """Returns a list of all available services."""
-    services = Services.query.order_by(Services.service_type).all()
-    results = [
-        {'id': s.id, 'name': s.service_type, 'description': s.description, 'base_price': s.base_price}
-        for s in services
-    ]
-    return jsonify(services=results)
+    return jsonify(services=[service_json(s) for s in service_catalog()])
+
+# Fields a partner app may ask for with ?fields=, mapped to the columns they are read from.
+PROFESSIONAL_FIELDS = {
+    'id': ServiceProfessionals.id,
+    'username': Users.username,
+    'service_id': ServiceProfessionals.service_id,
+    'experience': ServiceProfessionals.experience,
+    'rating': ServiceProfessionals.rating_avg,
+    'review_count': ServiceProfessionals.rating_count,
+    'pin': Users.pin,
+    'address': Users.address,
+    'description': ServiceProfessionals.description,
+}
+DEFAULT_PROFESSIONAL_FIELDS = ('id', 'username', 'service', 'experience', 'rating', 'review_count', 'pin')
+PROFESSIONAL_SORTS = {'rating': (ServiceProfessionals.rating_avg, float), 'experience': (ServiceProfessionals.experience, int)}
+
+def _professional_fields():
+    requested = request.args.get('fields')
+    if not requested:
+        return DEFAULT_PROFESSIONAL_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in PROFESSIONAL_FIELDS and f != 'service']
+    if unknown or not fields:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}. Available: service, {', '.join(PROFESSIONAL_FIELDS)}.")
+    return fields
+
+def _number_arg(name, type_):
+    """The query parameter `name` as an int or float, None if it is absent; a 400 if it is malformed."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        number = type_(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number):
+        abort(400, description=f"{name} must be {'an integer' if type_ is int else 'a number'}.")
+    return number
+
+@api_bp.route('/professionals', methods=['GET'])
+def get_professionals():
+    """
+    Lists bookable professionals, best first. Filters: service (id or name), pin (prefix, so
+    '5600' covers an area), min_rating, min_experience. sort=rating|experience, cursor=<next_cursor
+    of the previous page>, limit (max 100), and fields=<comma separated> to pick the returned fields.
+    """
+    args = request.args
+    sort = args.get('sort', 'rating')
+    if sort not in PROFESSIONAL_SORTS:
+        abort(400, description="sort must be 'rating' or 'experience'.")
+    sort_column, sort_type = PROFESSIONAL_SORTS[sort]
+    fields = _professional_fields()
+    # Malformed numbers are refused rather than dropped, so a typo can't widen the results.
+    min_rating = _number_arg('min_rating', float)
+    min_experience = _number_arg('min_experience', int)
+    limit = _number_arg('limit', int)
+    limit = min(max(limit if limit is not None else current_app.config['API_PAGE_SIZE'], 1), 100)
+
+    columns = {name: PROFESSIONAL_FIELDS[name] for name in fields if name in PROFESSIONAL_FIELDS}
+    columns.update(id=ServiceProfessionals.id, service_id=ServiceProfessionals.service_id, _sort=sort_column)
+    query = select(*(column.label(name) for name, column in columns.items())).where(ServiceProfessionals.listed())
+    if any(column.class_ is Users for column in columns.values()) or args.get('pin'):
+        query = query.join(Users, ServiceProfessionals.user_id == Users.id)
+
+    catalog = service_catalog()
+    service = args.get('service')
+    if service:
+        match = catalog.get(int(service)) if service.isdigit() else catalog.find(service)
+        if match is None:
+            return jsonify(professionals=[], next_cursor=None)
+        query = query.where(ServiceProfessionals.service_id == match.id)
+    if args.get('pin'):
+        query = query.where(Users.pin.startswith(args['pin'], autoescape=True))
+    if min_rating is not None:
+        query = query.where(ServiceProfessionals.rating_avg >= min_rating)
+    if min_experience is not None:
+        query = query.where(ServiceProfessionals.experience >= min_experience)
+
+    if args.get('cursor'):
+        cursor_sort, value, last_id = decode_cursor(args['cursor'], types=(str, sort_type, int))
+        if cursor_sort != sort:
+            abort(400, description="The cursor belongs to a different sort order.")
+        # A row-value comparison, so the listing index is entered at the cursor instead of scanned up to it.
+        query = query.where(tuple_(sort_column, ServiceProfessionals.id) < tuple_(value, last_id))
+    rows = db.session.execute(query.order_by(sort_column.desc(), ServiceProfessionals.id.desc()).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1]._sort, rows[-1].id)
+    professionals = []
+    for row in rows:
+        values = row._mapping
+        item = {}
+        for name in fields:
+            if name == 'service':
+                entry = catalog.get(row.service_id)
+                item[name] = entry.service_type if entry else None
+            else:
+                item[name] = values[name]
+        professionals.append(item)
+    return jsonify(professionals=professionals, next_cursor=next_cursor)
 
 # --- Protected Endpoints ---
 
@@ -45,41 +185,19 @@ def get_services():
 @require_api_key
 def get_me(user):
     """Returns the details of the authenticated user."""
-    user_data = {
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'role': user.role,
-        'address': user.address,
-        'pin': user.pin
-    }
-    return jsonify(user=user_data)
+    return jsonify(user=user_json(user))
 
 @api_bp.route('/my-requests', methods=['GET'])
 @require_api_key
 def get_my_requests(user):
     """
     Returns a list of service requests for the authenticated user.
-    Handles both customers and professionals.
+    Handles both customers and professionals. Archived (old paid or rejected)
+    requests are only included with ?include_archived=1.
     """
-    if user.role == 'customer' and user.customer:
-        requests = ServiceRequests.query.filter_by(customer_id=user.customer.id).all()
-    elif user.role == 'professional' and user.professional:
-        requests = ServiceRequests.query.filter_by(professional_id=user.professional.id).all()
-    else:
-        return jsonify(requests=[])
-
-    results = []
-    for req in requests:
-        req_data = {
-            'id': req.id,
-            'service': req.service.service_type,
-            'status': req.service_status.name,
-            'proposed_price': req.proposed_price,
-            'date_requested': req.date_of_request.isoformat(),
-            'customer': req.customer.user.username,
-            'professional': req.professional.user.username if req.professional else None
-        }
-        results.append(req_data)
-        
-    return jsonify(requests=results)
\ No newline at end of file
+    statements = request_statements(user, include_archived=request.args.get('include_archived', type=int))
+    records = []
+    for region in regions_for_user(user):
+        for statement in statements:
+            records += to_records(db.session.execute(statement, bind_arguments={'region': region}))
+    return jsonify(requests=records)
@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, get_flashed_messages
 from flask_login import login_user, logout_user, login_required
+from werkzeug.security import generate_password_hash
 from app import db
 from app.models import Users, Customers, ServiceProfessionals
 from app.forms import LoginForm, RegistrationForm
+from app.writer import run_write
+from app.documents import streams_documents, save_document, InvalidDocument
 
 # Note the new blueprint name matches the file name.
 auth_bp = Blueprint('auth', __name__)
@@ -68,43 +71,53 @@ def logout():
     flash("You have been logged out successfully.", "info")
     return redirect(url_for("auth.login"))
 
+def _register(data, password_hash):
+    """Write unit (see app/writer.py): the user and their customer or professional profile, in one transaction."""
+    new_user = Users(
+        username=data["username"],
+        email=data["email"],
+        role=data["role"],
+        # role="admin",
+        address=data["address"],
+        pin=data["pin"],
+        password_hash=password_hash # Hashed by the caller: slow on purpose, so kept off the writer thread
+    )
+    db.session.add(new_user)
+    db.session.flush()
+
+    if data["role"] == "customer":
+        customer = Customers(user_id=new_user.id)
+        db.session.add(customer)
+
+    elif data["role"] == "professional":
+        prof = ServiceProfessionals(
+            user_id=new_user.id,
+            service_id=data["service_id"],
+            description=data["description"],
+            experience=data["experience"] or 0,
+            document=data["document"]
+        )
+        db.session.add(prof)
+    return new_user.id
+
 @auth_bp.route("/register", methods=["GET", "POST"])
+@streams_documents
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
-        new_user = Users(
-            username=form.username.data,
-            email=form.email.data,
-            role=form.role.data,
-            # role="admin",
-            address=form.address.data,
-            pin=form.pin.data
-        )
-        new_user.set_password(form.password.data)
-        
         try:
-            db.session.add(new_user)
-            db.session.commit()
-
-            if form.role.data == "customer":
-                customer = Customers(user_id=new_user.id)
-                db.session.add(customer)
-
-            elif form.role.data == "professional":
-                prof = ServiceProfessionals(
-                    user_id=new_user.id,
-                    service_id=form.service_id.data,
-                    description=form.description.data,
-                    experience=form.experience.data,
-                    document=form.document.data
-                )
-                db.session.add(prof)
-
-            db.session.commit()
+            data = dict(form.data)
+            document_file = data.pop("document_file")
+            if document_file and data["role"] == "professional":
+                # Stored first, off the writer thread; if the registration then fails, the file
+                # is just an unreferenced copy that an identical upload will reuse.
+                data["document"] = save_document(document_file)
+            run_write(_register, data, generate_password_hash(form.password.data))
             flash("Registration successful! Please log in.", "success")
             return redirect(url_for("auth.login"))
+        except InvalidDocument as e:
+            form.document_file.errors.append(str(e))
         except Exception as e:
-            db.session.rollback()
             flash(f"An error occurred: {e}", "danger")
 
     return render_template("register.html", form=form)
\ No newline at end of file
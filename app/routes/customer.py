@@ -1,10 +1,23 @@
 from functools import wraps
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from types import MappingProxyType
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, jsonify
 from flask_login import login_required, current_user, logout_user
-from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import Users, Customers, Services, ServiceProfessionals, ServiceRequests, Reviews, ServiceStatus
+from app.models import Customers, ServiceProfessionals, ServiceRequests, ArchivedServiceRequests, Reviews, ServiceStatus, InvalidTransition, TransitionConflict
 from app.forms import ReviewForm, BookingForm, UpdateRequestForm
+from app.pagination import keyset_paginate, keyset_paginate_union, encode_cursor
+from app.events import publish_request
+from app.idempotency import idempotent
+from app.catalog import service_catalog
+from app.metrics import count_on_commit, BOOKINGS_CREATED
+from app.regions import use_region, region_for_customer, region_for_id
+from app.writer import run_write
+from app.projections import ListedProfessional, listed_professionals_statement
+from app.dashboard_cache import cached_view, LISTING
+from app.autocomplete import suggest, PUBLIC, SERVICE, PROFESSIONAL, LOCALITY, PIN
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -21,16 +34,94 @@ def customer_required(f):
             flash("Your account has been suspended by an administrator.", "danger")
             logout_user() # Log them out immediately
             return redirect(url_for('auth.login'))
-        
+
+        if current_user.customer:
+            use_region(region_for_customer(current_user.customer)) # Where this customer's requests live
         return f(*args, **kwargs)
     return decorated_function
+def _history_page(customer_id):
+    """
+    One keyset page of a customer's requests, newest first, with service and professional preloaded.
+    Archived requests are only read once the customer pages past the end of their recent ones.
+    """
+    cursor = request.args.get('cursor')
+    per_page = current_app.config['HISTORY_PER_PAGE']
+    hot = ServiceRequests.query.filter_by(customer_id=customer_id).options(
+        joinedload(ServiceRequests.service),
+        joinedload(ServiceRequests.professional).joinedload(ServiceProfessionals.user)
+    )
+    archived = ArchivedServiceRequests.query.filter_by(customer_id=customer_id).options(
+        joinedload(ArchivedServiceRequests.service),
+        joinedload(ArchivedServiceRequests.professional).joinedload(ServiceProfessionals.user)
+    )
+
+    if not request.args.get('archived', type=int):
+        page = keyset_paginate(hot, ServiceRequests.created_at, ServiceRequests.id, cursor=cursor, per_page=per_page)
+        if page.has_next:
+            return page
+        newest_archived = db.session.query(ArchivedServiceRequests.created_at, ArchivedServiceRequests.id).filter_by(
+            customer_id=customer_id
+        ).order_by(ArchivedServiceRequests.created_at.desc(), ArchivedServiceRequests.id.desc()).first()
+        if newest_archived is None:
+            return page
+        if page.items:
+            # Out of recent requests: "Older" now leads into the archive. Archived requests are
+            # normally all older than the last recent one; if one isn't, start just above it so
+            # it can't be skipped (at the cost of repeating a few recent rows).
+            last = page.items[-1]
+            boundary = max((last.created_at, last.id), (newest_archived.created_at, newest_archived.id + 1))
+            page.next_cursor = encode_cursor(*boundary)
+            page.includes_archive = True
+            return page
+        # Nothing recent at all (everything was archived), so go straight to the archive.
+
+    page = keyset_paginate_union([
+        (hot, ServiceRequests.created_at, ServiceRequests.id),
+        (archived, ArchivedServiceRequests.created_at, ArchivedServiceRequests.id),
+    ], cursor=cursor, per_page=per_page)
+    page.includes_archive = True
+    return page
+
+# --- Write units (see app/writer.py: plain values in and out, committed by run_write) ---
+
+def _book(region, customer_id, professional_id, service_id, proposed_price):
+    use_region(region)
+    new_request = ServiceRequests(
+        service_id=service_id,
+        customer_id=customer_id,
+        professional_id=professional_id,
+        proposed_price=proposed_price,
+        service_status=ServiceStatus.REQUESTED
+    )
+    db.session.add(new_request)
+    count_on_commit(db.session, BOOKINGS_CREATED)
+    db.session.flush()
+    return new_request.id
+
+def _pay(request_id, version):
+    ServiceRequests.unchanged(request_id, version).transition(ServiceStatus.PAID)
+
+def _close_and_review(request_id, version, rating, remarks):
+    use_region(region_for_id(request_id)) # For the new review
+    service_request = ServiceRequests.unchanged(request_id, version)
+    service_request.transition(ServiceStatus.CLOSED)
+    db.session.add(Reviews(
+        customer_id=service_request.customer_id,
+        professional_id=service_request.professional_id,
+        service_id=service_request.service_id,
+        service_request_id=service_request.id,
+        rating=rating,
+        remarks=remarks
+    ))
+
 # --- Routes ---
 
 @customer_bp.route("/dashboard")
 @customer_required
 def customer_dashboard():
     form = BookingForm()
-    all_services = Services.query.order_by(Services.service_type).all()
+    catalog = service_catalog()
+    all_services = catalog.services
     
     # --- Search Logic ---
     search_params = {
@@ -38,42 +129,27 @@ def customer_dashboard():
         'q': request.args.get('q', type=str, default="").strip()
     }
 
-    # Start with a base query for verified, non-blocked professionals
-    query = ServiceProfessionals.query.join(Users).filter(
-        ServiceProfessionals.is_verified == True,
-        ServiceProfessionals.admin_blocked == False
-    )
-
-    # Apply filters based on search parameters
-    if search_params['service_id']:
-        query = query.filter(ServiceProfessionals.service_id == search_params['service_id'])
-    
-    if search_params['q']:
-        search_term = f"%{search_params['q']}%"
-        query = query.filter(or_(
-            Users.username.ilike(search_term),
-            Users.address.ilike(search_term),
-            Users.pin.ilike(search_term)
+    # Verified, non-blocked professionals matching the search. The same search gives every
+    # customer the same results, so they share one cache entry.
+    def compute():
+        professionals = tuple(ListedProfessional(*row) for row in db.session.execute(
+            listed_professionals_statement(search_params['service_id'], search_params['q'])
         ))
+        # Kept up to date on every review, whichever region's database holds it.
+        avg_ratings = MappingProxyType({p.id: round(p.rating_avg, 1) for p in professionals if p.rating_count})
+        return [LISTING], (professionals, avg_ratings)
+
+    professionals, avg_ratings = cached_view(
+        'customer_dashboard', (search_params['service_id'], search_params['q']), compute
+    )
 
-    professionals = query.all()
-    
     # --- Data for Template ---
-    avg_ratings = {}
     selected_service_name = ""
     if search_params['service_id']:
-        service = Services.query.get(search_params['service_id'])
+        service = catalog.get(search_params['service_id'])
         if service:
             selected_service_name = service.service_type
 
-    if professionals:
-        prof_ids = [p.id for p in professionals]
-        ratings_query = db.session.query(
-            Reviews.professional_id,
-            func.avg(Reviews.rating).label('average_rating')
-        ).filter(Reviews.professional_id.in_(prof_ids)).group_by(Reviews.professional_id).all()
-        avg_ratings = {prof_id: round(avg, 1) for prof_id, avg in ratings_query}
-
     return render_template(
         'customer/customer_dashboard.html',
         form=form,
@@ -85,33 +161,35 @@ def customer_dashboard():
         search_params=search_params # Pass search terms back to the template
     )
 
+@customer_bp.route('/autocomplete')
+@customer_required
+def autocomplete():
+    """Suggestions for the dashboard's search box as it is typed in; a service comes with its id for the service filter."""
+    catalog = service_catalog()
+    suggestions = suggest(request.args.get('q', ''), PUBLIC, (SERVICE, PROFESSIONAL, LOCALITY, PIN), request.args.get('limit', type=int))
+    for suggestion in suggestions:
+        service = catalog.find(suggestion['label']) if suggestion['kind'] == SERVICE else None
+        if service:
+            suggestion['service_id'] = service.id
+    return jsonify(suggestions=suggestions)
+
 @customer_bp.route('/book_service/<int:professional_id>', methods=['POST'])
 @customer_required
+@idempotent
 def book_service(professional_id):
     form = BookingForm() # Instantiate the form
     professional = ServiceProfessionals.query.get_or_404(professional_id)
 
     if form.validate_on_submit():
-        # Check for existing active requests
-        existing_request = ServiceRequests.query.filter(
-            ServiceRequests.customer_id == current_user.customer.id,
-            ServiceRequests.professional_id == professional.id,
-            ServiceRequests.service_status.in_([ServiceStatus.REQUESTED, ServiceStatus.ACCEPTED])
-        ).first()
-
-        if existing_request:
+        try:
+            request_id = run_write(_book, region_for_customer(current_user.customer), current_user.customer.id,
+                                   professional.id, form.service_id.data, form.proposed_price.data)
+        except IntegrityError:
+            # The partial unique index allows one active request per customer/professional pair.
             flash('You already have an active request with this professional.', 'warning')
             return redirect(url_for('customer.customer_dashboard', service_id=form.service_id.data))
-
-        new_request = ServiceRequests(
-            service_id=form.service_id.data,
-            customer_id=current_user.customer.id,
-            professional_id=professional.id,
-            proposed_price=form.proposed_price.data,
-            service_status=ServiceStatus.REQUESTED
-        )
-        db.session.add(new_request)
-        db.session.commit()
+        new_request = db.session.get(ServiceRequests, request_id)
+        publish_request(new_request) # Live update for the professional's dashboard
         flash('Your service request has been sent!', 'success')
         return redirect(url_for('customer.service_history'))
     else:
@@ -133,7 +211,13 @@ def update_service_request(request_id):
     
     if form.validate_on_submit():
         service_request.proposed_price = form.proposed_price.data
-        db.session.commit()
+        try:
+            db.session.commit() # The version check fails if the professional acted on it meanwhile
+        except StaleDataError:
+            db.session.rollback()
+            flash('This request was changed while you were editing it. Please review it and try again.', 'warning')
+            return redirect(url_for('customer.service_history'))
+        publish_request(service_request)
         flash('Your service request has been updated successfully.', 'success')
     else:
         flash('Invalid price submitted. Please provide a valid number.', 'danger')
@@ -144,10 +228,8 @@ def update_service_request(request_id):
 @customer_required
 def service_history():
     form = UpdateRequestForm() # Create an instance of the form
-    service_requests = ServiceRequests.query.filter_by(
-        customer_id=current_user.customer.id
-    ).order_by(ServiceRequests.created_at.desc()).all()
-    return render_template('customer/service_history.html', service_requests=service_requests, form=form)
+    page = _history_page(current_user.customer.id)
+    return render_template('customer/service_history.html', service_requests=page.items, page=page, form=form)
 
 
 @customer_bp.route('/review_service/<int:request_id>', methods=['POST'])
@@ -156,19 +238,21 @@ def review_service(request_id):
     service_request = ServiceRequests.query.get_or_404(request_id)
     form = ReviewForm() # Instantiate the form
 
-    # ... (security checks are the same) ...
+    if service_request.customer_id != current_user.customer.id:
+        abort(403)
     
     # Use the form to validate
     if form.validate_on_submit():
-        new_review = Reviews(
-            customer_id=current_user.customer.id,
-            professional_id=service_request.professional_id,
-            service_id=service_request.service_id,
-            service_request_id=service_request.id,
-            rating=form.rating.data, # Use validated data from the form
-            remarks=form.remarks.data
-        )
-        # ... (update service_request status and commit) ...
+        try:
+            run_write(_close_and_review, service_request.id, service_request.version, form.rating.data, form.remarks.data)
+        except InvalidTransition:
+            flash("Only accepted services can be closed and reviewed.", "warning")
+            return redirect(url_for('customer.service_history'))
+        except TransitionConflict:
+            flash("This request was changed while you were reviewing it. Please review it and try again.", "warning")
+            return redirect(url_for('customer.service_history'))
+        db.session.expire(service_request)
+        publish_request(service_request)
         flash('Thank you for your review!', 'success')
     else:
         flash('There was an error with your review submission.', 'danger')
@@ -190,19 +274,25 @@ def show_payment_form(request_id):
 
 @customer_bp.route('/payment/<int:request_id>/process', methods=['POST'])
 @customer_required
+@idempotent
 def process_payment(request_id):
     service_request = ServiceRequests.query.get_or_404(request_id)
     # Security checks
     if service_request.customer_id != current_user.customer.id:
         abort(403)
-    if service_request.service_status != ServiceStatus.CLOSED:
-        flash("This service cannot be paid for at this time.", "warning")
-        return redirect(url_for('customer.service_history'))
 
     # In a real app, you'd process the payment here.
     # We will just update the status.
-    service_request.service_status = ServiceStatus.PAID
-    db.session.commit()
+    try:
+        run_write(_pay, service_request.id, service_request.version)
+    except InvalidTransition:
+        flash("This service cannot be paid for at this time.", "warning")
+        return redirect(url_for('customer.service_history'))
+    except TransitionConflict:
+        flash("This request was changed while you were paying. Please review it and try again.", "warning")
+        return redirect(url_for('customer.service_history'))
+    db.session.expire(service_request)
+    publish_request(service_request)
     
     flash(f"Payment for request #{service_request.id} was successful! Thank you.", "success")
     return redirect(url_for('customer.service_history'))
@@ -223,13 +313,13 @@ def customer_profile(customer_id):
     if current_user.role != 'admin' and current_user.id != customer.user_id:
         abort(403) # Forbidden
 
-    # Query for all of this customer's requests to show their history
-    service_requests = ServiceRequests.query.filter_by(
-        customer_id=customer.id
-    ).order_by(ServiceRequests.created_at.desc()).all()
+    use_region(region_for_customer(customer))
+    # One page of this customer's requests to show their history
+    page = _history_page(customer.id)
     
     return render_template(
         'customer/customer_profile.html',
         customer=customer,
-        service_requests=service_requests
+        service_requests=page.items,
+        page=page
     )
\ No newline at end of file
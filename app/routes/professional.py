@@ -1,10 +1,20 @@
+import queue
+import time
+from collections import Counter
+from datetime import datetime
 from functools import wraps
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app, Response, stream_with_context
 from flask_login import login_required, current_user, logout_user
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import ServiceRequests, Reviews, ServiceStatus
+from app.models import ServiceRequests, ServiceStatus, Customers, RequestRejections, InvalidTransition, TransitionConflict
 from app.forms import HandleRequestForm
+from app.events import broker, request_event, publish_request, format_sse
+from app.regions import scatter, merge_sorted, use_region, region_for_id
+from app.projections import DashboardRequest, dashboard_requests_statement
+from app.dashboard_cache import cached_view, professional_scope, CUSTOMERS
+from app.writer import run_write
 
 professional_bp = Blueprint('professional', __name__)
 
@@ -32,6 +42,22 @@ def professional_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _requested_at(service_request):
+    return service_request.date_of_request
+
+# --- Write units (see app/writer.py) ---
+
+def _handle(request_id, version, action):
+    use_region(region_for_id(request_id)) # For the rejection record
+    service_request = ServiceRequests.unchanged(request_id, version)
+    if action == 'accept':
+        service_request.transition(ServiceStatus.ACCEPTED)
+    else:
+        service_request.transition(ServiceStatus.REJECTED)
+        # Remembered so neither an admin nor auto-assignment offers it to this professional again
+        if not RequestRejections.query.filter_by(service_request_id=service_request.id, professional_id=service_request.professional_id).first():
+            db.session.add(RequestRejections(service_request_id=service_request.id, professional_id=service_request.professional_id))
+
 # --- Routes ---
 
 @professional_bp.route("/dashboard")
@@ -40,18 +66,19 @@ def professional_dashboard():
     form = HandleRequestForm()
     professional_id = current_user.professional.id
 
-    # Get new requests that are pending
-    incoming_requests = ServiceRequests.query.filter_by(
-        professional_id=professional_id,
-        service_status=ServiceStatus.REQUESTED
-    ).order_by(ServiceRequests.date_of_request.desc()).all()
-
-    # Get requests that have already been handled (accepted, closed, rejected)
-    history_requests = ServiceRequests.query.filter(
-        ServiceRequests.professional_id == professional_id,
-        ServiceRequests.service_status != ServiceStatus.REQUESTED
-    ).order_by(ServiceRequests.date_of_request.desc()).all()
+    def compute():
+        # One pass over the professional's requests in every region, newest first
+        rows = merge_sorted(scatter(lambda: db.session.execute(dashboard_requests_statement(professional_id)).all()),
+                            key=_requested_at, reverse=True)
+        requests = [DashboardRequest(*row) for row in rows]
+        return [professional_scope(professional_id), CUSTOMERS], (
+            # New requests that are pending
+            tuple(r for r in requests if r.service_status == ServiceStatus.REQUESTED),
+            # Requests that have already been handled (accepted, closed, rejected)
+            tuple(r for r in requests if r.service_status != ServiceStatus.REQUESTED),
+        )
 
+    incoming_requests, history_requests = cached_view('professional_dashboard', professional_id, compute)
     return render_template(
         'professional/professional_dashboard.html',
         form=form,
@@ -63,6 +90,10 @@ def professional_dashboard():
 @professional_bp.route('/request/<int:request_id>/handle', methods=['POST'])
 @professional_required
 def handle_request(request_id):
+    region = region_for_id(request_id)
+    if region is None:
+        abort(404)
+    use_region(region)
     service_request = ServiceRequests.query.get_or_404(request_id)
     form = HandleRequestForm()
 
@@ -74,15 +105,24 @@ def handle_request(request_id):
         return redirect(url_for('professional.professional_dashboard'))
 
     if form.validate_on_submit():
+        if form.action.data not in ('accept', 'reject'):
+            flash('Invalid action.', 'danger')
+            return redirect(url_for('professional.professional_dashboard'))
+        try:
+            run_write(_handle, service_request.id, service_request.version, form.action.data)
+        except InvalidTransition:
+            flash(f'Request #{service_request.id} has already been handled.', 'warning')
+            return redirect(url_for('professional.professional_dashboard'))
+        except TransitionConflict:
+            flash(f'Request #{service_request.id} was changed while you were viewing it. Please review it and try again.', 'warning')
+            return redirect(url_for('professional.professional_dashboard'))
+        db.session.expire(service_request)
+
         if form.action.data == 'accept':
-            service_request.service_status = ServiceStatus.ACCEPTED
             flash(f'Request #{service_request.id} has been accepted.', 'success')
-        elif form.action.data == 'reject':
-            service_request.service_status = ServiceStatus.REJECTED
-            flash(f'Request #{service_request.id} has been rejected.', 'warning')
         else:
-            flash('Invalid action.', 'danger')
-        db.session.commit()
+            flash(f'Request #{service_request.id} has been rejected.', 'warning')
+        publish_request(service_request) # Keeps the professional's other open tabs in sync
     else:
         flash('An error occurred. Please try again.', 'danger')
 
@@ -93,11 +133,83 @@ def handle_request(request_id):
 def professional_summary():
     professional_id = current_user.professional.id
 
+    status_counts = Counter()
+    for rows in scatter(lambda: db.session.query(ServiceRequests.service_status, func.count(ServiceRequests.id))
+                        .filter_by(professional_id=professional_id).group_by(ServiceRequests.service_status).all()):
+        status_counts.update(dict(rows))
     stats = {
-        'accepted': ServiceRequests.query.filter_by(professional_id=professional_id, service_status=ServiceStatus.ACCEPTED).count(),
-        'closed': ServiceRequests.query.filter_by(professional_id=professional_id, service_status=ServiceStatus.CLOSED).count(),
-        'rejected': ServiceRequests.query.filter_by(professional_id=professional_id, service_status=ServiceStatus.REJECTED).count(),
-        'avg_rating': db.session.query(func.avg(Reviews.rating)).filter(Reviews.professional_id == professional_id).scalar() or 0.0
+        'accepted': status_counts[ServiceStatus.ACCEPTED],
+        'closed': status_counts[ServiceStatus.CLOSED],
+        'rejected': status_counts[ServiceStatus.REJECTED],
+        'avg_rating': current_user.professional.rating_avg
     }
     
-    return render_template('professional/professional_summary.html', stats=stats)
\ No newline at end of file
+    return render_template('professional/professional_summary.html', stats=stats)
+
+
+# --- Live Updates (Server-Sent Events) ---
+
+def _poll_request_changes(professional_id, since):
+    """Requests of this professional changed after `since`, for changes made by other workers."""
+    changed = merge_sorted(scatter(lambda: ServiceRequests.query.filter(
+        ServiceRequests.professional_id == professional_id,
+        ServiceRequests.updated_at > since
+    ).options(
+        joinedload(ServiceRequests.customer).joinedload(Customers.user)
+    ).order_by(ServiceRequests.updated_at).limit(100).all()), key=lambda req: req.updated_at, limit=100)
+    events = [request_event(req) for req in changed]
+    db.session.close() # Don't hold a pooled connection between polls
+    return events
+
+@professional_bp.route("/stream")
+@login_required
+def request_stream():
+    """
+    Pushes new and updated requests for the logged-in professional as server-sent events.
+    Events published in this process arrive immediately; with SSE_POLL_INTERVAL set, the
+    database is polled as well so changes made by other worker processes are seen too.
+    """
+    # professional_required would flash the 'pending verification' notice on every reconnect.
+    professional_profile = current_user.professional if current_user.role == 'professional' else None
+    if not professional_profile or professional_profile.admin_blocked:
+        abort(403)
+
+    professional_id = professional_profile.id
+    config = current_app.config
+    poll_interval = config['SSE_POLL_INTERVAL']
+    heartbeat_interval = config['SSE_HEARTBEAT_INTERVAL']
+    max_duration = config['SSE_MAX_DURATION']
+    try:
+        # EventSource resends the id of the last event it saw when it reconnects.
+        watermark = datetime.fromisoformat(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        watermark = datetime.utcnow()
+
+    def generate():
+        nonlocal watermark
+        subscriber = broker.subscribe(professional_id)
+        started = last_sent = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+            # Streams end after SSE_MAX_DURATION so workers are recycled; the browser reconnects.
+            while time.monotonic() - started < max_duration:
+                try:
+                    events = [subscriber.get(timeout=poll_interval or heartbeat_interval)]
+                except queue.Empty:
+                    events = _poll_request_changes(professional_id, watermark) if poll_interval else []
+
+                for event in events:
+                    watermark = max(watermark, datetime.fromisoformat(event['updated_at']))
+                    yield format_sse(event, event='request', event_id=event['updated_at'])
+                    last_sent = time.monotonic()
+                if time.monotonic() - last_sent >= heartbeat_interval:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            broker.unsubscribe(professional_id, subscriber)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
+
@@ -1,40 +1,91 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, current_app
 from app.forms import ProfileForm
 from flask_login import login_required, current_user
-from sqlalchemy import func
+from sqlalchemy import func, select, case
+from sqlalchemy.orm import joinedload, contains_eager
 from app import db
-from app.models import ServiceProfessionals, Reviews, Users
+from app.models import ServiceProfessionals, Reviews, Users, Customers
+from app.regions import regions, scatter, keyset_paginate_regions, region_for_customer, relocate_customers
+from app.dashboard_cache import invalidate, CUSTOMERS
 
 shared_bp = Blueprint('shared', __name__)
 
+def _reviews_page(professional_id):
+    """One keyset page of a professional's reviews, newest first, reviewer names joined in (one query)."""
+    query = Reviews.query.filter(Reviews.professional_id == professional_id).join(
+        Reviews.customer
+    ).join(Customers.user).options(
+        contains_eager(Reviews.customer).contains_eager(Customers.user)
+    )
+    # A professional's reviewers may be in any region.
+    return keyset_paginate_regions(
+        query, Reviews.created_at, Reviews.id,
+        cursor=request.args.get('cursor'),
+        per_page=current_app.config['REVIEWS_PER_PAGE']
+    )
+
 @shared_bp.route('/professional/<int:professional_id>')
 def professional_profile(professional_id):
     """
     Displays a public profile page for a service professional,
-    including their details and customer reviews.
+    including their details and a page of customer reviews.
     """
-    professional = ServiceProfessionals.query.get_or_404(professional_id)
-
-    # Query for all reviews for this professional, ordered by newest first
-    reviews = Reviews.query.filter_by(
-        professional_id=professional.id
-    ).order_by(Reviews.created_at.desc()).all()
+    star_columns = [func.sum(case((Reviews.rating == star, 1), else_=0)).label(f'stars_{star}') for star in range(1, 6)]
+    professional_query = (
+        select(ServiceProfessionals)
+        .options(joinedload(ServiceProfessionals.user), joinedload(ServiceProfessionals.service))
+        .where(ServiceProfessionals.id == professional_id)
+    )
+    if len(regions()) == 1:
+        # One database: the professional, their user and service, and the rating histogram in one query.
+        star_counts = select(Reviews.professional_id, *star_columns).where(
+            Reviews.professional_id == professional_id
+        ).group_by(Reviews.professional_id).subquery()
+        row = db.session.execute(
+            professional_query.add_columns(*[star_counts.c[f'stars_{star}'] for star in range(1, 6)])
+            .outerjoin(star_counts, star_counts.c.professional_id == ServiceProfessionals.id)
+        ).first()
+        if row is None:
+            abort(404)
+        professional = row[0]
+        histogram = {star: row[star] or 0 for star in range(1, 6)}
+    else:
+        # The reviews are spread over the regions' databases: the histogram is summed over each of them.
+        professional = db.session.execute(professional_query).scalar()
+        if professional is None:
+            abort(404)
+        star_counts = select(*star_columns).where(Reviews.professional_id == professional_id)
+        region_counts = scatter(lambda: db.session.execute(star_counts).one())
+        histogram = {star: sum(counts[star - 1] or 0 for counts in region_counts) for star in range(1, 6)}
 
-    # Calculate the professional's average rating
-    avg_rating_query = db.session.query(
-        func.avg(Reviews.rating)
-    ).filter(Reviews.professional_id == professional.id).scalar()
-    
-    # Round the average rating to one decimal place, handle case with no ratings
-    avg_rating = round(avg_rating_query, 1) if avg_rating_query else None
+    # Average rating and count come from the histogram instead of another query
+    review_count = sum(histogram.values())
+    avg_rating = round(sum(star * count for star, count in histogram.items()) / review_count, 1) if review_count else None
 
     return render_template(
         'shared/professional_profile.html',
         professional=professional,
-        reviews=reviews,
+        page=_reviews_page(professional.id),
+        histogram=histogram,
+        review_count=review_count,
         avg_rating=avg_rating
     )
 
+@shared_bp.route('/professional/<int:professional_id>/reviews')
+def professional_reviews(professional_id):
+    """The next page of reviews as JSON, for the profile page's "Load more" button."""
+    page = _reviews_page(professional_id)
+    return jsonify(
+        reviews=[{
+            'id': review.id,
+            'customer': review.customer.user.username,
+            'rating': review.rating,
+            'remarks': review.remarks,
+            'date': review.created_at.strftime('%Y-%m-%d'),
+        } for review in page.items],
+        next_cursor=page.next_cursor
+    )
+
 @shared_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
@@ -50,6 +101,7 @@ def edit_profile():
         user.username = form.username.data
         user.email = form.email.data
         user.address = form.address.data
+        old_region = region_for_customer(user.customer) if user.role == 'customer' and user.customer else None
         user.pin = form.pin.data
         
         # Optionally update password if a new one was entered
@@ -59,9 +111,13 @@ def edit_profile():
         # Update professional-specific data if the user is a professional
         if user.role == 'professional' and user.professional:
             user.professional.description = form.description.data
-            user.professional.experience = form.experience.data
+            user.professional.experience = form.experience.data or 0
         
         db.session.commit()
+        if old_region is not None and region_for_customer(user.customer) != old_region:
+            # A new PIN can mean a new region: take the customer's requests and reviews along.
+            relocate_customers([user.customer.id], old_region, region_for_customer(user.customer))
+            invalidate(CUSTOMERS)  # The moved requests were renumbered
         flash('Your profile has been updated successfully!', 'success')
 
         # Redirect back to their respective dashboards
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from app.metrics import WRITE_BATCH_UNITS, WRITE_QUEUE_WAIT
+
+STATE_KEY = 'write_coordinator'
+
+
+class _WriteUnit:
+    __slots__ = ('fn', 'args', 'kwargs', 'future', 'queued_at')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class _Writer:
+    """
+    The one thread of this process that writes. It takes every unit waiting in the queue (up to
+    WRITE_BATCH_MAX, lingering WRITE_BATCH_WAIT seconds for more), runs them one after another in
+    its own session and commits them together, so N concurrent writes cost one lock acquisition
+    and one fsync instead of N of each, and never wait on each other for SQLite's write lock.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, fn, args, kwargs):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='write-coordinator', daemon=True)
+                self.thread.start()
+        unit = _WriteUnit(fn, args, kwargs)
+        self.queue.put(unit)
+        # A timeout doesn't cancel the unit: it may still be committed after the caller gave up.
+        return unit.future.result(timeout=self.app.config['WRITE_TIMEOUT'])
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.app.config['WRITE_BATCH_WAIT']
+        while len(batch) < self.app.config['WRITE_BATCH_MAX']:
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        from app import db
+
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                started = time.perf_counter()
+                for unit in batch:
+                    WRITE_QUEUE_WAIT.observe(started - unit.queued_at)
+                try:
+                    self._commit(batch)
+                except Exception as error:  # Never leave a caller waiting for its full timeout
+                    for unit in batch:
+                        if not unit.future.done():
+                            unit.future.set_exception(error)
+                finally:
+                    db.session.remove()
+
+    def _commit(self, batch):
+        """
+        Runs `batch` in one transaction. A unit that raises is rolled back by rolling back the
+        whole transaction and running the others again without it: units only depend on what
+        is in the database, so a re-run does the same thing (and nothing was committed yet).
+        """
+        from app import db
+        from app.regions import SESSION_KEY
+
+        pending = list(batch)
+        while pending:
+            results, failed = [], None
+            for unit in pending:
+                db.session.info.pop(SESSION_KEY, None)  # Each unit picks its own region
+                try:
+                    results.append(unit.fn(*unit.args, **unit.kwargs))
+                    db.session.flush()  # Constraint errors belong to this unit, not to the commit
+                except Exception as error:
+                    failed = unit, error
+                    break
+            if failed is not None:
+                db.session.rollback()
+                unit, error = failed
+                unit.future.set_exception(error)
+                pending.remove(unit)
+                continue
+            try:
+                db.session.commit()
+            except Exception as error:
+                db.session.rollback()
+                for unit in pending:
+                    unit.future.set_exception(error)
+                return
+            WRITE_BATCH_UNITS.observe(len(pending))
+            for unit, result in zip(pending, results):
+                unit.future.set_result(result)
+            return
+
+
+def run_write(fn, *args, **kwargs):
+    """
+    Runs the write unit `fn(*args, **kwargs)` and commits it, returning its result or raising
+    its exception (after rolling it back). With WRITE_COORDINATOR on, the unit runs on the
+    writer thread, in another session and possibly the same transaction as other callers'
+    units. So a unit takes ids and plain values rather than ORM objects, loads what it needs
+    through db.session, picks its region with use_region(), returns plain values, and must not
+    commit, roll back or have side effects outside the database (publish after run_write returns).
+    """
+    from app import db
+
+    state = current_app.extensions.get(STATE_KEY)
+    if state is not None:
+        return state.submit(fn, args, kwargs)
+    try:
+        result = fn(*args, **kwargs)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+class WriteCoordinator:
+    """
+    Optional single-writer mode for SQLite (WRITE_COORDINATOR): the write paths that go through
+    run_write() are funnelled into one writer thread per process and group-committed, instead of
+    every request thread fighting over the database lock. Off, run_write() simply runs and
+    commits the unit in the caller's session. With several worker processes there is one writer
+    per process, so the gain is largest with one process running many threads.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('WRITE_COORDINATOR', False)
+        app.config.setdefault('WRITE_BATCH_MAX', 64)
+        app.config.setdefault('WRITE_BATCH_WAIT', 0)
+        app.config.setdefault('WRITE_TIMEOUT', 30)
+        if app.config['WRITE_COORDINATOR']:
+            app.extensions[STATE_KEY] = _Writer(app)
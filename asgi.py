@@ -0,0 +1,15 @@
+"""
+ASGI entry point, e.g. `uvicorn asgi:app --workers 4`.
+
+GET /api/v1/services, /me and /my-requests are served by the asyncio implementation in
+app/async_api.py; every other request goes to the Flask app on a thread pool.
+"""
+from a2wsgi import WSGIMiddleware
+
+from run import app as flask_app
+from app.async_api import AsyncAPI
+
+# The whole Flask app (sync API included) behind ASGI, also used by 'flask bench-api' for comparison.
+flask_asgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+
+app = AsyncAPI(flask_app, fallback=flask_asgi)
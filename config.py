@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -12,4 +13,107 @@ class Config:
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URI') or 'sqlite:///database.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Rows per page in each lazily loaded admin dashboard section
+    ADMIN_SECTION_PER_PAGE = int(os.environ.get('ADMIN_SECTION_PER_PAGE', 25))
+
+    # Rows per page of a customer's service history
+    HISTORY_PER_PAGE = int(os.environ.get('HISTORY_PER_PAGE', 20))
+
+    # Reviews per page (and per "Load more") on a professional's public profile
+    REVIEWS_PER_PAGE = int(os.environ.get('REVIEWS_PER_PAGE', 10))
+
+    # Default page size of the public listing API (/api/v1/professionals); clients may ask for up to 100
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 20))
+
+    # Server-sent events for the professional dashboard. Set SSE_POLL_INTERVAL (seconds) when
+    # running several worker processes, so each stream also polls the database for changes.
+    SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 0))
+    SSE_HEARTBEAT_INTERVAL = 15
+    SSE_MAX_DURATION = 300
+
+    # Auto-assignment of rejected/unassigned requests: score weights, and the number of open
+    # (requested or accepted) jobs at which a professional stops receiving new ones
+    AUTO_ASSIGN_WEIGHTS = {'rating': 0.5, 'load': 0.3, 'proximity': 0.2}
+    AUTO_ASSIGN_MAX_OPEN = int(os.environ.get('AUTO_ASSIGN_MAX_OPEN', 10))
+
+    # Token-bucket rate limits, keyed by endpoint or blueprint name ('N/period per ip|username|api_key').
+    # The default in-process store is per worker; point RATELIMIT_STORAGE at a SQLite file
+    # (e.g. 'sqlite:///instance/ratelimit.db') to share buckets between workers on one host.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() != 'false'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE', 'memory')
+    RATELIMIT_RULES = {
+        'auth.login': ['30/minute per ip', '5/minute per username'],
+        'auth.register': ['30/hour per ip'],
+        'api': ['60/minute per api_key', '300/minute per ip'],
+    }
+
+    # Idempotency keys for retried POSTs: how long results are kept (seconds), how long a retry
+    # waits for the original attempt to finish, and when an unfinished attempt counts as abandoned
+    IDEMPOTENCY_TTL = 24 * 3600
+    IDEMPOTENCY_WAIT = 5
+    IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+    # In-memory service catalog. Commits in this process rebuild it at once; other worker
+    # processes reload theirs once it is this many seconds old
+    SERVICE_CATALOG_TTL = 60
+
+    # Service images: originals and thumbnails are kept in IMAGE_FOLDER (default instance/images).
+    # A thumbnail is rendered for each named size the templates show, at 1x and 2x
+    IMAGE_FOLDER = os.environ.get('IMAGE_FOLDER')
+    IMAGE_SIZES = {'card': (320, 180), 'thumb': (64, 64)}
+    IMAGE_QUALITY = 80
+    IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+    # Professionals' verification documents (PDF, PNG or JPEG), stored by content in DOCUMENT_FOLDER
+    # (default instance/documents) and streamed there while the registration form is parsed
+    DOCUMENT_FOLDER = os.environ.get('DOCUMENT_FOLDER')
+    DOCUMENT_MAX_BYTES = 20 * 1024 * 1024
+
+    # Search-as-you-type suggestions: how many are returned, and the age (seconds) at which the
+    # in-memory index is rebuilt in the background, for changes made by other worker processes
+    AUTOCOMPLETE_LIMIT = 8
+    AUTOCOMPLETE_TTL = int(os.environ.get('AUTOCOMPLETE_TTL', 300))
+
+    # Cached customer/professional dashboard data: entries kept per process (least recently used
+    # go first), and the age (seconds) at which one is recomputed anyway, for commits made elsewhere
+    DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 2000))
+    DASHBOARD_CACHE_TTL = 60
+
+    # Prometheus metrics at METRICS_PATH. With pre-forked workers, export PROMETHEUS_MULTIPROC_DIR
+    # (an empty directory) before starting the server so every worker's samples are summed
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+    METRICS_PATH = '/metrics'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, scrapes need 'Authorization: Bearer <token>'
+
+    # Request profiler: the fraction of all requests profiled automatically (admins can always
+    # profile one request with ?_profile=1), and how many profiles are kept on disk
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+    PROFILER_KEEP = 200
+
+    # ASGI deployment (asgi.py): threads running the sync Flask app next to the async API,
+    # and an explicit async database URL when SQLALCHEMY_DATABASE_URI isn't SQLite
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI')
+
+    # Single-writer mode for SQLite: bookings, request handling, reviews, payments and registrations
+    # are queued to one writer thread per process, which commits up to WRITE_BATCH_MAX of them per
+    # transaction (waiting up to WRITE_BATCH_WAIT seconds for more). Callers give up after WRITE_TIMEOUT
+    WRITE_COORDINATOR = os.environ.get('WRITE_COORDINATOR', 'false').lower() == 'true'
+    WRITE_BATCH_MAX = int(os.environ.get('WRITE_BATCH_MAX', 64))
+    WRITE_BATCH_WAIT = float(os.environ.get('WRITE_BATCH_WAIT', 0))
+    WRITE_TIMEOUT = 30
+
+    # Region partitioning (app/regions.py): requests, their archive, reviews and rejection records
+    # of customers whose PIN starts with one of a region's prefixes live in that region's SQLite
+    # file (instance/region_<name>.db unless 'uri' is given); other PINs stay in the main database.
+    # e.g. REGIONS='{"north": {"number": 1, "pins": ["11", "12"]}, "south": {"number": 2, "pins": ["5", "6"]}}'
+    # then run 'flask init-regions', and 'flask rebalance-regions' after any change
+    REGIONS = json.loads(os.environ.get('REGIONS') or '{}')
+
+    # Daily rollups behind the admin time-series charts, refreshed by 'flask rollup' (e.g. from cron).
+    # Changes this many seconds older than the last run's watermark are read again, for
+    # transactions that committed after a newer one; the charts cover at most this many periods
+    ROLLUP_OVERLAP = int(os.environ.get('ROLLUP_OVERLAP', 300))
+    ROLLUP_MAX_PERIODS = 366
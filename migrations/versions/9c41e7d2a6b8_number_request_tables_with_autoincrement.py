@@ -0,0 +1,36 @@
+"""Number service requests, reviews and rejections with AUTOINCREMENT
+
+Revision ID: 9c41e7d2a6b8
+Revises: b37d72aeb813
+Create Date: 2026-10-19 16:40:12.503918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c41e7d2a6b8'
+down_revision = 'b37d72aeb813'
+branch_labels = None
+depends_on = None
+
+# Without AUTOINCREMENT SQLite reuses the largest id once its row is deleted (e.g. archived),
+# and a region database could not be told to start numbering from its own range.
+TABLES = ['service_requests', 'reviews', 'request_rejections']
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TABLES:
+        with op.batch_alter_table(name, recreate='always', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in reversed(TABLES):
+        with op.batch_alter_table(name, recreate='always', table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+            pass
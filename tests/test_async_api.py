@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app import create_app, db
+from app.async_api import AsyncAPI
+from app.models import Users, Customers, Services, ServiceRequests, ServiceStatus
+from config import Config
+
+PATHS = ["/api/v1/services", "/api/v1/me", "/api/v1/my-requests"]
+
+
+@pytest.fixture
+def api_app(tmp_path):
+    class APIConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'api.db'}"
+        ASYNC_DATABASE_URI = None
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        REGIONS = {}  # Everything in the scratch database
+        DOCUMENT_FOLDER = str(tmp_path / 'documents')
+
+    app = create_app(APIConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def api_key(api_app):
+    with api_app.app_context():
+        # Non-ASCII everywhere, which the stdlib JSON provider would have escaped as \uXXXX.
+        service = Services(service_type="Café Repair", description="Réparation — 24×7", base_price=10)
+        user = Users(username="zoë", email="zoe@api.test", role="customer", password_hash="!",
+                     address="12, Koramangala ☀ Bengaluru", pin="560034")
+        db.session.add_all([service, user])
+        db.session.flush()
+        customer = Customers(user_id=user.id)
+        db.session.add(customer)
+        db.session.flush()
+        db.session.add(ServiceRequests(service_id=service.id, customer_id=customer.id, proposed_price=10,
+                                       service_status=ServiceStatus.REQUESTED))
+        key = user.generate_api_key()
+        db.session.commit()
+        return key
+
+
+def _asgi_get_all(asgi_app, paths, headers):
+    """Status and body of a GET to each path, straight through the ASGI interface."""
+    async def get(path):
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "client": ("127.0.0.1", 0),
+                 "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi_app(scope, receive, send)
+        return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:])
+
+    async def run():
+        try:
+            return [await get(path) for path in paths]
+        finally:
+            await asgi_app.engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_api_sends_the_same_bytes_as_the_flask_blueprint(api_app, api_key):
+    headers = {"x-api-key": api_key}
+    client = api_app.test_client()
+    expected = [(response.status_code, response.get_data()) for response in (client.get(path, headers=headers) for path in PATHS)]
+
+    assert _asgi_get_all(AsyncAPI(api_app, fallback=None), PATHS, headers) == expected
+    assert all(status == 200 for status, _ in expected)
+    # Both sides go through OrjsonProvider, so non-ASCII text is raw UTF-8 on both.
+    assert "Café Repair".encode() in expected[0][1]
+    assert "zoë".encode() in expected[1][1]
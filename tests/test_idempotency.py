@@ -0,0 +1,177 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask_login import login_required
+from sqlalchemy.exc import IntegrityError
+
+from app import create_app, db
+from app.idempotency import idempotent, _request_hash
+from app.models import Users, Customers, ServiceProfessionals, Services, ServiceRequests, ServiceStatus, IdempotencyKeys
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path):
+    class IdempotencyConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'idempotency.db'}"
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        WTF_CSRF_ENABLED = False
+        REGIONS = {}  # Everything in the scratch database
+        DOCUMENT_FOLDER = str(tmp_path / 'documents')
+
+    app = create_app(IdempotencyConfig)
+    # A view that holds its key until the test lets it finish, and fails when told to.
+    app.slow_view = {'started': threading.Event(), 'release': threading.Event(), 'fail': [], 'calls': 0}
+
+    @app.route('/test/slow', methods=['POST'])
+    @login_required
+    @idempotent
+    def slow_view():
+        state = app.slow_view
+        state['calls'] += 1
+        state['started'].set()
+        state['release'].wait(timeout=10)
+        if state['fail'] and state['fail'].pop(0):
+            raise RuntimeError("The first attempt fails")
+        return f"done {state['calls']}"
+
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def booking(app):
+    """A customer, a professional for one service, and their ids."""
+    with app.app_context():
+        service = Services(service_type="Plumbing", base_price=10)
+        # Nobody logs in with a password, so no (slow) password hashing.
+        customer_user = Users(username="customer", email="c@test.test", role="customer", password_hash="!")
+        professional_user = Users(username="professional", email="p@test.test", role="professional", password_hash="!")
+        db.session.add_all([service, customer_user, professional_user])
+        db.session.flush()
+        customer = Customers(user_id=customer_user.id)
+        professional = ServiceProfessionals(user_id=professional_user.id, service_id=service.id, is_verified=True)
+        db.session.add_all([customer, professional])
+        db.session.commit()
+        return {"user_id": customer_user.id, "customer_id": customer.id, "professional_id": professional.id,
+                "service_id": service.id}
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+    return client
+
+
+def _book(client, booking, key, price=25):
+    return client.post(f"/customer/book_service/{booking['professional_id']}",
+                       data={"service_id": booking["service_id"], "proposed_price": price, "idempotency_key": key})
+
+
+def _request_count(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count()).select_from(ServiceRequests))
+
+
+def test_retry_replays_the_stored_response(app, booking):
+    client = _client(app, booking["user_id"])
+    first = _book(client, booking, "key-1")
+    retry = _book(client, booking, "key-1")
+
+    assert first.status_code == retry.status_code == 302
+    assert retry.headers["Location"] == first.headers["Location"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert _request_count(app) == 1
+
+
+def test_reused_key_with_different_data_is_refused(app, booking):
+    client = _client(app, booking["user_id"])
+    assert _book(client, booking, "key-1", price=25).status_code == 302
+    assert _book(client, booking, "key-1", price=30).status_code == 422
+    assert _request_count(app) == 1
+
+
+def test_retry_while_the_first_attempt_runs_gets_409(app, booking):
+    app.config["IDEMPOTENCY_WAIT"] = 0.3
+    state = app.slow_view
+    first = []
+    worker = threading.Thread(target=lambda: first.append(
+        _client(app, booking["user_id"]).post("/test/slow", headers={"Idempotency-Key": "key-1"})))
+    worker.start()
+    try:
+        assert state["started"].wait(timeout=10)
+        retry = _client(app, booking["user_id"]).post("/test/slow", headers={"Idempotency-Key": "key-1"})
+        assert retry.status_code == 409
+    finally:
+        state["release"].set()
+        worker.join()
+    assert first[0].status_code == 200
+    assert state["calls"] == 1
+
+
+def test_retry_takes_over_when_the_first_attempt_fails_meanwhile(app, booking):
+    state = app.slow_view
+    state["fail"].append(True)  # Only the first call fails
+    first, retry = [], []
+    first_worker = threading.Thread(target=lambda: first.append(
+        _client(app, booking["user_id"]).post("/test/slow", headers={"Idempotency-Key": "key-1"})))
+    first_worker.start()
+    assert state["started"].wait(timeout=10)
+    retry_worker = threading.Thread(target=lambda: retry.append(
+        _client(app, booking["user_id"]).post("/test/slow", headers={"Idempotency-Key": "key-1"})))
+    retry_worker.start()
+    time.sleep(0.3)  # The retry is now polling the first attempt's claim
+    state["release"].set()
+    first_worker.join()
+    retry_worker.join()
+
+    assert first[0].status_code == 500
+    assert retry[0].status_code == 200
+    assert retry[0].get_data(as_text=True) == "done 2"
+    with app.app_context():
+        assert db.session.scalar(db.select(IdempotencyKeys.status_code)) == 200
+
+
+def test_stale_claim_is_taken_over(app, booking):
+    data = {"service_id": booking["service_id"], "proposed_price": 25, "idempotency_key": "key-1"}
+    path = f"/customer/book_service/{booking['professional_id']}"
+    with app.test_request_context(path, method="POST", data=data):
+        request_hash = _request_hash()
+    with app.app_context():
+        # Left behind by a worker that died part way through the view.
+        stale = datetime.utcnow() - timedelta(seconds=app.config["IDEMPOTENCY_LOCK_TIMEOUT"] + 10)
+        db.session.add(IdempotencyKeys(user_id=booking["user_id"], key="key-1", request_hash=request_hash,
+                                       created_at=stale, updated_at=stale))
+        db.session.commit()
+
+    response = _client(app, booking["user_id"]).post(path, data=data)
+    assert response.status_code == 302
+    assert "Idempotent-Replayed" not in response.headers
+    assert _request_count(app) == 1
+    with app.app_context():
+        assert db.session.scalar(db.select(IdempotencyKeys.status_code)) == 302
+
+
+def test_one_active_request_per_pair(app, booking):
+    pair = {key: booking[key] for key in ("customer_id", "professional_id", "service_id")}
+    with app.app_context():
+        db.session.add(ServiceRequests(service_status=ServiceStatus.REQUESTED, proposed_price=10, **pair))
+        db.session.commit()
+        db.session.add(ServiceRequests(service_status=ServiceStatus.REQUESTED, proposed_price=12, **pair))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        # Closed requests don't count: the pair can book again.
+        db.session.execute(db.update(ServiceRequests).values(service_status=ServiceStatus.CLOSED.name))
+        db.session.add(ServiceRequests(service_status=ServiceStatus.ACCEPTED, proposed_price=12, **pair))
+        db.session.commit()
+    assert _request_count(app) == 2
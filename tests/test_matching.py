@@ -0,0 +1,85 @@
+import pytest
+
+from app import create_app, db
+from app.events import broker
+from app.matching import MatchingEngine
+from app.models import Users, Customers, ServiceProfessionals, Services, ServiceRequests, ServiceStatus
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path):
+    class MatchingConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'matching.db'}"
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        REGIONS = {}  # Everything in the scratch database
+        DOCUMENT_FOLDER = str(tmp_path / 'documents')
+
+    app = create_app(MatchingConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.engine.dispose()
+
+
+def _user(username, role, pin="560001"):
+    # Nobody logs in, so no (slow) password hashing.
+    user = Users(username=username, email=f"{username}@test.test", role=role, password_hash="!", pin=pin)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+@pytest.fixture
+def pending(app):
+    """A request rejected by `rejecter`, one nobody holds yet, and three professionals who could take them."""
+    service = Services(service_type="Plumbing", base_price=10)
+    db.session.add(service)
+    db.session.flush()
+    # Nearer and nearer to the customers (PIN 560001), so the ranking isn't a tie.
+    professionals = [ServiceProfessionals(user_id=_user(f"pro{n}", "professional", pin).id, service_id=service.id, is_verified=True)
+                     for n, pin in enumerate(["110001", "560099", "560001"])]
+    customers = [Customers(user_id=_user(f"customer{n}", "customer").id) for n in range(2)]
+    db.session.add_all(professionals + customers)
+    db.session.flush()
+    rejected = ServiceRequests(service_id=service.id, customer_id=customers[0].id, professional_id=professionals[0].id,
+                               service_status=ServiceStatus.REJECTED, proposed_price=10)
+    unassigned = ServiceRequests(service_id=service.id, customer_id=customers[1].id, service_status=ServiceStatus.REQUESTED,
+                                 proposed_price=10)
+    db.session.add_all([rejected, unassigned])
+    db.session.commit()
+    return rejected.id, unassigned.id, [p.id for p in professionals]
+
+
+def test_plan_picks_the_top_ranked_candidate(app, pending):
+    for request_id in pending[:2]:
+        engine = MatchingEngine().load(request_ids=[request_id])
+        ranked = engine.rank(engine.requests[0])
+        [(_, planned)] = engine.plan()
+        assert planned is ranked[0][1]
+
+
+def test_assign_all_publishes_applied_assignments_when_others_are_skipped(app, pending):
+    rejected_id, unassigned_id, professional_ids = pending
+    engine = MatchingEngine().load()
+    # Closed by hand after the engine loaded it, so its assignment is skipped.
+    db.session.execute(db.update(ServiceRequests).where(ServiceRequests.id == unassigned_id)
+                       .values(service_status=ServiceStatus.CLOSED.name))
+    db.session.commit()
+
+    queues = {professional_id: broker.subscribe(professional_id) for professional_id in professional_ids}
+    try:
+        assignments = engine.assign_all()
+        events = {professional_id: [queue.get_nowait() for _ in range(queue.qsize())] for professional_id, queue in queues.items()}
+    finally:
+        for professional_id, queue in queues.items():
+            broker.unsubscribe(professional_id, queue)
+
+    assert len(assignments) == 2 and engine.skipped == 1
+    new_holder = db.session.get(ServiceRequests, rejected_id).professional_id
+    assert new_holder in professional_ids[1:]
+    assert [(event['id'], event['status']) for event in events[new_holder]] == [(rejected_id, 'REQUESTED')]
+    # The professional who rejected it is told it's gone from their dashboard.
+    assert events[professional_ids[0]] == [{'id': rejected_id, 'removed': True, 'updated_at': events[new_holder][0]['updated_at']}]
+    assert all(event['id'] != unassigned_id for received in events.values() for event in received)
@@ -0,0 +1,93 @@
+import pytest
+
+from app import create_app, db
+from app.models import Users, Customers, ServiceProfessionals, Services
+from app.regions import ID_SPAN, create_region_tables
+from config import Config
+
+
+@pytest.fixture
+def app(tmp_path):
+    class RegionsConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'main.db'}"
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        WTF_CSRF_ENABLED = False
+        # PINs no region claims (here 999999) stay in the main database.
+        REGIONS = {
+            'south': {'number': 1, 'pins': ['56'], 'uri': f"sqlite:///{tmp_path / 'region_south.db'}"},
+            'west': {'number': 2, 'pins': ['40'], 'uri': f"sqlite:///{tmp_path / 'region_west.db'}"},
+        }
+        DOCUMENT_FOLDER = str(tmp_path / 'documents')
+
+    app = create_app(RegionsConfig)
+    with app.app_context():
+        db.create_all()
+        create_region_tables()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def users(app):
+    """Two customers in different regions, a professional and an admin: {username: (user id, api key)}."""
+    with app.app_context():
+        service = Services(service_type="Plumbing", base_price=10)
+        db.session.add(service)
+        db.session.flush()
+        created = {}
+        for username, role, pin in [("south", "customer", "560001"), ("elsewhere", "customer", "999999"),
+                                    ("professional", "professional", "560002"), ("admin", "admin", "110001")]:
+            # Nobody logs in with a password, so no (slow) password hashing.
+            user = Users(username=username, email=f"{username}@example.com", role=role, password_hash="!", pin=pin,
+                         api_key=username.ljust(32, "x"))
+            db.session.add(user)
+            db.session.flush()
+            if role == "customer":
+                db.session.add(Customers(user_id=user.id))
+            elif role == "professional":
+                professional = ServiceProfessionals(user_id=user.id, service_id=service.id, is_verified=True)
+                db.session.add(professional)
+            created[username] = (user.id, user.api_key)
+        db.session.commit()
+        created["booking"] = (professional.id, service.id)
+        return created
+
+
+def _client(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+    return client
+
+
+def _my_request_ids(app, api_key):
+    response = app.test_client().get("/api/v1/my-requests", headers={"x-api-key": api_key})
+    assert response.status_code == 200
+    return sorted(record["id"] for record in response.get_json()["requests"])
+
+
+def test_requests_follow_their_customer_across_regions(app, users):
+    professional_id, service_id = users["booking"]
+    for customer in ("south", "elsewhere"):
+        response = _client(app, users[customer][0]).post(f"/customer/book_service/{professional_id}",
+                                                         data={"service_id": service_id, "proposed_price": 25})
+        assert response.status_code == 302
+    [south_id] = _my_request_ids(app, users["south"][1])
+    [elsewhere_id] = _my_request_ids(app, users["elsewhere"][1])
+    assert south_id // ID_SPAN == 1 and elsewhere_id // ID_SPAN == 0  # Written to the customers' home regions
+
+    # A new PIN in the west region takes the customer's request along, renumbered from the west's range.
+    client = _client(app, users["south"][0])
+    response = client.post("/shared/profile/edit", data={"username": "south", "email": "south@example.com", "pin": "400001"})
+    assert response.status_code == 302
+    [moved_id] = _my_request_ids(app, users["south"][1])
+    assert moved_id // ID_SPAN == 2
+    assert client.get("/customer/service_history").status_code == 200
+
+    # Professionals and the admin read every region.
+    assert _my_request_ids(app, users["professional"][1]) == [elsewhere_id, moved_id]
+    admin = _client(app, users["admin"][0])
+    section = admin.get("/admin/dashboard/sections/requests").get_data(as_text=True)
+    assert f"#{moved_id}<" in section and f"#{elsewhere_id}<" in section and f"#{south_id}<" not in section
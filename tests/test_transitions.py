@@ -0,0 +1,99 @@
+import random
+import threading
+
+import pytest
+from sqlalchemy.orm.exc import StaleDataError
+
+from app import create_app, db
+from app.models import (Users, Customers, ServiceProfessionals, Services, ServiceRequests, ServiceStatus,
+                        InvalidTransition, TransitionConflict)
+from config import Config
+
+THREADS = 16
+ROUNDS = 25
+EXPECTED_STATUS = {"accept": ServiceStatus.ACCEPTED, "reject": ServiceStatus.REJECTED, "edit": ServiceStatus.REQUESTED}
+
+
+@pytest.fixture
+def stress_app(tmp_path):
+    class StressConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'stress.db'}"
+        RATELIMIT_ENABLED = False
+        METRICS_ENABLED = False
+        REGIONS = {}  # Everything in the scratch database
+        DOCUMENT_FOLDER = str(tmp_path / 'documents')
+        # Every thread holds a connection from its read until its write.
+        SQLALCHEMY_ENGINE_OPTIONS = {"pool_size": THREADS + 1}
+
+    app = create_app(StressConfig)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def pair_ids(stress_app):
+    with stress_app.app_context():
+        service = Services(service_type="Stress", base_price=10)
+        # Nobody logs in, so no (slow) password hashing.
+        customer_user = Users(username="stress-customer", email="c@stress.test", role="customer", password_hash="!")
+        professional_user = Users(username="stress-professional", email="p@stress.test", role="professional", password_hash="!")
+        db.session.add_all([service, customer_user, professional_user])
+        db.session.flush()
+        customer = Customers(user_id=customer_user.id)
+        professional = ServiceProfessionals(user_id=professional_user.id, service_id=service.id, is_verified=True)
+        db.session.add_all([customer, professional])
+        db.session.commit()
+        return {"service_id": service.id, "customer_id": customer.id, "professional_id": professional.id}
+
+
+def _attempt(app, request_id, action, barrier, outcomes):
+    with app.app_context():
+        try:
+            service_request = db.session.get(ServiceRequests, request_id)
+            barrier.wait(timeout=30)  # Everyone has read version 1 before anyone writes
+            if action == "edit":
+                service_request.proposed_price += random.randint(1, 100)  # Always a real change
+            else:
+                service_request.transition(ServiceStatus.ACCEPTED if action == "accept" else ServiceStatus.REJECTED)
+            db.session.commit()
+            outcomes.append((action, "applied"))
+        except (TransitionConflict, StaleDataError):
+            db.session.rollback()
+            outcomes.append((action, "conflict"))
+        except InvalidTransition:
+            db.session.rollback()
+            outcomes.append((action, "invalid"))
+        except Exception as error:
+            barrier.abort()  # Don't leave the other threads waiting for this one
+            db.session.rollback()
+            outcomes.append((action, f"error: {error.__class__.__name__}"))
+
+
+@pytest.mark.parametrize("round_number", range(ROUNDS))
+def test_concurrent_writes_to_one_request_have_exactly_one_winner(stress_app, pair_ids, round_number):
+    """Accepts, rejects and price edits from many threads, all from the same read: one wins, the rest conflict."""
+    with stress_app.app_context():
+        service_request = ServiceRequests(service_status=ServiceStatus.REQUESTED, proposed_price=10, **pair_ids)
+        db.session.add(service_request)
+        db.session.commit()
+        request_id = service_request.id
+
+    actions = random.Random(round_number).choices(list(EXPECTED_STATUS), k=THREADS)
+    barrier, outcomes = threading.Barrier(THREADS), []
+    workers = [threading.Thread(target=_attempt, args=(stress_app, request_id, action, barrier, outcomes)) for action in actions]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    winners = [action for action, outcome in outcomes if outcome == "applied"]
+    assert len(outcomes) == THREADS
+    assert len(winners) == 1, outcomes
+    assert all(outcome in ("applied", "conflict") for _, outcome in outcomes), outcomes
+    with stress_app.app_context():
+        final = db.session.get(ServiceRequests, request_id)
+        assert final.version == 2
+        assert final.service_status == EXPECTED_STATUS[winners[0]]